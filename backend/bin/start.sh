@@ -1,3 +1,8 @@
 #!/bin/bash
 
-gunicorn -w 10 -k "uvicorn.workers.UvicornWorker" --timeout 1200 -b 0.0.0.0:${PORT:-8080} "src.server:app"
+# prometheus-client が gunicorn の全ワーカーのメトリクスを集計するためのディレクトリ。起動ごとに空にする
+export PROMETHEUS_MULTIPROC_DIR=${PROMETHEUS_MULTIPROC_DIR:-/tmp/prometheus}
+rm -rf "${PROMETHEUS_MULTIPROC_DIR}"
+mkdir -p "${PROMETHEUS_MULTIPROC_DIR}"
+
+gunicorn -c python:src.gunicorn_conf -w 10 -k "uvicorn.workers.UvicornWorker" --timeout 1200 -b 0.0.0.0:${PORT:-8080} "src.server:app"
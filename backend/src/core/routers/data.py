@@ -1,17 +1,16 @@
-import io
 import logging
 import traceback
+from typing import Optional
 
-import pandas as pd
-from fastapi import APIRouter, Depends, HTTPException, Request, status
+from fastapi import APIRouter, Depends, HTTPException, Query, status
 from fastapi.encoders import jsonable_encoder
 from fastapi.responses import JSONResponse, Response, ORJSONResponse
 from google.cloud import firestore
 from google.cloud.firestore_v1.base_query import FieldFilter
 
-from src.core.services import auth_service
 import src.core.services.firebase_driver as firebase_driver
 from src.core.services.firebase_client import FirebaseClient, get_firebase_client
+from src.core.services.upload import table_preview
 from src.dependencies.auth import get_user_id
 
 from ._base import BaseJSONSchema
@@ -25,15 +24,9 @@ router = APIRouter()
 
 @router.get("/data/table")
 async def list_excel_files_by_project(
-    request: Request,
     firebase_client: FirebaseClient = Depends(get_firebase_client),
+    user_id: str = Depends(get_user_id),
 ):
-    authorization = request.headers.get("Authorization")
-    if not authorization:
-        raise HTTPException(status_code=401, detail="Authorization header missing")
-
-    user_id = auth_service.verify_token(authorization)
-
     try:
         storage_client = firebase_client.get_storage()
         firestore_client = firebase_client.get_firestore()
@@ -56,7 +49,15 @@ async def list_excel_files_by_project(
             .document(selected_project_id)
             .collection('tables')
         )
-        tables_docs = tables_ref.stream()  # 複数のファイル情報を取得
+        tables_docs = list(tables_ref.stream())  # 複数のファイル情報を取得
+
+        # プレビューはアップロード後に一度だけ作成したものを使い、元ファイルが更新された場合のみ再作成する
+        previews = await table_preview.load_table_previews(
+            storage_client,
+            user_id,
+            selected_project_id,
+            [(doc.id, doc.to_dict().get('file_name', 'Unknown File')) for doc in tables_docs],
+        )
 
         file_data_list = []
 
@@ -64,29 +65,9 @@ async def list_excel_files_by_project(
             file_info = doc.to_dict()
             file_uuid = doc.id  # FirestoreのドキュメントIDを使用（ファイルUUID）
             file_name = file_info.get('file_name', 'Unknown File')  # Firestoreに保存されているファイル名
-            file_extension = file_name.split('.')[-1].lower()
-            # ストレージからファイルを取得 (file_uuidをキーとして使用)
-            blob_path = f"{user_id}/documents/{file_uuid}_{file_name}"
-            blob = storage_client.blob(blob_path)
-            if not blob.exists():
-                continue  # ファイルがストレージに存在しない場合はスキップ
-
-            file_bytes = blob.download_as_bytes()
-            file_io = io.BytesIO(file_bytes)
-
-            if file_extension == 'xlsx':
-                df = pd.read_excel(file_io, engine="openpyxl")
-            elif file_extension == 'csv':
-                df = pd.read_csv(file_io)
-            else:
-                continue
-
-            df = df.replace('^Unnamed.*', '', regex=True)
-            df = df.fillna('')
-            output = df.head(100)  # 必要に応じて表示行数を調整
-
-            output = output.astype(str)
-            json_data = output.to_dict(orient="records")
+            json_data = previews.get(file_uuid)
+            if json_data is None:
+                continue  # ストレージに存在しない、または表形式でないファイルはスキップ
 
             # ファイル情報をリストに追加
             file_data_list.append(
@@ -112,26 +93,26 @@ async def list_excel_files_by_project(
 
 @router.get("/data/document")
 async def list_document_files(
-    request: Request,
+    page_size: int = Query(default=500, ge=1, le=1000),
+    page_token: Optional[str] = Query(default=None),
     firebase_client: FirebaseClient = Depends(get_firebase_client),
+    user_id: str = Depends(get_user_id),
 ):
-    authorization = request.headers.get("Authorization")
-    if not authorization:
-        raise HTTPException(status_code=401, detail="Authorization header missing")
-
-    user_id = auth_service.verify_token(authorization)
-
     try:
         storage_client = firebase_client.get_storage()
         firestore_client = firebase_client.get_firestore()
 
         project_id = firebase_driver.get_project_id(user_id, firestore_client)
 
+        # ストレージの一覧はページ単位で1回のリクエストで取得する
         prefix = f'{user_id}/projects/{project_id}/documents/'
-        blobs = storage_client.list_blobs(prefix=prefix)
-        file_names = [blob.name.replace(prefix, "") for blob in blobs if blob.name != prefix]
+        blobs = storage_client.list_blobs(prefix=prefix, max_results=page_size, page_token=page_token)
+        page = next(blobs.pages, None)
+        blob_names = [blob.name for blob in page] if page is not None else []
+        next_page_token = blobs.next_page_token
+        file_names = [name.replace(prefix, "") for name in blob_names if name != prefix and "_" in name]
 
-        if not file_names:
+        if not file_names and not next_page_token:
             return Response(status_code=204)
 
         documents_ref = (
@@ -142,14 +123,18 @@ async def list_document_files(
             .collection('documents')
         )
 
+        # ファイル名は "{file_uuid}_{file_title}" 形式
+        files = [file_name.split("_", 1) for file_name in file_names]
+
+        # Firestoreのドキュメントは get_all でまとめて取得する
+        doc_refs = [documents_ref.document(file_uuid) for file_uuid, _ in files]
+        snapshots = {doc.id: doc for doc in firestore_client.get_all(doc_refs)} if doc_refs else {}
+
         file_data_list = []
-        for file_name in file_names:
-            # ファイル名 (file_uuid) に対応するFirestoreのドキュメントを取得
-            file_uuid = file_name.split("_")[0]  # ファイル名からfile_uuidを抽出
-            file_title = file_name.split('_',1)[1]  # ファイル名からfile_uuidを抽出
-            doc = documents_ref.document(file_uuid).get()
+        for file_uuid, file_title in files:
+            doc = snapshots.get(file_uuid)
 
-            if not doc.exists:
+            if doc is None or not doc.exists:
                 continue  # Firestoreに該当するドキュメントがない場合はスキップ
 
             doc_data = doc.to_dict()
@@ -171,10 +156,10 @@ async def list_document_files(
                 }
             )
 
-        if not file_data_list:
+        if not file_data_list and not next_page_token:
             return Response(status_code=204)
 
-        return JSONResponse(content={"files": file_data_list}, status_code=200)
+        return JSONResponse(content={"files": file_data_list, "next_page_token": next_page_token}, status_code=200)
 
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Error retrieving or processing files: {str(e)}")
@@ -1,17 +1,15 @@
-import base64
+import asyncio
 import json
 import logging
 import traceback
-from datetime import datetime, timedelta, timezone
+from datetime import datetime, timedelta
 from decimal import Decimal
-from io import BytesIO
 from typing import Optional
 
-import fitz
 import openai
 from fastapi import APIRouter, BackgroundTasks, Depends, HTTPException, Request, status
 from fastapi.encoders import jsonable_encoder
-from fastapi.responses import ORJSONResponse
+from fastapi.responses import ORJSONResponse, Response
 from google.cloud import firestore
 from google.cloud.firestore_v1.base_query import FieldFilter
 from pydantic import Field
@@ -19,10 +17,10 @@ from pydantic import Field
 import src.core.services.firebase_driver as firebase_driver
 from src.dependencies.external import get_openai_client
 from src.core.models.financial import CategoryIR
-from src.core.services import auth_service
-from src.core.services.exploler import formatter
+from src.core.services import response_cache
+from src.core.services.exploler import formatter, preview, summarizer
 from src.core.services.firebase_client import FirebaseClient, get_firebase_client
-from src.core.services.firebase_driver import PageDetail
+from src.dependencies.auth import get_user_id
 
 from ._base import BaseJSONSchema
 
@@ -49,11 +47,8 @@ class ResGetFinancialStatements(BaseJSONSchema):
 
 
 def verify_auth(request: Request) -> str:
-    """認証情報を検証しユーザーIDを返す"""
-    authorization = request.headers.get("Authorization")
-    if not authorization:
-        raise HTTPException(status_code=401, detail="Authorization header missing")
-    return auth_service.verify_token(authorization)
+    """認証情報を検証しユーザーIDを返す（検証済みのトークンはキャッシュされる）"""
+    return get_user_id(request)
 
 
 def get_selected_project_id(firestore_client, user_id: str) -> str:
@@ -66,6 +61,10 @@ def get_selected_project_id(firestore_client, user_id: str) -> str:
     return selected_project[0].id
 
 
+# 財務諸表の一覧（create_financial_statement・generate_file_url）が使うフィールド
+FINANCIAL_STATEMENT_FIELDS = ['file_name', 'category_ir', 'year_info', 'period_type', 'category']
+
+
 def get_financial_documents(firestore_client, user_id: str, project_id: str):
     """財務諸表ドキュメントの一覧を取得"""
     tables_ref = (
@@ -77,22 +76,28 @@ def get_financial_documents(firestore_client, user_id: str, project_id: str):
     )
 
     category_ir_filter = FieldFilter("category_ir", "==", CategoryIR.EARNINGS_REPORT.value)
-    return tables_ref.where(filter=category_ir_filter).stream()
+    return tables_ref.where(filter=category_ir_filter).select(FINANCIAL_STATEMENT_FIELDS).stream()
+
+
+def compute_financial_statements_fingerprint(docs) -> str:
+    """
+    一覧に表示するフィールドの値からフィンガープリントを計算する
+    要約の進捗など、一覧に使わないフィールドの更新ではキャッシュを作り直さない
+    """
+    return response_cache.compute_fingerprint(
+        json.dumps(
+            {'uuid': doc.id, **{field: doc.to_dict().get(field) for field in FINANCIAL_STATEMENT_FIELDS}},
+            sort_keys=True,
+            ensure_ascii=False,
+            default=str,
+        )
+        for doc in docs
+    )
 
 
-def pdf_page_to_base64(pdf_bytes: bytes, page_number: int) -> str:
-    """PDFの特定ページを画像としてBase64エンコードする"""
-    try:
-        doc = fitz.open(stream=pdf_bytes, filetype="pdf")
-        page = doc.load_page(page_number)
-        pix = page.get_pixmap()
-        img_buffer = BytesIO(pix.tobytes())
-        img_base64 = base64.b64encode(img_buffer.getvalue()).decode('utf-8')
-        doc.close()
-        return img_base64
-    except Exception as e:
-        logger.error(f"Error converting PDF page to base64: {str(e)}")
-        raise
+SIGNED_URL_EXPIRATION = timedelta(hours=1)
+# 署名付きURLの有効期限より十分短くし、キャッシュから期限切れ間近のURLを返さないようにする
+FINANCIAL_STATEMENTS_CACHE_TTL = timedelta(minutes=45)
 
 
 def generate_file_url(storage_client, user_id: str, file_uuid: str, file_name: str) -> Optional[str]:
@@ -105,7 +110,7 @@ def generate_file_url(storage_client, user_id: str, file_uuid: str, file_name: s
 
     return blob.generate_signed_url(
         version="v4",
-        expiration=timedelta(hours=1),
+        expiration=SIGNED_URL_EXPIRATION,
         method="GET",
         response_type="application/pdf",
     )
@@ -144,21 +149,40 @@ async def get_financial_statements(
         firestore_client = firebase_client.get_firestore()
         project_id = get_selected_project_id(firestore_client, user_id)
 
-        financial_statements = []
-        for doc in get_financial_documents(firestore_client, user_id, project_id):
-            file_info = doc.to_dict()
-            file_uuid = doc.id
-            file_name = file_info.get('file_name', 'Unnamed')
+        docs = list(get_financial_documents(firestore_client, user_id, project_id))
+
+        # 一覧に表示する内容が変わらない限り、署名付きURLを含む一覧をキャッシュから返す
+        fingerprint = compute_financial_statements_fingerprint(docs)
+        cache_ref = response_cache.get_cache_ref(firestore_client, user_id, project_id, 'financial_statements')
+        cached = response_cache.load_cached_response(cache_ref, fingerprint)
+
+        if cached is None:
+            urls = await asyncio.gather(
+                *(
+                    asyncio.to_thread(
+                        generate_file_url,
+                        storage_client,
+                        user_id,
+                        doc.id,
+                        doc.to_dict().get('file_name', 'Unnamed'),
+                    )
+                    for doc in docs
+                )
+            )
 
-            url = generate_file_url(storage_client, user_id, file_uuid, file_name)
-            if not url:
-                continue
+            financial_statements = [
+                create_financial_statement(doc.id, doc.to_dict(), url) for doc, url in zip(docs, urls) if url
+            ]
+            result = ResGetFinancialStatements(financial_statements=financial_statements)
+            cached = response_cache.save_cached_response(
+                cache_ref, fingerprint, jsonable_encoder(result), FINANCIAL_STATEMENTS_CACHE_TTL
+            )
 
-            statement = create_financial_statement(file_uuid, file_info, url)
-            financial_statements.append(statement)
+        headers = {'ETag': f'"{cached.etag}"', 'Cache-Control': 'private, no-cache'}
+        if response_cache.is_not_modified(request.headers.get('If-None-Match'), cached.etag):
+            return Response(status_code=status.HTTP_304_NOT_MODIFIED, headers=headers)
 
-        result = ResGetFinancialStatements(financial_statements=financial_statements)
-        return ORJSONResponse(content=jsonable_encoder(result))
+        return ORJSONResponse(content=cached.content, headers=headers)
 
     except HTTPException:
         raise
@@ -205,84 +229,23 @@ def get_document_info(firestore_client, user_id: str, project_id: str, file_uuid
     return file_name, file_info
 
 
-def get_pdf_bytes(storage_client, user_id: str, file_uuid: str, file_name: str) -> bytes:
-    """PDFのバイトデータを取得"""
-    blob_path = f"{user_id}/{file_uuid}_{file_name}"
-    blob = storage_client.blob(blob_path)
-
-    if not blob.exists():
-        raise HTTPException(status_code=404, detail="File not found in storage")
-
-    return blob.download_as_bytes()
-
-
-def process_pdf_pages(pdf_bytes: bytes, max_pages: int = 10) -> tuple[int, list]:
-    """PDFページを処理してBase64エンコードされたページ情報を返す"""
-    doc = fitz.open(stream=pdf_bytes, filetype="pdf")
-    total_pages = len(doc)
-    pages_to_process = min(max_pages, total_pages)
-
-    encoded_pages = []
-
-    try:
-        for page_num in range(pages_to_process):
-            page = doc.load_page(page_num)
-            pix = page.get_pixmap()
-            img_buffer = BytesIO(pix.tobytes())
-            img_base64 = base64.b64encode(img_buffer.getvalue()).decode('utf-8')
-            encoded_pages.append({"page_number": page_num + 1, "content": img_base64})
-    finally:
-        doc.close()
-
-    return total_pages, encoded_pages
-
-
-def create_chat_completion_message(system_prompt, prompt, image_file):
-    messages = [
-        {"role": "system", "content": system_prompt},
-        {
-            "role": "user",
-            "content": [
-                {
-                    "type": "text",
-                    "text": f'{prompt}',
-                },
-                {
-                    "type": "image_url",
-                    "image_url": {"url": f"data:image/jpeg;base64,{image_file}"},
-                },
-            ],
-        },
-    ]
-    return messages
-
-
-def process_pages_in_background(
+async def process_pages_in_background(
     firestore_client: firestore.Client,
+    storage_client,
     user_id: str,
     uuid: str,
-    encoded_pages: list,
+    page_refs: list[preview.PageImageRef],
     openai_client: openai.ChatCompletion,
 ):
     """PDFページの処理をバックグラウンドで実行"""
-    pages: list[PageDetail] = []
-
-    for idx, page_data in enumerate(encoded_pages):
-        system_prompt = 'まず始めに結論を書いてください。その後それを捕捉するように文章を構成すること。 「### スライド概要、### 結論」'
-        prompt = '画像はIR資料です。このスライドから読み取れる内容を詳細かつ丁寧に文章でまとめてください。'
-        messages = create_chat_completion_message(system_prompt, prompt, page_data['content'])
-        response = openai_client.chat.completions.create(model='gpt-4o-mini', messages=messages)
-        summary = response.choices[0].message.content
-
-        row = PageDetail(index=idx, summary=summary, updated_at=datetime.now(tz=timezone.utc))
-        pages.append(row)
-
-    firebase_driver.save_pages_to_analysis_result(
+    await summarizer.summarize_pages(
         firestore_client=firestore_client,
+        storage_client=storage_client,
+        openai_client=openai_client,
         user_id=user_id,
         file_uuid=uuid,
+        page_refs=page_refs,
         target_collection='documents',
-        pages=pages,
     )
 
 
@@ -303,7 +266,7 @@ async def get_financial_statements_by_uuid(
     firebase_client: FirebaseClient = Depends(get_firebase_client),
     openai_client: openai.ChatCompletion = Depends(get_openai_client),
 ):
-    """指定されたPDFファイルの最初の10ページまでを画像としてBase64エンコードして返す"""
+    """指定されたPDFファイルの最初の10ページまでのページ画像を用意し、要約をバックグラウンドで実行する"""
     try:
         # 認証とクライアントの取得
         user_id = verify_auth(request)
@@ -313,16 +276,22 @@ async def get_financial_statements_by_uuid(
         # プロジェクトとドキュメント情報の取得
         project_id = get_selected_project_id(firestore_client, user_id)
         file_name, file_info = get_document_info(firestore_client, user_id, project_id, uuid)
-        # PDFデータの取得と処理
-        pdf_bytes = get_pdf_bytes(storage_client, user_id, uuid, file_name)
-        total_pages, encoded_pages = process_pdf_pages(pdf_bytes)
+        # ページ画像の用意（生成済みの画像は再利用し、不足分のみ描画する）
+        page_refs = await preview.ensure_page_images(
+            storage_client,
+            user_id,
+            project_id,
+            uuid,
+            source_blob_path=f"{user_id}/{uuid}_{file_name}",
+        )
 
         background_tasks.add_task(
             process_pages_in_background,
             firestore_client,
+            storage_client,
             user_id,
             uuid,
-            encoded_pages,
+            page_refs,
             openai_client,
         )
         return {"message": "PDF processing started in background"}
@@ -398,6 +367,49 @@ async def get_financial_statement_pages(
         raise HTTPException(status_code=500, detail=f"Error retrieving pages: {str(e)}")
 
 
+class ResGetFinancialStatementProgress(BaseJSONSchema):
+    """GET `/explorer/financial_statements/{uuid}/progress` response schema"""
+
+    completed: int = Field(0, description='要約が完了したページ数')
+    skipped: int = Field(0, description='画像に変更がなく要約を省略したページ数')
+    failed: int = Field(0, description='要約に失敗したページ数')
+    total: int = Field(0, description='対象ページ数')
+
+
+@router.get(
+    "/financial_statements/{uuid}/progress",
+    response_class=ORJSONResponse,
+    responses={
+        status.HTTP_200_OK: {
+            'model': ResGetFinancialStatementProgress,
+            'description': 'Progress retrieved successfully.',
+        },
+    },
+)
+async def get_financial_statement_progress(
+    uuid: str,
+    request: Request,
+    firebase_client: FirebaseClient = Depends(get_firebase_client),
+):
+    """ページ要約の進捗を取得する"""
+    user_id = verify_auth(request)
+    firestore_client = firebase_client.get_firestore()
+
+    progress = firebase_driver.fetch_page_summary_progress(
+        firestore_client=firestore_client,
+        user_id=user_id,
+        file_uuid=uuid,
+        target_collection='documents',
+    )
+    content = ResGetFinancialStatementProgress(
+        completed=progress.get('completed', 0),
+        skipped=progress.get('skipped', 0),
+        failed=progress.get('failed', 0),
+        total=progress.get('total', 0),
+    )
+    return ORJSONResponse(content=jsonable_encoder(content))
+
+
 class BusinessPlanData(BaseJSONSchema):
     period: str = Field(...)
 
@@ -0,0 +1,12 @@
+from fastapi import APIRouter, Response
+
+from src.core.services import metrics
+
+router = APIRouter(tags=['metrics'])
+
+
+@router.get('/metrics', include_in_schema=False)
+async def get_metrics():
+    """Prometheus 形式のメトリクス。gunicorn の全ワーカー分を集計して返す"""
+    content, content_type = metrics.render_metrics()
+    return Response(content=content, media_type=content_type)
@@ -1,6 +1,5 @@
 import asyncio
 import logging
-import uuid
 from datetime import datetime
 from decimal import Decimal
 from enum import Enum
@@ -19,7 +18,9 @@ import src.core.services.firebase_driver as firebase_driver
 from src.dependencies.auth import get_user_id
 from src.dependencies.external import get_openai_client
 from src.core.models.plan import Step, TempSaaSMetrics, all_fields_are_none
+from src.core.services import metric_codec, projection_aggregate, projection_option
 from src.core.services.firebase_client import FirebaseClient, get_firebase_client
+from src.core.services.query import parameter_metrics
 
 from ._base import BaseJSONSchema
 
@@ -311,13 +312,11 @@ async def get_parameter_sales(
     firestore_client = firebase_client.get_firestore()
 
     try:
-        data = firebase_driver.fetch_page_parameter_analysis(
-            firestore_client,
-            user_id,
-        )
-        result = convert_business_summary_to_financial_response(data)
+        records = parameter_metrics.fetch_parameter_records(firestore_client, user_id)
+        frame = parameter_metrics.load_summary_frame(records)
+        result = parameter_metrics.build_financial_data(frame)
 
-        return FinancialResponse(data=result)
+        return ORJSONResponse(content={"data": result})
 
     except Exception as e:
         logger.error(f'error: {e}')
@@ -435,49 +434,31 @@ def save_parameters(
         raise ValueError("No project selected for the user")
 
     selected_project_id = selected_project[0].id
-    doc_ref = (
-        firestore_client.collection('users')
-        .document(user_id)
-        .collection('projects')
-        .document(selected_project_id)
-        .collection('projection')
-        .document('period')
-        .collection('year')
-        .document(str(summary.period.year))
-        .collection('month')
-        .document(str(summary.period.month))
-        .collection('option')
-        .document(str(uuid.uuid4()))
+    option = metric_codec.build_option(
+        file_uuid,
+        page_number,
+        summary.business_scope,
+        saas_revenue_metrics=summary.saas_revenue_metrics,
+        saas_customer_metrics=summary.saas_customer_metrics,
     )
 
     try:
-        doc_ref.set(
-            {
-                'file_uuid': str(file_uuid),
-                'page_number': page_number,
-                'business_scope': {
-                    'scope_type': summary.business_scope.scope_type,
-                    'company_name': summary.business_scope.company_name,
-                    'department_name': summary.business_scope.department_name,
-                    'product_name': summary.business_scope.product_name,
-                },
-                'saas_revenue_metrics': {
-                    'revenue': str(summary.saas_revenue_metrics.revenue),
-                    'mrr': str(summary.saas_revenue_metrics.mrr),
-                    'arr': str(summary.saas_revenue_metrics.arr),
-                    'arpu': str(summary.saas_revenue_metrics.arpu),
-                    'expansion_revenue': str(summary.saas_revenue_metrics.expansion_revenue),
-                    'new_customer_revenue': str(summary.saas_revenue_metrics.new_customer_revenue),
-                },
-                'saas_customer_metrics': {
-                    'churn_rate': str(summary.saas_customer_metrics.churn_rate),
-                    'retention_rate': str(summary.saas_customer_metrics.retention_rate),
-                    'active_users': str(summary.saas_customer_metrics.active_users),
-                    'trial_conversion_rate': str(summary.saas_customer_metrics.trial_conversion_rate),
-                    'average_contract_value': str(summary.saas_customer_metrics.average_contract_value),
-                    'nrr': str(summary.saas_customer_metrics.nrr),
-                },
-            }
+        current, merged = projection_option.upsert_option(
+            firestore_client,
+            user_id,
+            selected_project_id,
+            summary.period.year,
+            summary.period.month,
+            option,
+        )
+        projection_aggregate.apply_option(
+            firestore_client,
+            user_id,
+            selected_project_id,
+            summary.period.year,
+            summary.period.month,
+            current,
+            merged,
         )
         return
 
@@ -2,11 +2,11 @@ import logging
 import traceback
 import uuid
 
-from fastapi import APIRouter, Depends, HTTPException, Request
+from fastapi import APIRouter, Depends, HTTPException
 from pydantic import BaseModel
 
-from src.core.services import auth_service
 from src.core.services.firebase_client import FirebaseClient, get_firebase_client
+from src.dependencies.auth import get_user_id
 
 router = APIRouter()
 logger = logging.getLogger(__name__)
@@ -25,18 +25,10 @@ class ProjectResponse(BaseModel):
 
 @router.post("/projects", response_model=ProjectResponse)
 async def create_project(
-    request: Request,
     project_data: ProjectCreate,
     firebase_client: FirebaseClient = Depends(get_firebase_client),
+    user_id: str = Depends(get_user_id),
 ):
-    authorization = request.headers.get("Authorization")
-    if not authorization:
-        raise HTTPException(status_code=401, detail="Authorization header missing")
-
-    user_id = auth_service.verify_token(authorization)
-    if not user_id:
-        raise HTTPException(status_code=401, detail="Invalid token")
-
     project_id = str(uuid.uuid4())
 
     # Firestoreに保存するデータ
@@ -67,17 +59,9 @@ async def create_project(
 @router.patch("/projects/{project_id}/select")
 async def select_project(
     project_id: str,
-    request: Request,
     firebase_client: FirebaseClient = Depends(get_firebase_client),
+    user_id: str = Depends(get_user_id),
 ):
-    authorization = request.headers.get("Authorization")
-    if not authorization:
-        raise HTTPException(status_code=401, detail="Authorization header missing")
-
-    user_id = auth_service.verify_token(authorization)
-    if not user_id:
-        raise HTTPException(status_code=401, detail="Invalid token")
-
     try:
         firestore_client = firebase_client.get_firestore()
         projects_ref = firestore_client.collection('users').document(user_id).collection('projects')
@@ -101,17 +85,9 @@ async def select_project(
 
 @router.get("/projects", response_model=list[ProjectResponse])
 async def get_projects(
-    request: Request,
     firebase_client: FirebaseClient = Depends(get_firebase_client),
+    user_id: str = Depends(get_user_id),
 ):
-    authorization = request.headers.get("Authorization")
-    if not authorization:
-        raise HTTPException(status_code=401, detail="Authorization header missing")
-
-    user_id = auth_service.verify_token(authorization)
-    if not user_id:
-        raise HTTPException(status_code=401, detail="Invalid token")
-
     try:
         firestore_client = firebase_client.get_firestore()
         projects_ref = firestore_client.collection('users').document(user_id).collection('projects')
@@ -137,15 +113,10 @@ async def get_projects(
 
 
 @router.get("/projects/selected")
-async def get_selected_project(request: Request, firebase_client: FirebaseClient = Depends(get_firebase_client)):
-    authorization = request.headers.get("Authorization")
-    if not authorization:
-        raise HTTPException(status_code=401, detail="Authorization header missing")
-
-    user_id = auth_service.verify_token(authorization)
-    if not user_id:
-        raise HTTPException(status_code=401, detail="Invalid token")
-
+async def get_selected_project(
+    firebase_client: FirebaseClient = Depends(get_firebase_client),
+    user_id: str = Depends(get_user_id),
+):
     try:
         # Firestore から選択されたプロジェクトを取得 (is_selected が True のもの)
         firestore_client = firebase_client.get_firestore()
@@ -170,17 +141,9 @@ async def get_selected_project(request: Request, firebase_client: FirebaseClient
 @router.patch("/projects/{project_id}/archive")
 async def archive_project(
     project_id: str,
-    request: Request,
     firebase_client: FirebaseClient = Depends(get_firebase_client),
+    user_id: str = Depends(get_user_id),
 ):
-    authorization = request.headers.get("Authorization")
-    if not authorization:
-        raise HTTPException(status_code=401, detail="Authorization header missing")
-
-    user_id = auth_service.verify_token(authorization)
-    if not user_id:
-        raise HTTPException(status_code=401, detail="Invalid token")
-
     firestore_client = firebase_client.get_firestore()
     doc_ref = firestore_client.collection('users').document(user_id).collection('projects').document(project_id)
 
@@ -198,18 +161,9 @@ async def archive_project(
 @router.delete("/projects/{project_id}")
 async def delete_project(
     project_id: str,
-    request: Request,
     firebase_client: FirebaseClient = Depends(get_firebase_client),
+    user_id: str = Depends(get_user_id),
 ):
-    authorization = request.headers.get("Authorization")
-    if not authorization:
-        raise HTTPException(status_code=401, detail="Authorization header missing")
-
-    # トークンから user_id を取得
-    user_id = auth_service.verify_token(authorization)
-    if not user_id:
-        raise HTTPException(status_code=401, detail="Invalid token")
-
     # Firestoreからプロジェクトを削除
     firestore_client = firebase_client.get_firestore()
     doc_ref = firestore_client.collection('users').document(user_id).collection('projects').document(project_id)
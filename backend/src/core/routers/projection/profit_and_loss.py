@@ -10,9 +10,10 @@ from src.dependencies.auth import get_user_id
 from src.dependencies.external import get_openai_client
 from src.core.routers._base import BaseJSONSchema
 from src.core.services.endpoints.projection import process_profit_and_loss_metrics
+from src.core.services import projection_aggregate
 from src.core.services.firebase_client import FirebaseClient, get_firebase_client
 import src.core.services.firebase_driver as firebase_driver
-from src.core.services.query import profit_and_loss
+from src.core.services.upload import pdf_processor
 
 logger = logging.getLogger(__name__)
 router = APIRouter()
@@ -83,103 +84,43 @@ class ResGetPLMetrics(BaseJSONSchema):
     rows: list[GetPLMetrics] = Field(None, description='月ごとのデータ')
 
 
-def get_image_url(
-    storage_client,
-    user_id: str,
-    project_id: str,
-    file_uuid: str,
-    page_number: int
-):
-    blobs = storage_client.list_blobs(prefix=f"{user_id}/projects/{project_id}/image/{file_uuid}/{page_number}")
-    for blob in blobs:
-        url = blob.generate_signed_url(expiration=3600, method='GET', version='v4')
-    return url
-
-
-def add_or_update_monthly_data(
-    storage_client,
-    user_id: str,
-    project_id: str,
-    monthly_data: dict,
-    summary: dict,
-    year: int,
-    data_key: str,
-):
-    """月ごとのデータを追加または更新する"""
-    month = summary["month"]
-    url = get_image_url(storage_client, user_id, project_id, summary["file_uuid"], int(summary["page_number"]))
-
-    # 初期データの作成
-    if month not in monthly_data:
-        monthly_data[month] = GetPLMetrics(
-            period=ResPeriod(year=year, month=month), page_number=summary["page_number"], items=[]
+def get_image_url(storage_client, blob_path: str) -> str:
+    """ページ画像の署名付きURLを生成する（Storageへの問い合わせは行わない）"""
+    return storage_client.blob(blob_path).generate_signed_url(expiration=3600, method='GET', version='v4')
+
+
+def build_metrics_response(storage_client, user_id: str, project_id: str, aggregate: dict, year: int) -> ResGetPLMetrics:
+    """月次集計ドキュメントからレスポンスを作成する。署名付きURLはページごとに1度だけ生成する"""
+    urls = {}
+
+    def url_for(file_uuid: str, page_number: int) -> str:
+        blob_path = pdf_processor.get_page_image_path(user_id, project_id, file_uuid, page_number)
+        if blob_path not in urls:
+            urls[blob_path] = get_image_url(storage_client, blob_path)
+        return urls[blob_path]
+
+    rows = []
+    for month, month_data in sorted(aggregate.get('months', {}).items(), key=lambda item: int(item[0])):
+        items = [
+            Params(
+                key=item['key'],
+                title=item['title'],
+                values=[
+                    Items(value=value['value'], url=url_for(value['file_uuid'], value['page_number']))
+                    for value in item['values']
+                ],
+            )
+            for item in month_data['items']
+        ]
+        rows.append(
+            GetPLMetrics(
+                period=ResPeriod(year=year, month=int(month)),
+                page_number=month_data['page_number'],
+                items=items,
+            )
         )
 
-    keys_and_titles = [
-        ("revenue", "売上高"),
-        ("cogs", "売上原価"),
-        ("gross_profit_margin", "売上総利益率"),
-        ("sg_and_a", "販売費・一般管理費"),
-        ("operating_income", "営業利益"),
-        ("operating_income_margin", "営業利益率"),
-        ("non_operating_income", "営業外収益"),
-        ("non_operating_expenses", "営業外費用"),
-        ("ordinary_income", "経常利益"),
-        ("extraordinary_income", "特別利益"),
-        ("extraordinary_losses", "特別損失"),
-        ("profit_before_tax", "税引前当期純利益"),
-        ("corporate_taxes", "法人税等"),
-        ("net_income", "当期純利益"),
-        ("ebitda", "EBITDA"),
-        ("psr", "株価収益率 (PSR)"),
-        ("ev_to_ebitda", "企業価値倍率 (EV/EBITDA)"),
-        ("arpu", "ARPU(ユーザー1人あたりの平均収益)"),
-        ("mrr", "MRR"),
-        ("arr", "ARR"),
-        ("expansion_revenue", "既存顧客からの追加収益（アップセル・クロスセル）"),
-        ("new_customer_revenue", "新規顧客からの収益"),
-        ("churn_rate", "解約率"),
-        ("retention_rate", "継続率"),
-        ("active_users", "アクティブユーザー数"),
-        ("trial_conversion_rate", "無料トライアルから有料プランへの転換率"),
-        ("average_contract_value", "顧客1件あたりの平均契約額"),
-    ]
-
-    for key, title in keys_and_titles:
-        value = None
-        if isinstance(summary, dict) and isinstance(summary.get(data_key), dict):
-            value = summary.get(data_key, {}).get(key)
-
-        if value is not None:
-            # 既存データの確認
-            existing_param = next((param for param in monthly_data[month].items if param.key == key), None)
-            if not existing_param:
-                # 新規追加
-                monthly_data[month].items.append(
-                    Params(key=key, title=title, values=[Items(value=str(value), url=url)])
-                )
-            else:
-                # 既存項目への追加
-                existing_values = [item.value for item in existing_param.values]
-                if str(value) not in existing_values:
-                    existing_param.values.append(Items(value=str(value), url=url))
-
-
-def process_summaries(storage_client, user_id: str, project_id: str, summaries: list[dict], year: int) -> ResGetPLMetrics:
-    """すべてのサマリーを処理して月ごとのデータを生成する"""
-    monthly_data = {}
-
-    for summary in summaries:
-        if summary["business_scope"]["scope_type"] == "company":
-            data_key = 'profit_and_loss'
-            add_or_update_monthly_data(storage_client, user_id, project_id, monthly_data, summary, year, data_key)
-        else:
-            data_key = 'saas_customer_metrics'
-            add_or_update_monthly_data(storage_client, user_id, project_id, monthly_data, summary, year, data_key)
-            data_key = 'saas_revenue_metrics'
-            add_or_update_monthly_data(storage_client, user_id, project_id, monthly_data, summary, year, data_key)
-
-    return ResGetPLMetrics(rows=list(monthly_data.values()))
+    return ResGetPLMetrics(rows=rows)
 
 
 @router.get(
@@ -201,12 +142,8 @@ async def get_projection_profit_and_loss_metrics(
     project_id = firebase_driver.get_project_id(user_id, firestore_client)
 
     try:
-        summaries = profit_and_loss.fetch_metrics_by_year(
-            firestore_client,
-            user_id,
-            year,
-        )
-        content = process_summaries(storage_client, user_id, project_id, summaries, year)
+        aggregate = projection_aggregate.load_aggregate(firestore_client, user_id, project_id, year)
+        content = build_metrics_response(storage_client, user_id, project_id, aggregate, year)
 
         return ORJSONResponse(content=jsonable_encoder(content))
 
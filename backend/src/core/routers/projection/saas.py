@@ -1,5 +1,4 @@
 import logging
-import uuid
 
 import openai
 from fastapi import APIRouter, BackgroundTasks, Depends, HTTPException, status
@@ -11,6 +10,7 @@ from pydantic import BaseModel, Field
 from src.dependencies.auth import get_user_id
 from src.dependencies.external import get_openai_client
 from src.core.models.plan import Step, TempSaaSMetrics
+from src.core.services import metric_codec, projection_aggregate, projection_option
 from src.core.services.firebase_client import FirebaseClient, get_firebase_client
 from src.settings import Settings
 
@@ -80,81 +80,31 @@ def save_parameters(
         raise ValueError("No project selected for the user")
 
     selected_project_id = selected_project[0].id
-    doc_ref = (
-        firestore_client.collection('users')
-        .document(user_id)
-        .collection('projects')
-        .document(selected_project_id)
-        .collection('projection')
-        .document('period')
-        .collection('year')
-        .document(str(summary.period.year))
-        .collection('month')
-        .document(str(summary.period.month))
-        .collection('option')
-        .document(str(uuid.uuid4()))
+    option = metric_codec.build_option(
+        file_uuid,
+        page_number,
+        summary.business_scope,
+        saas_revenue_metrics=summary.saas_revenue_metrics,
+        saas_customer_metrics=summary.saas_customer_metrics,
     )
 
     try:
-        doc_ref.set(
-            {
-                'file_uuid': str(file_uuid),
-                'page_number': page_number,
-                'business_scope': {
-                    'scope_type': summary.business_scope.scope_type,
-                    'company_name': summary.business_scope.company_name,
-                    'department_name': summary.business_scope.department_name,
-                    'product_name': summary.business_scope.product_name,
-                },
-                'saas_revenue_metrics': (
-                    {
-                        'revenue': str(summary.saas_revenue_metrics.revenue) if summary.saas_revenue_metrics else None,
-                        'mrr': str(summary.saas_revenue_metrics.mrr) if summary.saas_revenue_metrics else None,
-                        'arr': str(summary.saas_revenue_metrics.arr) if summary.saas_revenue_metrics else None,
-                        'arpu': str(summary.saas_revenue_metrics.arpu) if summary.saas_revenue_metrics else None,
-                        'expansion_revenue': (
-                            str(summary.saas_revenue_metrics.expansion_revenue)
-                            if summary.saas_revenue_metrics
-                            else None
-                        ),
-                        'new_customer_revenue': (
-                            str(summary.saas_revenue_metrics.new_customer_revenue)
-                            if summary.saas_revenue_metrics
-                            else None
-                        ),
-                    }
-                    if summary.saas_revenue_metrics
-                    else None
-                ),
-                'saas_customer_metrics': (
-                    {
-                        'churn_rate': (
-                            str(summary.saas_customer_metrics.churn_rate) if summary.saas_customer_metrics else None
-                        ),
-                        'retention_rate': (
-                            str(summary.saas_customer_metrics.retention_rate)
-                            if summary.saas_customer_metrics
-                            else None
-                        ),
-                        'active_users': (
-                            str(summary.saas_customer_metrics.active_users) if summary.saas_customer_metrics else None
-                        ),
-                        'trial_conversion_rate': (
-                            str(summary.saas_customer_metrics.trial_conversion_rate)
-                            if summary.saas_customer_metrics
-                            else None
-                        ),
-                        'average_contract_value': (
-                            str(summary.saas_customer_metrics.average_contract_value)
-                            if summary.saas_customer_metrics
-                            else None
-                        ),
-                        'nrr': str(summary.saas_customer_metrics.nrr) if summary.saas_customer_metrics else None,
-                    }
-                    if summary.saas_customer_metrics
-                    else None
-                ),
-            }
+        current, merged = projection_option.upsert_option(
+            firestore_client,
+            user_id,
+            selected_project_id,
+            summary.period.year,
+            summary.period.month,
+            option,
+        )
+        projection_aggregate.apply_option(
+            firestore_client,
+            user_id,
+            selected_project_id,
+            summary.period.year,
+            summary.period.month,
+            current,
+            merged,
         )
         return
 
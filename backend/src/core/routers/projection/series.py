@@ -0,0 +1,69 @@
+import logging
+
+from fastapi import APIRouter, Depends, HTTPException, Query, status
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import ORJSONResponse
+from pydantic import Field
+
+from src.dependencies.auth import get_user_id
+from src.core.routers._base import BaseJSONSchema
+from src.core.services.firebase_client import FirebaseClient, get_firebase_client
+import src.core.services.firebase_driver as firebase_driver
+from src.core.services.query import metrics_series
+
+logger = logging.getLogger(__name__)
+router = APIRouter()
+
+
+class ResGetMetricSeries(BaseJSONSchema):
+    """GET `/projection/series` response schema."""
+
+    periods: list[str] = Field(..., description='期間の一覧。YYYY-MM形式')
+    series: dict[str, list[float | None]] = Field(..., description='指標ごとの値。periods と同じ順序')
+    sources: dict[str, list[int]] = Field(..., description='指標ごとの、値を報告した資料の件数')
+    business_scope: dict | None = Field(None, description='値を返した事業の範囲（種類・会社・部署・製品）')
+
+
+@router.get(
+    "/series",
+    response_class=ORJSONResponse,
+    responses={
+        status.HTTP_200_OK: {
+            'description': 'metric series retrieved successfully.',
+        }
+    },
+)
+async def get_projection_metric_series(
+    keys: list[str] = Query(..., description='指標のキー。例: revenue'),
+    start: str = Query(..., description='開始月。YYYY-MM形式'),
+    end: str = Query(..., description='終了月。YYYY-MM形式'),
+    scope_type: metrics_series.ScopeType = Query('company', description='事業の範囲'),
+    company_name: str | None = Query(None, description='会社名。複数の会社の値がある場合に指定する'),
+    department_name: str | None = Query(None, description='部署名'),
+    product_name: str | None = Query(None, description='製品名'),
+    firebase_client: FirebaseClient = Depends(get_firebase_client),
+    user_id: str = Depends(get_user_id),
+):
+    firestore_client = firebase_client.get_firestore()
+    project_id = firebase_driver.get_project_id(user_id, firestore_client)
+
+    try:
+        result = await metrics_series.fetch_metric_series(
+            firestore_client,
+            user_id,
+            project_id,
+            keys=keys,
+            start=start,
+            end=end,
+            scope_type=scope_type,
+            company_name=company_name,
+            department_name=department_name,
+            product_name=product_name,
+        )
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+    content = ResGetMetricSeries(
+        periods=result.periods, series=result.series, sources=result.sources, business_scope=result.business_scope
+    )
+    return ORJSONResponse(content=jsonable_encoder(content))
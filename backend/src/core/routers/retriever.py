@@ -344,8 +344,6 @@ async def send_chat_message(
             content=jsonable_encoder(SendMessageResponse(message=default_system_text)),
             status_code=status.HTTP_200_OK
         )
-    finally:
-        doc_repository.client.close()
 
     # response が取得できなかったり、オブジェクトが空の場合
     if not response or not response.objects:
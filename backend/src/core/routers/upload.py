@@ -8,17 +8,16 @@ from datetime import timedelta
 from fastapi import APIRouter, Depends, HTTPException
 from fastapi.encoders import jsonable_encoder
 from fastapi.responses import ORJSONResponse
-from google.cloud import tasks_v2
 from pydantic import BaseModel, Field
 from pydantic_core import ValidationError
 
 import src.core.services.firebase_driver as firebase_driver
 from src.dependencies.auth import get_user_id
-from src.dependencies.cloud_tasks import get_cloud_tasks_client, get_queue_path
+from src.dependencies.cloud_tasks import get_task_dispatcher
 from src.core.services.endpoints import projection
 from src.core.services.firebase_client import FirebaseClient, get_firebase_client
 from src.core.services.upload import generate_summary, pdf_processor
-from src.core.services.worker import cloud_tasks, models
+from src.core.services.worker import dispatcher, ledger, models, progress
 from src.settings import Settings
 
 from ._base import BaseJSONSchema
@@ -210,8 +209,7 @@ async def create_task(
     request: ReqPostUploadCreateTask,
     firebase_client: FirebaseClient = Depends(get_firebase_client),
     user_id: str = Depends(get_user_id),
-    cloud_tasks_client: tasks_v2.CloudTasksClient = Depends(get_cloud_tasks_client),
-    queue_path: str = Depends(get_queue_path),
+    task_dispatcher: dispatcher.TaskDispatcher = Depends(get_task_dispatcher),
 ):
     """
     Singned URLによりファイルがアップロードされる
@@ -219,6 +217,8 @@ async def create_task(
     """
     firestore_client = firebase_client.get_firestore()
     project_id = firebase_driver.get_project_id(user_id, firestore_client)
+    # 同じファイルを再解析しても前回のタスク名・リースと重ならないよう、解析を始めるたびに新しいIDを使う
+    run_id = uuid.uuid4().hex[:12]
 
     match request.content_type:
         case "application/pdf":
@@ -228,18 +228,44 @@ async def create_task(
                 gcs_path=request.gcs_path,
                 filename=request.filename,
                 file_uuid=request.file_uuid,
+                run_id=run_id,
             )
-            worker_url = f'{Settings.google_cloud.api_base_url}/worker/file:separate'
-            task = cloud_tasks.create_task_payload(worker_url, payload_summary)
-
-            try:
-                logger.info("Creating a new task in Cloud Tasks...")
-                response = cloud_tasks_client.create_task(parent=queue_path, task=task)
-                eta = response.schedule_time.strftime("%m/%d/%Y, %H:%M:%S")
-                logger.info(f"Task created successfully: {response.name}, {eta}")
+            progress.update_progress(
+                progress.start_progress, firestore_client, user_id, request.file_uuid, request.filename
+            )
+            result = await task_dispatcher.enqueue(
+                [
+                    dispatcher.TaskRequest.from_model(
+                        '/worker/file:separate',
+                        payload_summary,
+                        ledger.get_task_id(request.file_uuid, 'separate', run_id=run_id),
+                    )
+                ]
+            )
+            logger.info(f"Task created: {result.created}, coalesced: {result.coalesced}, failed: {result.failed}")
 
-            except Exception as e:
-                logger.error(f"Error occurred while creating a task: {e}")
+        case "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet":
+            payload_workbook = models.SingedUrlMetadata(
+                user_id=user_id,
+                project_id=project_id,
+                gcs_path=request.gcs_path,
+                filename=request.filename,
+                file_uuid=request.file_uuid,
+                run_id=run_id,
+            )
+            progress.update_progress(
+                progress.start_progress, firestore_client, user_id, request.file_uuid, request.filename
+            )
+            result = await task_dispatcher.enqueue(
+                [
+                    dispatcher.TaskRequest.from_model(
+                        '/worker/workbook:analyze',
+                        payload_workbook,
+                        ledger.get_task_id(request.file_uuid, 'workbook', run_id=run_id),
+                    )
+                ]
+            )
+            logger.info(f"Workbook task created: {result.created}, coalesced: {result.coalesced}")
 
     return {"filename": request.filename, "status": "解析を始めます"}
 
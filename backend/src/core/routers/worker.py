@@ -1,21 +1,24 @@
+import asyncio
 import logging
+from typing import TYPE_CHECKING, Optional
 
-import fitz
 import openai
 from fastapi import APIRouter, Depends, HTTPException, Request
-from fastapi.responses import JSONResponse
-from google.cloud import tasks_v2
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import JSONResponse, ORJSONResponse, StreamingResponse
 from pydantic import Field
 from pydantic_core import ValidationError
 
-from src.dependencies.cloud_tasks import get_cloud_tasks_client, get_queue_path
+from src.dependencies.auth import get_user_id
+from src.dependencies.cloud_tasks import get_task_dispatcher
 import src.core.services.firebase_driver as firebase_driver
 from src.dependencies.external import get_openai_client
 from src.core.services.endpoints import projection
+from src.core.services import tracing
 from src.core.services.firebase_client import FirebaseClient, get_firebase_client
 from src.core.services.openai_client import extract_document_information
-from src.core.services.upload import generate_summary, pdf_processor
-from src.core.services.worker import cloud_tasks, models, chat_client
+from src.core.services.upload import generate_summary, pdf_processor, table_preview, workbook_processor
+from src.core.services.worker import models, chat_client, dispatcher, ledger, page_batch, progress
 from src.settings import Settings
 from src.schemas.documents import Documents, Item
 from src.repositories.abstract import DocumentRepository
@@ -23,6 +26,9 @@ from src.dependencies.document_repository import get_document_repository
 
 from ._base import BaseJSONSchema
 
+if TYPE_CHECKING:
+    import fitz
+
 
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
@@ -31,7 +37,7 @@ router = APIRouter(prefix='/worker', tags=['worker'])
 
 
 def extract_headding_text(
-    pdf_document: fitz.Document,
+    pdf_document: 'fitz.Document',
     text_length: int = 2000,
 ) -> str:
     full_text_list = []
@@ -43,12 +49,21 @@ def extract_headding_text(
     return extracted_text
 
 
+def duplicate_response(lease: ledger.TaskLease) -> JSONResponse:
+    """
+    重複して配信されたタスクへのレスポンス
+    実行中のタスクは 409 を返し、リースの期限が切れた後に Cloud Tasks から再試行させる
+    """
+    if lease.status == 'completed':
+        return JSONResponse({"status": "duplicate", "stage": lease.stage, "page": lease.page}, status_code=200)
+    return JSONResponse({"status": "in_progress", "stage": lease.stage, "page": lease.page}, status_code=409)
+
+
 @router.post('/file:separate')
 async def worker_file_separate(
     request: Request,
     firebase_client: FirebaseClient = Depends(get_firebase_client),
-    cloud_tasks_client: tasks_v2.CloudTasksClient = Depends(get_cloud_tasks_client),
-    queue_path: str = Depends(get_queue_path),
+    task_dispatcher: dispatcher.TaskDispatcher = Depends(get_task_dispatcher),
 ):
     """
     upload/taskが完了した時点でファイルのURLが取得できるようになっている状態。
@@ -60,13 +75,32 @@ async def worker_file_separate(
         return {"message": "No data received, processing skipped."}
 
     metadata = models.SingedUrlMetadata.model_validate_json(raw_body)
+    firestore_client = firebase_client.get_firestore()
+
+    tracing.bind(file_uuid=metadata.file_uuid, stage='separate')
+    async with ledger.task_lease(
+        firestore_client, metadata.user_id, metadata.file_uuid, 'separate', run_id=metadata.run_id
+    ) as lease:
+        if not lease.acquired:
+            return duplicate_response(lease)
+        return await separate_file(metadata, firestore_client, firebase_client.get_storage(), task_dispatcher)
+
+
+async def separate_file(
+    metadata: models.SingedUrlMetadata,
+    firestore_client,
+    storage_client,
+    task_dispatcher: dispatcher.TaskDispatcher,
+) -> dict:
+    """PDFをページごとに画像化して保存し、サマリーとページごとの解析タスクを登録する"""
+    import fitz
 
     # GCS から PDF をダウンロード
-    storage_client = firebase_client.get_storage()
     blob = storage_client.blob(metadata.gcs_path)
 
     try:
-        pdf_binary = blob.download_as_bytes()
+        with tracing.span('storage.download_pdf'):
+            pdf_binary = blob.download_as_bytes()
     except Exception as e:
         logger.exception(f"Failed to download PDF from GCS. GCS Path: {metadata.gcs_path}")
         raise HTTPException(status_code=500, detail="Failed to download PDF from GCS.")
@@ -83,20 +117,25 @@ async def worker_file_separate(
 
             for page_number in range(max_pages):
                 #logger.info(f"Converting page {page_number+1}/{max_pages} to image...")
-                image_bytes = pdf_processor.convert_pdf_page_to_image(pdf_document, page_number)
+                with tracing.span('pdf.rasterize', page=page_number):
+                    image_bytes = pdf_processor.convert_pdf_page_to_image(pdf_document, page_number)
 
                 # 画像を GCS にアップロード
-                await pdf_processor.upload_image_to_firebase(
-                    image_bytes=image_bytes,
-                    user_id=metadata.user_id,
-                    project_id=metadata.project_id,
-                    page_number=page_number,
-                    file_uuid=metadata.file_uuid,
-                    storage_client=storage_client
-                )
+                with tracing.span('storage.upload_image', page=page_number):
+                    await pdf_processor.upload_image_to_firebase(
+                        image_bytes=image_bytes,
+                        user_id=metadata.user_id,
+                        project_id=metadata.project_id,
+                        page_number=page_number,
+                        file_uuid=metadata.file_uuid,
+                        storage_client=storage_client
+                    )
                 #logger.info(f"Page {page_number+1} upload completed.")
 
         logger.info("All pages successfully converted and uploaded.")
+        progress.update_progress(
+            progress.set_pages_split, firestore_client, metadata.user_id, metadata.file_uuid, max_pages
+        )
 
     except Exception as e:
         logger.exception("Error occurred while splitting PDF.")
@@ -108,49 +147,138 @@ async def worker_file_separate(
         file_uuid=metadata.file_uuid,
         file_name=metadata.filename,
         summary_text=extracted_text,
+        run_id=metadata.run_id,
     )
-    worker_summary_url = f'{Settings.google_cloud.api_base_url}/worker/summary:analyze'
-    task = cloud_tasks.create_task_payload(worker_summary_url, payload_summary)
+    requests = [
+        dispatcher.TaskRequest.from_model(
+            '/worker/summary:analyze',
+            payload_summary,
+            ledger.get_task_id(metadata.file_uuid, 'summary', run_id=metadata.run_id),
+        )
+    ]
 
-    try:
-        response = cloud_tasks_client.create_task(parent=queue_path, task=task)
-        eta = response.schedule_time.strftime("%m/%d/%Y, %H:%M:%S")
-        logger.info(f"Task created successfully: {response.name}, {eta}")
+    # 3. 画像ごと文章情報を解析する処理、4. 画像ごと数値情報を解析する処理（事業計画用）
+    # WORKER_PAGE_BATCH_SIZE ページずつ1つのタスクにまとめる
+    for start_page, end_page in page_batch.split_pages(max_pages, Settings.worker_page_batch_size):
+        payload_pages = models.PageBatchMetadata(
+            user_id=metadata.user_id,
+            project_id=metadata.project_id,
+            file_uuid=metadata.file_uuid,
+            file_name=metadata.filename,
+            start_page=start_page,
+            end_page=end_page,
+            max_page_number=max_pages,
+            run_id=metadata.run_id,
+        )
+        requests.append(
+            dispatcher.TaskRequest.from_model(
+                '/worker/pages:analyze',
+                payload_pages,
+                ledger.get_task_id(metadata.file_uuid, 'pages', start_page, metadata.run_id),
+            )
+        )
+
+    result = await task_dispatcher.enqueue(requests)
+    logger.info(f"Tasks created: {result.created}, coalesced: {result.coalesced}, failed: {result.failed}")
+
+    return {"message": "PDF splitting and image upload completed successfully."}
+
+
+@router.post('/workbook:analyze')
+async def worker_workbook_analyze(
+    request: Request,
+    firebase_client: FirebaseClient = Depends(get_firebase_client),
+    openai_client: openai.ChatCompletion = Depends(get_openai_client),
+):
+    """
+    upload/taskからPOSTされるxlsxファイルを解析する
+    全シートを並列に抽出し、シートごとの要約とファイル全体のサマリーを保存する
+    """
+    raw_body = await request.body()
+    if not raw_body:
+        logger.error("No data received. Skipping processing.")
+        return {"message": "No data received, processing skipped."}
+
+    metadata = models.SingedUrlMetadata.model_validate_json(raw_body)
+    firestore_client = firebase_client.get_firestore()
 
+    tracing.bind(file_uuid=metadata.file_uuid, stage='workbook')
+    async with ledger.task_lease(
+        firestore_client, metadata.user_id, metadata.file_uuid, 'workbook', run_id=metadata.run_id
+    ) as lease:
+        if not lease.acquired:
+            return duplicate_response(lease)
+        return await analyze_workbook(metadata, firestore_client, firebase_client.get_storage(), openai_client)
+
+
+async def analyze_workbook(
+    metadata: models.SingedUrlMetadata,
+    firestore_client,
+    storage_client,
+    openai_client: openai.ChatCompletion,
+) -> JSONResponse:
+    """ワークブックのプレビューを作成し、シートごとの要約とファイル全体のサマリーを保存する"""
+    try:
+        source_blob = storage_client.get_blob(metadata.gcs_path)
+        if source_blob is None:
+            raise FileNotFoundError(metadata.gcs_path)
+        contents = source_blob.download_as_bytes()
+    except Exception:
+        logger.exception(f"Failed to download workbook from GCS. GCS Path: {metadata.gcs_path}")
+        raise HTTPException(status_code=500, detail="Failed to download workbook from GCS.")
+
+    # /data/table のプレビューはアップロード時に作成する（失敗しても表示時に作り直すため解析は続ける）
+    try:
+        with tracing.span('table.materialize_preview'):
+            await asyncio.to_thread(table_preview.materialize_table_preview, storage_client, source_blob, contents)
     except Exception as e:
-        logger.error(f"Error occurred while creating a task: {e}")
+        logger.warning(f"Failed to materialize table preview for {metadata.gcs_path}: {e}")
 
     try:
-        # pageごとの解析
-        for page_number in range(max_pages):
-            # page要素の抽出
-            payload_page = models.PageMetadata(
-                user_id=metadata.user_id,
-                project_id=metadata.project_id,
-                file_uuid=metadata.file_uuid,
-                file_name=metadata.filename,
-                page_number=str(page_number),
-                max_page_number=str(max_pages),
-            )
+        sheets = await workbook_processor.extract_sheets(contents)
+    except Exception:
+        logger.exception("Error occurred while extracting sheets.")
+        raise HTTPException(status_code=500, detail="Failed to extract sheets from workbook.")
+
+    summaries = await workbook_processor.summarize_sheets(
+        firestore_client=firestore_client,
+        openai_client=openai_client,
+        user_id=metadata.user_id,
+        project_id=metadata.project_id,
+        file_uuid=metadata.file_uuid,
+        sheets=sheets,
+    )
 
-            # 3. 画像ごと文章情報を解析する処理
-            worker_page_analyze_url = f'{Settings.google_cloud.api_base_url}/worker/page:analyze'
-            task_page = cloud_tasks.create_task_payload(worker_page_analyze_url, payload_page)
-            response = cloud_tasks_client.create_task(parent=queue_path, task=task_page)
-            eta = response.schedule_time.strftime("%m/%d/%Y, %H:%M:%S")
-            #logger.info(f"Page analyze task created successfully: {response.name}, {eta}")
+    # ファイル一覧に表示するための基本情報はシートごとの要約から作成する
+    summary_text = "\n".join(f"{summary.sheet_name}: {summary.title}\n{summary.summary}" for summary in summaries)
+    analysis_result = extract_document_information(openai_client=openai_client, content_text=summary_text)
 
-            # 4. 画像ごと数値情報を解析する処理（事業計画用）
-            worker_projection_url = f'{Settings.google_cloud.api_base_url}/worker/projection:analyze'
-            task_projection = cloud_tasks.create_task_payload(worker_projection_url, payload_page)
-            response = cloud_tasks_client.create_task(parent=queue_path, task=task_projection)
-            eta = response.schedule_time.strftime("%m/%d/%Y, %H:%M:%S")
-            #logger.info(f"Projection analyze task created successfully: {response.name}, {eta}")
+    try:
+        firebase_driver.save_analysis_result(
+            firestore_client=firestore_client,
+            user_id=metadata.user_id,
+            file_uuid=metadata.file_uuid,
+            file_name=metadata.filename,
+            analysis_result=analysis_result,
+            target_collection='documents',
+        )
+        # プロジェクトの表の一覧（/data/table が読む索引）にも登録する
+        firebase_driver.save_analysis_result(
+            firestore_client=firestore_client,
+            user_id=metadata.user_id,
+            file_uuid=metadata.file_uuid,
+            file_name=metadata.filename,
+            analysis_result=analysis_result,
+            target_collection='tables',
+        )
 
     except Exception as e:
-        logger.error(f"Error occurred while creating a task for each page: {e}")
+        raise HTTPException(status_code=500, detail=f"Error saving project: {str(e)}")
 
-    return {"message": "PDF splitting and image upload completed successfully."}
+    progress.update_progress(
+        progress.mark_stage, firestore_client, metadata.user_id, metadata.file_uuid, 'summarized', status='completed'
+    )
+    return JSONResponse({"status": "success", "sheets": len(summaries)}, status_code=200)
 
 
 @router.post('/summary:analyze')
@@ -173,22 +301,33 @@ async def worker_summary_analyze(
 
     metadata = models.SummaryMetadata.model_validate_json(raw_body)
 
-    analysis_result = extract_document_information(openai_client=openai_client, content_text=metadata.summary_text)
+    tracing.bind(file_uuid=metadata.file_uuid, stage='summary')
+    async with ledger.task_lease(
+        firestore_client, metadata.user_id, metadata.file_uuid, 'summary', run_id=metadata.run_id
+    ) as lease:
+        if not lease.acquired:
+            return duplicate_response(lease)
 
-    try:
-        firebase_driver.save_analysis_result(
-            firestore_client=firestore_client,
-            user_id=metadata.user_id,
-            file_uuid=metadata.file_uuid,
-            file_name=metadata.file_name,
-            analysis_result=analysis_result,
-            target_collection='documents',
-        )
+        analysis_result = extract_document_information(openai_client=openai_client, content_text=metadata.summary_text)
 
-    except Exception as e:
-        raise HTTPException(status_code=500, detail=f"Error saving project: {str(e)}")
+        try:
+            with tracing.span('firestore.save_analysis_result'):
+                firebase_driver.save_analysis_result(
+                    firestore_client=firestore_client,
+                    user_id=metadata.user_id,
+                    file_uuid=metadata.file_uuid,
+                    file_name=metadata.file_name,
+                    analysis_result=analysis_result,
+                    target_collection='documents',
+                )
+
+        except Exception as e:
+            raise HTTPException(status_code=500, detail=f"Error saving project: {str(e)}")
 
-    return JSONResponse({"status": "success"}, status_code=200)
+        progress.update_progress(
+            progress.mark_stage, firestore_client, metadata.user_id, metadata.file_uuid, 'summarized'
+        )
+        return JSONResponse({"status": "success"}, status_code=200)
 
 
 @router.post('/page:analyze')
@@ -196,8 +335,7 @@ async def worker_page_analyze(
     request: Request,
     firebase_client: FirebaseClient = Depends(get_firebase_client),
     openai_client: openai.ChatCompletion = Depends(get_openai_client),
-    cloud_tasks_client: tasks_v2.CloudTasksClient = Depends(get_cloud_tasks_client),
-    queue_path: str = Depends(get_queue_path),
+    task_dispatcher: dispatcher.TaskDispatcher = Depends(get_task_dispatcher),
     doc_repository: DocumentRepository = Depends(get_document_repository),
 ):
     """
@@ -233,91 +371,131 @@ async def worker_page_analyze(
             detail="Unable to parse metadata"
         )
 
-    # project_idを取得する
-    try:
-        project_id = firebase_driver.get_project_id(metadata.user_id, firestore_client)
+    tracing.bind(file_uuid=metadata.file_uuid, stage='page', page=int(metadata.page_number))
+    async with ledger.task_lease(
+        firestore_client, metadata.user_id, metadata.file_uuid, 'page', int(metadata.page_number), metadata.run_id
+    ) as lease:
+        if not lease.acquired:
+            return duplicate_response(lease)
 
-    except Exception as e:
-        detail = f'error loading project id: {str(e)}'
-        raise HTTPException(status_code=400, detail=detail)
+        # project_idを取得する
+        try:
+            project_id = firebase_driver.get_project_id(metadata.user_id, firestore_client)
 
-    #logger.info(f'page number: {metadata.page_number}')
+        except Exception as e:
+            detail = f'error loading project id: {str(e)}'
+            raise HTTPException(status_code=400, detail=detail)
 
-    try:
-        signed_url = await pdf_processor.generate_signed_url(
-            metadata.user_id, project_id, metadata.page_number, metadata.file_uuid, storage_client
-        )
-        image_base64 = generate_summary.get_encoded_image(signed_url)
+        #logger.info(f'page number: {metadata.page_number}')
 
-    except ValueError as e:
-        logger.error(f"Failed to generate signed URL for page {metadata.page_number}: {e}")
-        return {"message": f"Skipping page {metadata.page_number} because signed_url is not available."}
+        try:
+            signed_url = await pdf_processor.generate_signed_url(
+                metadata.user_id, project_id, metadata.page_number, metadata.file_uuid, storage_client
+            )
+            image_base64 = generate_summary.get_encoded_image(signed_url)
+
+        except ValueError as e:
+            logger.error(f"Failed to generate signed URL for page {metadata.page_number}: {e}")
+            reason = f'page {metadata.page_number}: signed_url is not available'
+            progress.update_progress(
+                progress.add_failed_pages,
+                firestore_client,
+                metadata.user_id,
+                metadata.file_uuid,
+                'analyzed',
+                [int(metadata.page_number)],
+                reason,
+            )
+            return {"message": f"Skipping page {metadata.page_number} because signed_url is not available."}
+
+        try:
+            # GPTでの抽出処理
+            # ページからわかる情報を抽出する
+            analyst_report = await generate_summary.get_analyst_report(openai_client, image_base64, max_retries=3)
+            # ページからわかる転写（直訳に近い情報抽出）を行う
+            transcription_report = await generate_summary.get_transcription(openai_client, image_base64, max_retries=3)
+
+        except Exception as e:
+            logger.error(f"Failed to create summary {metadata.page_number}: {e}")
+            reason = f'page {metadata.page_number}: {e}'
+            progress.update_progress(
+                progress.add_failed_pages,
+                firestore_client,
+                metadata.user_id,
+                metadata.file_uuid,
+                'analyzed',
+                [int(metadata.page_number)],
+                reason,
+            )
+            return {"message": f"Skipping page {metadata.page_number} because gpt error"}
 
-    try:
-        # GPTでの抽出処理
-        # ページからわかる情報を抽出する
-        analyst_report = await generate_summary.get_analyst_report(openai_client, image_base64, max_retries=3)
-        # ページからわかる転写（直訳に近い情報抽出）を行う
-        transcription_report = await generate_summary.get_transcription(openai_client, image_base64, max_retries=3)
+        try:
+            with tracing.span('firestore.save_pages'):
+                firebase_driver.save_page_analyst_report(
+                    firestore_client=firestore_client,
+                    user_id=metadata.user_id,
+                    file_uuid=metadata.file_uuid,
+                    file_name=metadata.file_name,
+                    page_number=metadata.page_number,
+                    analyst_report=analyst_report,
+                    transcription_report=transcription_report,
+                )
+            #logger.info(f'result saved for page_number: {metadata.page_number}')
 
-    except Exception as e:
-        logger.error(f"Failed to create summary {metadata.page_number}: {e}")
-        return {"message": f"Skipping page {metadata.page_number} because gpt error"}
+        except Exception as e:
+            raise HTTPException(status_code=500, detail=f"Error saving project: {str(e)}")
 
-    try:
-        firebase_driver.save_page_analyst_report(
-            firestore_client=firestore_client,
-            user_id=metadata.user_id,
-            file_uuid=metadata.file_uuid,
-            file_name=metadata.file_name,
-            page_number=metadata.page_number,
-            analyst_report=analyst_report,
-            transcription_report=transcription_report,
-        )
-        #logger.info(f'result saved for page_number: {metadata.page_number}')
+        # ベクトルDB Weaviateへの保存
+        try:
+            #logger.info(f'started uploading to weaviate, client status:{doc_repository.client.is_ready()}')
+            items = Item(
+                user_id=metadata.user_id,
+                project_id=project_id,
+                file_uuid=metadata.file_uuid,
+                file_name=metadata.file_name,
+                page_number=str(metadata.page_number),
+                transcription=transcription_report.transcription,
+            )
+            documents = Documents(items=[items])
+            with tracing.span('weaviate.add_documents', documents=1):
+                doc_repository.add_documents(documents)
 
-    except Exception as e:
-        raise HTTPException(status_code=500, detail=f"Error saving project: {str(e)}")
+        except Exception as e:
+            logger.error(f'failed to upload data to weaviate cloud{e}', exc_info=True)
+            raise HTTPException(status_code=500, detail=f"Error saving to weaviate cloud: {str(e)}")
 
-    # ベクトルDB Weaviateへの保存
-    try:
-        #logger.info(f'started uploading to weaviate, client status:{doc_repository.client.is_ready()}')
-        items = Item(
-            user_id=metadata.user_id,
-            project_id=project_id,
-            file_uuid=metadata.file_uuid,
-            file_name=metadata.file_name,
-            page_number=str(metadata.page_number),
-            transcription=transcription_report.transcription,
+        progress.update_progress(
+            progress.add_pages,
+            firestore_client,
+            metadata.user_id,
+            metadata.file_uuid,
+            {'analyzed': [int(metadata.page_number)], 'indexed': [int(metadata.page_number)]},
         )
-        documents = Documents(items=[items])
-        doc_repository.add_documents(documents)
 
-    except Exception as e:
-        logger.error(f'failed to upload data to weaviate cloud{e}', exc_info=True)
-        raise HTTPException(status_code=500, detail=f"Error saving to weaviate cloud: {str(e)}")
-
-    finally:
-        doc_repository.client.close()
-
-    # 最終ページの処理だった場合、タスクに追加する
-    if int(metadata.page_number) == (int(metadata.max_page_number)-1):
-        logger.info(f'final page processing: {metadata.page_number}, {metadata.max_page_number}')
-        payload = models.PageMetadata(
-            user_id=metadata.user_id,
-            project_id=metadata.project_id,
-            file_uuid=metadata.file_uuid,
-            file_name=metadata.file_name,
-            page_number=str(metadata.page_number),
-            max_page_number=str(metadata.max_page_number),
-        )
-        worker_page_analyze_url = f'{Settings.google_cloud.api_base_url}/worker/analyst:analyze'
-        task_page = cloud_tasks.create_task_payload(worker_page_analyze_url, payload)
-        response = cloud_tasks_client.create_task(parent=queue_path, task=task_page)
-        eta = response.schedule_time.strftime("%m/%d/%Y, %H:%M:%S")
-        logger.info(f"analyst view analyze task created successfully: {response.name}, {eta}")
+        # 最終ページの処理だった場合、タスクに追加する
+        if int(metadata.page_number) == (int(metadata.max_page_number)-1):
+            logger.info(f'final page processing: {metadata.page_number}, {metadata.max_page_number}')
+            payload = models.PageMetadata(
+                user_id=metadata.user_id,
+                project_id=metadata.project_id,
+                file_uuid=metadata.file_uuid,
+                file_name=metadata.file_name,
+                page_number=str(metadata.page_number),
+                max_page_number=str(metadata.max_page_number),
+                run_id=metadata.run_id,
+            )
+            result = await task_dispatcher.enqueue(
+                [
+                    dispatcher.TaskRequest.from_model(
+                        '/worker/analyst:analyze',
+                        payload,
+                        ledger.get_task_id(metadata.file_uuid, 'analyst', run_id=metadata.run_id),
+                    )
+                ]
+            )
+            logger.info(f"analyst view analyze task created: {result.created}, coalesced: {result.coalesced}")
 
-    return JSONResponse({"status": "success", "received": metadata.page_number}, status_code=200)
+        return JSONResponse({"status": "success", "received": metadata.page_number}, status_code=200)
 
 
 
@@ -360,22 +538,207 @@ async def worker_projection_analyze(
             detail="Unable to parse metadata"
         )
 
-    try:
-        # Projectionの作成
-        await projection.process_single_page_profit_and_loss(
+    tracing.bind(file_uuid=metadata.file_uuid, stage='projection', page=int(metadata.page_number))
+    async with ledger.task_lease(
+        firestore_client,
+        metadata.user_id,
+        metadata.file_uuid,
+        'projection',
+        int(metadata.page_number),
+        metadata.run_id,
+    ) as lease:
+        if not lease.acquired:
+            return duplicate_response(lease)
+
+        try:
+            # Projectionの作成
+            await projection.process_single_page_profit_and_loss(
+                metadata.user_id,
+                metadata.file_uuid,
+                firestore_client,
+                storage_client,
+                openai_client,
+                metadata.page_number,
+            )
+
+        except Exception as e:
+            logger.error(f"Failed to create summary {metadata.page_number}: {e}")
+            reason = f'page {metadata.page_number}: {e}'
+            progress.update_progress(
+                progress.add_failed_pages,
+                firestore_client,
+                metadata.user_id,
+                metadata.file_uuid,
+                'projected',
+                [int(metadata.page_number)],
+                reason,
+            )
+            return {"message": f"Skipping page {metadata.page_number} because gpt error"}
+
+        progress.update_progress(
+            progress.add_pages,
+            firestore_client,
             metadata.user_id,
             metadata.file_uuid,
+            {'projected': [int(metadata.page_number)]},
+        )
+        return JSONResponse({"status": "success", "received": metadata.page_number}, status_code=200)
+
+
+@router.post('/pages:analyze')
+async def worker_pages_analyze(
+    request: Request,
+    firebase_client: FirebaseClient = Depends(get_firebase_client),
+    openai_client: openai.ChatCompletion = Depends(get_openai_client),
+    task_dispatcher: dispatcher.TaskDispatcher = Depends(get_task_dispatcher),
+    doc_repository: DocumentRepository = Depends(get_document_repository),
+):
+    """
+    Cloud Tasks からPOSTされる複数のページをまとめて分析する
+    page:analyze と projection:analyze の処理をページごとに並行して行い、クライアントはタスク内で共有する
+    """
+    firestore_client = firebase_client.get_firestore()
+    storage_client = firebase_client.get_storage()
+
+    raw_body = await request.body()
+    if not raw_body:
+        logger.error("No data received. Skipping processing.")
+        return {"message": "No data received, processing skipped."}
+
+    try:
+        metadata = models.PageBatchMetadata.model_validate_json(raw_body)
+
+    except ValidationError as e:
+        logger.error(f"Failed to parse metadata: {e}")
+        raise HTTPException(status_code=400, detail=f"Invalid metadata: {e}")
+
+    try:
+        project_id = firebase_driver.get_project_id(metadata.user_id, firestore_client)
+
+    except Exception as e:
+        detail = f'error loading project id: {str(e)}'
+        raise HTTPException(status_code=400, detail=detail)
+
+    tracing.bind(file_uuid=metadata.file_uuid, stage='pages')
+
+    # 完了済み・他の配信で実行中のページは除いて処理する
+    page_leases, projection_leases = await asyncio.gather(
+        page_batch.acquire_leases(firestore_client, metadata, 'page'),
+        page_batch.acquire_leases(firestore_client, metadata, 'projection'),
+    )
+    acquired_pages = [lease for lease in page_leases if lease.acquired]
+    acquired_projections = [lease for lease in projection_leases if lease.acquired]
+
+    # 結果はページごとに受け取り、リースもページごとに完了・解放する（1ページの失敗でバッチ全体を再実行しない）
+    page_outcomes, projection_outcomes = await asyncio.gather(
+        page_batch.analyze_pages(
             firestore_client,
             storage_client,
             openai_client,
-            metadata.page_number,
-        )
+            doc_repository,
+            metadata,
+            project_id,
+            [lease.page for lease in acquired_pages],
+            Settings.worker_page_concurrency,
+        ),
+        page_batch.project_pages(
+            firestore_client,
+            storage_client,
+            openai_client,
+            metadata,
+            project_id,
+            [lease.page for lease in acquired_projections],
+            Settings.worker_page_concurrency,
+        ),
+    )
 
-    except Exception as e:
-        logger.error(f"Failed to create summary {metadata.page_number}: {e}")
-        return {"message": f"Skipping page {metadata.page_number} because gpt error"}
+    await asyncio.gather(
+        page_batch.finish_leases(firestore_client, acquired_pages, page_outcomes),
+        page_batch.finish_leases(firestore_client, acquired_projections, projection_outcomes),
+    )
 
-    return JSONResponse({"status": "success", "received": metadata.page_number}, status_code=200)
+    # 完了したリースは再試行で実行されないため、再試行するページがあっても完了・失敗したページの進捗は記録する
+    file_progress = await asyncio.to_thread(
+        progress.update_progress,
+        progress.add_pages,
+        firestore_client,
+        metadata.user_id,
+        metadata.file_uuid,
+        {
+            'analyzed': page_outcomes.completed,
+            'projected': projection_outcomes.completed,
+            'indexed': [analysis.page_number for analysis in page_outcomes.analyses],
+        },
+    )
+    for stage, outcomes in (('analyzed', page_outcomes), ('projected', projection_outcomes)):
+        if outcomes.failed:
+            failed_progress = await asyncio.to_thread(
+                progress.update_progress,
+                progress.add_failed_pages,
+                firestore_client,
+                metadata.user_id,
+                metadata.file_uuid,
+                stage,
+                sorted(outcomes.failed),
+                '; '.join(outcomes.failed.values()),
+            )
+            file_progress = failed_progress or file_progress
+
+    # 再試行するページがあれば 500 を返し、解放したリースのページだけを再配信で実行させる
+    errors = [
+        (stage, page_number, error)
+        for stage, outcomes in (('page', page_outcomes), ('projection', projection_outcomes))
+        for page_number, error in sorted(outcomes.errors.items())
+    ]
+    if errors:
+        for stage, page_number, error in errors:
+            logger.error(f'failed to analyze page {page_number} ({stage}): {error}', exc_info=error)
+        stage, page_number, error = errors[0]
+        raise HTTPException(status_code=500, detail=f"Error saving page analysis (page {page_number}): {str(error)}")
+
+    # 全ページの解析が終わった（完了または失敗した）時点でタスクに追加する
+    # （進捗が取得できない場合は最終ページを含むタスクで追加する）
+    if file_progress is not None:
+        pages_finished = file_progress.pages_analyzed + file_progress.pages_analysis_failed
+        all_pages_analyzed = pages_finished >= metadata.max_page_number
+    else:
+        all_pages_analyzed = metadata.end_page == metadata.max_page_number
+
+    if all_pages_analyzed:
+        payload = models.PageMetadata(
+            user_id=metadata.user_id,
+            project_id=metadata.project_id,
+            file_uuid=metadata.file_uuid,
+            file_name=metadata.file_name,
+            page_number=str(metadata.end_page - 1),
+            max_page_number=str(metadata.max_page_number),
+            run_id=metadata.run_id,
+        )
+        result = await task_dispatcher.enqueue(
+            [
+                dispatcher.TaskRequest.from_model(
+                    '/worker/analyst:analyze',
+                    payload,
+                    ledger.get_task_id(metadata.file_uuid, 'analyst', run_id=metadata.run_id),
+                )
+            ]
+        )
+        logger.info(f"analyst view analyze task created: {result.created}, coalesced: {result.coalesced}")
+
+    # 他の配信で実行中のページがある場合は、その完了後に再試行させる
+    in_progress = [lease.page for lease in page_leases + projection_leases if lease.status == 'leased']
+    if in_progress:
+        return JSONResponse({"status": "in_progress", "pages": sorted(set(in_progress))}, status_code=409)
+
+    return JSONResponse(
+        {
+            "status": "success",
+            "received": [metadata.start_page, metadata.end_page],
+            "analyzed": page_outcomes.completed,
+            "failed": sorted(set(page_outcomes.failed) | set(projection_outcomes.failed)),
+        },
+        status_code=200,
+    )
 
 
 class ParameterSummaries(BaseJSONSchema):
@@ -421,46 +784,140 @@ async def worker_analyst_analyze(
         return {"message": "No data received, processing skipped."}
     metadata = models.PageMetadata.model_validate_json(raw_body)
 
-    data = firebase_driver.fetch_page_summary(
-        firestore_client,
-        metadata.user_id,
-        metadata.file_uuid,
-    )
-    conbined_transcription = get_conbined_transcription(data)
-    result_sentence = chat_client.create_response(openai_client, conbined_transcription)
+    tracing.bind(file_uuid=metadata.file_uuid, stage='analyst')
+    async with ledger.task_lease(
+        firestore_client, metadata.user_id, metadata.file_uuid, 'analyst', run_id=metadata.run_id
+    ) as lease:
+        if not lease.acquired:
+            return duplicate_response(lease)
 
-    try:
-        firebase_driver.save_worker_analyst_report(
-            firestore_client=firestore_client,
-            user_id=metadata.user_id,
-            project_id=metadata.project_id,
-            file_uuid=metadata.file_uuid,
-            result_sentence=result_sentence,
+        data = firebase_driver.fetch_page_summary(
+            firestore_client,
+            metadata.user_id,
+            metadata.file_uuid,
         )
+        conbined_transcription = get_conbined_transcription(data)
+        result_sentence = chat_client.create_response(openai_client, conbined_transcription)
 
-    except Exception as e:
-        logger.error(f"Failed to create analyst summary {metadata.page_number}: {e}")
-        return {"message": f"Skipping page {metadata.page_number} because gpt error"}
+        try:
+            with tracing.span('firestore.save_analyst_report'):
+                firebase_driver.save_worker_analyst_report(
+                    firestore_client=firestore_client,
+                    user_id=metadata.user_id,
+                    project_id=metadata.project_id,
+                    file_uuid=metadata.file_uuid,
+                    result_sentence=result_sentence,
+                )
 
-    logger.info(f'worker/analyst:analyze analyst resport successfully created')
-    return JSONResponse({"status": "success", "received": metadata.page_number}, status_code=200)
+        except Exception as e:
+            logger.error(f"Failed to create analyst summary {metadata.page_number}: {e}")
+            progress.update_progress(
+                progress.mark_stage_failed, firestore_client, metadata.user_id, metadata.file_uuid, 'analyst', str(e)
+            )
+            return {"message": f"Skipping page {metadata.page_number} because gpt error"}
 
+        progress.update_progress(
+            progress.mark_stage, firestore_client, metadata.user_id, metadata.file_uuid, 'analyst'
+        )
+        logger.info(f'worker/analyst:analyze analyst resport successfully created')
+        return JSONResponse({"status": "success", "received": metadata.page_number}, status_code=200)
 
-@router.get("/count")
-async def get_worker_count(
-    cloud_tasks_client: tasks_v2.CloudTasksClient = Depends(get_cloud_tasks_client),
-    queue_path: str = Depends(get_queue_path)
+
+class FileProgressSchema(BaseJSONSchema):
+    file_uuid: str
+    file_name: str
+    status: str
+    total_pages: int
+    pages_split: int
+    pages_analyzed: int
+    pages_projected: int
+    pages_indexed: int
+    pages_analysis_failed: int
+    pages_projection_failed: int
+    summarized: bool
+    analyst: bool
+    failed_stages: list[str]
+    error: Optional[str]
+    remaining_tasks: int
+
+
+class ResGetWorkerProgress(BaseJSONSchema):
+    """GET `/worker/progress` response schema."""
+
+    files: list[FileProgressSchema] = Field(..., description='ファイルごとの解析の進捗')
+    task_count: int = Field(..., description='残りの処理の件数')
+
+
+def to_progress_schema(file_progress: progress.FileProgress) -> FileProgressSchema:
+    return FileProgressSchema(**file_progress.model_dump(), remaining_tasks=file_progress.remaining_tasks)
+
+
+@router.get("/progress", response_model=ResGetWorkerProgress)
+async def get_worker_progress(
+    file_uuid: Optional[str] = None,
+    firebase_client: FirebaseClient = Depends(get_firebase_client),
+    user_id: str = Depends(get_user_id),
 ):
     """
-    Cloud Tasksの指定されたキューにあるタスクの数を取得する
+    ファイルごとの解析の進捗を取得する
+    file_uuid を指定しない場合は解析中のファイルをすべて返す
     """
-    try:
-        # キューに登録されているタスクの一覧を取得
-        tasks = cloud_tasks_client.list_tasks(parent=queue_path)
+    firestore_client = firebase_client.get_firestore()
+    if file_uuid:
+        file_progress = await asyncio.to_thread(progress.fetch_progress, firestore_client, user_id, file_uuid)
+        if file_progress is None:
+            raise HTTPException(status_code=404, detail=f"Progress not found: {file_uuid}")
+        files = [file_progress]
+    else:
+        files = await asyncio.to_thread(progress.fetch_active_progress, firestore_client, user_id)
+
+    result = ResGetWorkerProgress(
+        files=[to_progress_schema(file_progress) for file_progress in files],
+        task_count=sum(file_progress.remaining_tasks for file_progress in files),
+    )
+    return ORJSONResponse(content=jsonable_encoder(result))
 
-        # タスクの数を数える
-        task_count = sum(1 for _ in tasks)
-        return {"queue": queue_path, "task_count": task_count}
 
-    except Exception as e:
-        raise HTTPException(status_code=500, detail=f"Failed to retrieve task count: {str(e)}")
+@router.get("/progress/stream")
+async def stream_worker_progress(
+    request: Request,
+    file_uuid: str,
+    firebase_client: FirebaseClient = Depends(get_firebase_client),
+    user_id: str = Depends(get_user_id),
+):
+    """
+    ファイルの解析の進捗を Server-Sent Events で送信する
+    進捗ドキュメントが更新されるたびに `progress` イベントを送り、解析が完了したら終了する
+    """
+    firestore_client = firebase_client.get_firestore()
+
+    async def event_stream():
+        async for file_progress in progress.watch_progress(
+            firestore_client, user_id, file_uuid, Settings.progress_heartbeat_seconds
+        ):
+            if await request.is_disconnected():
+                break
+            if file_progress is None:
+                yield ': keep-alive\n\n'
+                continue
+            data = to_progress_schema(file_progress).model_dump_json(by_alias=True)
+            yield f'event: progress\ndata: {data}\n\n'
+
+    return StreamingResponse(
+        event_stream(),
+        media_type='text/event-stream',
+        headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'},
+    )
+
+
+@router.get("/count")
+async def get_worker_count(
+    firebase_client: FirebaseClient = Depends(get_firebase_client),
+    user_id: str = Depends(get_user_id),
+):
+    """
+    残りの処理の件数をユーザーの進捗ドキュメントから数える
+    キューのタスクを列挙すると件数に比例して遅くなるため、トークンは必須とする
+    """
+    files = await asyncio.to_thread(progress.fetch_active_progress, firebase_client.get_firestore(), user_id)
+    return {"queue": "progress", "task_count": sum(file_progress.remaining_tasks for file_progress in files)}
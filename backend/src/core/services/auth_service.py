@@ -1,10 +1,10 @@
 from datetime import datetime, timedelta
 
 from fastapi import HTTPException
-from firebase_admin import auth as firebase_auth
 from jose import jwt
 from pydantic import BaseModel
 
+from src.core.services.firebase_client import verify_user_token
 from src.settings import settings
 
 
@@ -29,25 +29,9 @@ def create_access_token(data: dict, expires_delta: timedelta = None):
 
 
 def verify_token(authorization: str):
+    """Authorization ヘッダーのトークンを検証して user_id を返す（get_user_id と同じキャッシュを使う）"""
     try:
         token = authorization.split(" ")[1]
-        try:
-            decoded_token = firebase_auth.verify_id_token(token)
-
-        except firebase_auth.InvalidIdTokenError:
-            print("Invalid ID token")
-
-        except firebase_auth.ExpiredIdTokenError:
-            print("Token has expired")
-
-        except firebase_auth.RevokedIdTokenError:
-            print("Token has been revoked")
-
-        except Exception as e:
-            print(f"Unexpected error: {e}")
-
-        user_id = decoded_token["uid"]
-        return user_id
-
-    except Exception as e:
+        return verify_user_token(token)
+    except (IndexError, ValueError) as e:
         raise HTTPException(status_code=401, detail=f"Invalid token: {e}")
@@ -0,0 +1,224 @@
+import logging
+import threading
+from contextlib import contextmanager
+from typing import TYPE_CHECKING, Iterator, Optional
+
+import httpx
+import openai
+from requests.adapters import HTTPAdapter
+
+from src.core.services import metrics
+from src.settings import Settings, settings
+
+if TYPE_CHECKING:
+    import weaviate
+    from google.cloud import tasks_v2
+
+logger = logging.getLogger(__name__)
+
+_registry: Optional['ClientRegistry'] = None
+_registry_lock = threading.Lock()
+
+
+class PoolTracker:
+    """共有クライアントを使用中のリクエスト数を数え、接続数の上限に達していたものを記録する"""
+
+    def __init__(self, name: str, size: int):
+        self.name = name
+        self.size = size
+        self.in_flight = 0
+        self.lock = threading.Lock()
+        metrics.client_pool_size.labels(name).set(size)
+
+    def acquire(self) -> None:
+        with self.lock:
+            if self.in_flight >= self.size:
+                metrics.client_pool_waits.labels(self.name).inc()
+            self.in_flight += 1
+        metrics.client_requests_in_flight.labels(self.name).inc()
+
+    def release(self) -> None:
+        with self.lock:
+            self.in_flight -= 1
+        metrics.client_requests_in_flight.labels(self.name).dec()
+
+    @contextmanager
+    def track(self) -> Iterator[None]:
+        self.acquire()
+        try:
+            yield
+        finally:
+            self.release()
+
+
+class ReleasingStream(httpx.SyncByteStream):
+    """レスポンスが閉じられた時（ストリーミングの場合は読み終えた時）に接続の使用を終えたものとして数える"""
+
+    def __init__(self, stream: httpx.SyncByteStream, tracker: PoolTracker):
+        self.stream = stream
+        self.tracker: Optional[PoolTracker] = tracker
+
+    def __iter__(self) -> Iterator[bytes]:
+        yield from self.stream
+
+    def close(self) -> None:
+        try:
+            self.stream.close()
+        finally:
+            if self.tracker is not None:
+                self.tracker.release()
+                self.tracker = None
+
+
+class TrackedTransport(httpx.HTTPTransport):
+    def __init__(self, tracker: PoolTracker, **kwargs):
+        super().__init__(**kwargs)
+        self.tracker = tracker
+
+    def handle_request(self, request: httpx.Request) -> httpx.Response:
+        self.tracker.acquire()
+        try:
+            response = super().handle_request(request)
+        except BaseException:
+            self.tracker.release()
+            raise
+        response.stream = ReleasingStream(response.stream, self.tracker)
+        return response
+
+
+class TrackedHTTPAdapter(HTTPAdapter):
+    def __init__(self, tracker: PoolTracker, **kwargs):
+        self.tracker = tracker
+        super().__init__(**kwargs)
+
+    def send(self, request, **kwargs):
+        with self.tracker.track():
+            return super().send(request, **kwargs)
+
+
+def create_openai_client(tracker: PoolTracker) -> openai.OpenAI:
+    limits = httpx.Limits(max_connections=tracker.size, max_keepalive_connections=tracker.size)
+    return openai.OpenAI(
+        organization=settings.openai_organization_id,
+        project=settings.openai_project_id,
+        api_key=settings.openai_api_key,
+        http_client=openai.DefaultHttpxClient(transport=TrackedTransport(tracker, limits=limits)),
+    )
+
+
+def create_cloud_tasks_client() -> 'tasks_v2.CloudTasksClient':
+    # gRPC のチャネルは1つの接続で多重化されるため、接続数の設定はない
+    from google.cloud import tasks_v2
+
+    return tasks_v2.CloudTasksClient()
+
+
+def create_weaviate_client(tracker: PoolTracker) -> 'weaviate.WeaviateClient':
+    import weaviate
+    from weaviate.classes.init import AdditionalConfig, Auth
+    from weaviate.config import ConnectionConfig
+
+    return weaviate.connect_to_weaviate_cloud(
+        cluster_url=settings.weaviate_url,
+        auth_credentials=Auth.api_key(settings.weaviate_api_key),
+        headers={"X-OpenAI-Api-Key": settings.openai_api_key},
+        additional_config=AdditionalConfig(
+            connection=ConnectionConfig(session_pool_connections=tracker.size, session_pool_maxsize=tracker.size)
+        ),
+    )
+
+
+class ClientRegistry:
+    """
+    外部サービスのクライアントをワーカープロセスごとに1つだけ作成して共有する
+    起動を遅くしないよう、各クライアントは最初に使われた時に作成する
+    """
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.trackers = {
+            'openai': PoolTracker('openai', Settings.openai_max_connections),
+            'cloud_tasks': PoolTracker('cloud_tasks', Settings.task_enqueue_concurrency),
+            'weaviate': PoolTracker('weaviate', Settings.weaviate_max_connections),
+            'storage': PoolTracker('storage', Settings.storage_max_connections),
+        }
+        self._openai: Optional[openai.OpenAI] = None
+        self._cloud_tasks: Optional['tasks_v2.CloudTasksClient'] = None
+        self._weaviate: Optional['weaviate.WeaviateClient'] = None
+
+    @property
+    def openai(self) -> openai.OpenAI:
+        if self._openai is None:
+            with self.lock:
+                if self._openai is None:
+                    self._openai = create_openai_client(self.trackers['openai'])
+        return self._openai
+
+    @property
+    def cloud_tasks(self) -> 'tasks_v2.CloudTasksClient':
+        if self._cloud_tasks is None:
+            with self.lock:
+                if self._cloud_tasks is None:
+                    self._cloud_tasks = create_cloud_tasks_client()
+        return self._cloud_tasks
+
+    @property
+    def weaviate(self) -> 'weaviate.WeaviateClient':
+        if self._weaviate is None:
+            with self.lock:
+                if self._weaviate is None:
+                    self._weaviate = create_weaviate_client(self.trackers['weaviate'])
+        return self._weaviate
+
+    def configure_storage(self, bucket) -> None:
+        """
+        Storage の HTTP セッションの接続数の上限を設定する（requests の既定は 10 接続）
+        バケットは FirebaseClient が作成したものを共有する
+        """
+        tracker = self.trackers['storage']
+        adapter = TrackedHTTPAdapter(tracker, pool_connections=tracker.size, pool_maxsize=tracker.size)
+        bucket.client._http.mount('https://', adapter)
+
+    def close(self) -> None:
+        closers = [
+            ('openai', self._openai, lambda client: client.close()),
+            ('cloud_tasks', self._cloud_tasks, lambda client: client.transport.close()),
+            ('weaviate', self._weaviate, lambda client: client.close()),
+        ]
+        for name, client, close in closers:
+            if client is None:
+                continue
+            try:
+                close(client)
+            except Exception as e:
+                logger.warning(f'failed to close the {name} client: {e}')
+        self._openai = None
+        self._cloud_tasks = None
+        self._weaviate = None
+
+
+def get_clients() -> ClientRegistry:
+    """プロセスごとに1つのクライアントの登録先を返す"""
+    global _registry
+    if _registry is None:
+        with _registry_lock:
+            if _registry is None:
+                _registry = ClientRegistry()
+    return _registry
+
+
+def start_clients(bucket) -> None:
+    """アプリケーション起動時に呼ぶ（FirebaseClient の初期化後）"""
+    get_clients().configure_storage(bucket)
+
+
+def shutdown_clients() -> None:
+    global _registry
+    if _registry is not None:
+        _registry.close()
+        _registry = None
+
+
+def track(name: str):
+    """共有クライアントを使う処理を囲み、使用中のリクエスト数として数える"""
+    return get_clients().trackers[name].track()
@@ -1,5 +1,6 @@
+import asyncio
 import logging
-import uuid
+from typing import Optional
 
 import openai
 from fastapi import APIRouter, HTTPException
@@ -10,6 +11,7 @@ from pydantic import BaseModel, Field
 from src.core.models.plan import Step, SummaryProfitAndLoss, all_fields_are_none
 from src.settings import Settings
 import src.core.services.firebase_driver as firebase_driver
+from src.core.services import metric_codec, projection_aggregate, projection_option, tracing
 
 logger = logging.getLogger(__name__)
 router = APIRouter()
@@ -37,52 +39,30 @@ def save_parameters(
 
     selected_project_id = selected_project[0].id
 
-    doc_ref = (
-        firestore_client.collection('users')
-        .document(user_id)
-        .collection('projects')
-        .document(selected_project_id)
-        .collection('projection')
-        .document('period')
-        .collection('year')
-        .document(str(summary.period.year))
-        .collection('month')
-        .document(str(summary.period.month))
-        .collection('option')
-        .document(str(uuid.uuid4()))
+    option = metric_codec.build_option(
+        file_uuid,
+        page_number,
+        summary.business_scope,
+        profit_and_loss=summary.profit_and_loss,
     )
 
     try:
-        doc_ref.set(
-            {
-                'file_uuid': str(file_uuid),
-                'page_number': page_number,
-                'business_scope': {
-                    'scope_type': summary.business_scope.scope_type,
-                    'company_name': summary.business_scope.company_name,
-                    'department_name': summary.business_scope.department_name,
-                    'product_name': summary.business_scope.product_name,
-                },
-                'profit_and_loss': {
-                    'revenue': str(summary.profit_and_loss.revenue),
-                    'cogs': str(summary.profit_and_loss.cogs),
-                    'gross_profit_margin': str(summary.profit_and_loss.gross_profit_margin),
-                    'sg_and_a': str(summary.profit_and_loss.sg_and_a),
-                    'operating_income': str(summary.profit_and_loss.operating_income),
-                    'operating_income_margin': str(summary.profit_and_loss.operating_income_margin),
-                    'non_operating_income': str(summary.profit_and_loss.non_operating_income),
-                    'non_operating_expenses': str(summary.profit_and_loss.non_operating_expenses),
-                    'ordinary_income': str(summary.profit_and_loss.ordinary_income),
-                    'extraordinary_income': str(summary.profit_and_loss.extraordinary_income),
-                    'extraordinary_losses': str(summary.profit_and_loss.extraordinary_losses),
-                    'profit_before_tax': str(summary.profit_and_loss.profit_before_tax),
-                    'corporate_taxes': str(summary.profit_and_loss.corporate_taxes),
-                    'net_income': str(summary.profit_and_loss.net_income),
-                    'ebitda': str(summary.profit_and_loss.ebitda),
-                    'psr': str(summary.profit_and_loss.psr),
-                    'ev_to_ebitda': str(summary.profit_and_loss.ev_to_ebitda),
-                },
-            }
+        current, merged = projection_option.upsert_option(
+            firestore_client,
+            user_id,
+            selected_project_id,
+            summary.period.year,
+            summary.period.month,
+            option,
+        )
+        projection_aggregate.apply_option(
+            firestore_client,
+            user_id,
+            selected_project_id,
+            summary.period.year,
+            summary.period.month,
+            current,
+            merged,
         )
         return
 
@@ -96,27 +76,29 @@ def send_to_analysis_api(openai_client, image_url, max_retries=3):
     while retry_count < max_retries:
         #logger.info(f'OpenAI API retry: {retry_count+1}/{max_retries}')
         try:
-            response = openai_client.beta.chat.completions.parse(
-                model='gpt-4o-2024-08-06',
-                messages=[
-                    {
-                        "role": "system",
-                        "content": "接頭語に気をつけながら、かならず単位を円で計算しなさい。「百万円」や「億円」をすべて「円」に統一する - 範囲の値がある場合には最大値を採用せよ",
-                    },
-                    {
-                        "role": "user",
-                        "content": [
-                            {
-                                "type": "text",
-                                "text": "次のデータに含まれる情報を、集計期間に気をつけながら段階的に整理します。",
-                            },
-                            {"type": "image_url", "image_url": {"url": image_url}},
-                        ],
-                    },
-                ],
-                temperature=0.3,
-                response_format=TempCustomResponse,
-            )
+            with tracing.span('llm.projection', model='gpt-4o-2024-08-06', attempt=retry_count + 1):
+                response = openai_client.beta.chat.completions.parse(
+                    model='gpt-4o-2024-08-06',
+                    messages=[
+                        {
+                            "role": "system",
+                            "content": "接頭語に気をつけながら、かならず単位を円で計算しなさい。「百万円」や「億円」をすべて「円」に統一する - 範囲の値がある場合には最大値を採用せよ",
+                        },
+                        {
+                            "role": "user",
+                            "content": [
+                                {
+                                    "type": "text",
+                                    "text": "次のデータに含まれる情報を、集計期間に気をつけながら段階的に整理します。",
+                                },
+                                {"type": "image_url", "image_url": {"url": image_url}},
+                            ],
+                        },
+                    ],
+                    temperature=0.3,
+                    response_format=TempCustomResponse,
+                )
+                tracing.record_usage(response)
             return response.choices[0].message.parsed
 
         except Exception as e:
@@ -174,6 +156,7 @@ async def process_single_page_profit_and_loss(
     storage_client,
     openai_client: openai.ChatCompletion,
     page_number: int,
+    project_id: Optional[str] = None,
 ):
     """
     特定のページ番号についてProfit and Lossメトリクスを処理する関数。
@@ -185,17 +168,19 @@ async def process_single_page_profit_and_loss(
         storage_client: ストレージクライアント。
         openai_client (openai.ChatCompletion): OpenAIクライアント。
         page_number (int): 処理するページ番号。
+        project_id (Optional[str]): プロジェクトID。省略した場合は選択中のプロジェクトを取得する。
 
     Returns:
         None
     """
     # project_idを取得する
-    try:
-        project_id = firebase_driver.get_project_id(user_id, firestore_client)
+    if project_id is None:
+        try:
+            project_id = firebase_driver.get_project_id(user_id, firestore_client)
 
-    except Exception as e:
-        detail = f'error loading project id: {str(e)}'
-        raise HTTPException(status_code=400, detail=detail)
+        except Exception as e:
+            detail = f'error loading project id: {str(e)}'
+            raise HTTPException(status_code=400, detail=detail)
 
     try:
         # ページ番号に基づいてストレージ内のBlobを検索
@@ -207,7 +192,7 @@ async def process_single_page_profit_and_loss(
             url = blob.generate_signed_url(expiration=3600, method='GET', version='v4')
 
         if url:
-            data = send_to_analysis_api(openai_client, url)
+            data = await asyncio.to_thread(send_to_analysis_api, openai_client, url)
 
             if data.business_summaries:
                 for summary in data.business_summaries:
@@ -222,7 +207,10 @@ async def process_single_page_profit_and_loss(
                     logger.info(f"[Page {page_number}] Valid data found, saving to Firestore")
 
                     # Firestoreにデータ保存
-                    save_parameters(firestore_client, user_id, file_uuid, page_number, summary=summary)
+                    with tracing.span('firestore.save_parameters'):
+                        await asyncio.to_thread(
+                            save_parameters, firestore_client, user_id, file_uuid, page_number, summary=summary
+                        )
 
         else:
             logger.info(f"[Page {page_number}] No blobs found for processing")
@@ -0,0 +1,139 @@
+import asyncio
+import logging
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime, timedelta
+
+from fastapi import HTTPException
+from google.cloud import storage
+from pydantic import BaseModel
+
+from src.core.services.upload import pdf_processor
+from src.settings import Settings
+
+logger = logging.getLogger(__name__)
+
+_render_executor: ProcessPoolExecutor | None = None
+
+
+class PageImageRef(BaseModel):
+    """Storage に保存されたページ画像への参照"""
+
+    page_number: int
+    blob_path: str
+    image_hash: str | None = None
+
+
+def get_render_executor() -> ProcessPoolExecutor:
+    """ページ描画用のプロセスプールをプロセスごとに1つだけ生成して返す"""
+    global _render_executor
+    if _render_executor is None:
+        _render_executor = ProcessPoolExecutor(max_workers=Settings.preview_render_workers)
+    return _render_executor
+
+
+def shutdown_render_executor() -> None:
+    """プロセスプールを停止する（アプリケーション終了時に呼ぶ）"""
+    global _render_executor
+    if _render_executor is not None:
+        _render_executor.shutdown(wait=False, cancel_futures=True)
+        _render_executor = None
+
+
+def render_pages_to_png(pdf_binary: bytes, page_numbers: list[int]) -> list[tuple[int, bytes]]:
+    """
+    ワーカープロセス内で指定ページをPNGに描画する。
+    worker/file:separate と同じ変換処理を使い、保存される画像を揃える。
+    """
+    import fitz
+
+    rendered = []
+    with fitz.open(stream=pdf_binary, filetype="pdf") as pdf_document:
+        for page_number in page_numbers:
+            image_bytes = pdf_processor.convert_pdf_page_to_image(pdf_document, page_number)
+            rendered.append((page_number, image_bytes.getvalue()))
+    return rendered
+
+
+def count_pdf_pages(pdf_binary: bytes) -> int:
+    """描画せずにPDFの総ページ数のみを取得する"""
+    import fitz
+
+    with fitz.open(stream=pdf_binary, filetype="pdf") as pdf_document:
+        return len(pdf_document)
+
+
+def list_existing_page_images(
+    storage_client: storage.Client, user_id: str, project_id: str, file_uuid: str
+) -> dict[int, str | None]:
+    """既に保存済みのページ画像を1回のlistで取得し、ページ番号とmd5ハッシュの対応を返す"""
+    prefix = pdf_processor.get_page_image_path(user_id, project_id, file_uuid, '')
+    page_hashes = {}
+    for blob in storage_client.list_blobs(prefix=prefix):
+        name = blob.name.replace(prefix, '')
+        if name.isdigit():
+            page_hashes[int(name)] = blob.md5_hash
+    return page_hashes
+
+
+def _chunk(items: list[int], size: int) -> list[list[int]]:
+    return [items[i:i + size] for i in range(0, len(items), size)]
+
+
+async def ensure_page_images(
+    storage_client: storage.Client,
+    user_id: str,
+    project_id: str,
+    file_uuid: str,
+    source_blob_path: str,
+    max_pages: int = Settings.explorer_max_preview_pages,
+) -> list[PageImageRef]:
+    """
+    先頭 max_pages ページのページ画像を用意し、その参照を返す。
+    worker/file:separate で生成済みの画像は再利用し、不足分のみプロセスプールで描画して保存する。
+    """
+    existing = list_existing_page_images(storage_client, user_id, project_id, file_uuid)
+    target_pages = set(range(max_pages))
+
+    if not target_pages <= existing.keys():
+        # 不足ページがある場合のみ元PDFを取得する
+        source_blob = storage_client.blob(source_blob_path)
+        if not source_blob.exists():
+            raise HTTPException(status_code=404, detail="File not found in storage")
+        pdf_binary = source_blob.download_as_bytes()
+
+        loop = asyncio.get_running_loop()
+        executor = get_render_executor()
+        total_pages = await loop.run_in_executor(executor, count_pdf_pages, pdf_binary)
+        target_pages = set(range(min(max_pages, total_pages)))
+        missing = sorted(target_pages - existing.keys())
+
+        if missing:
+            logger.info(f"rendering {len(missing)} preview pages for {file_uuid}")
+            chunk_size = max(1, -(-len(missing) // Settings.preview_render_workers))
+            futures = [
+                loop.run_in_executor(executor, render_pages_to_png, pdf_binary, page_numbers)
+                for page_numbers in _chunk(missing, chunk_size)
+            ]
+            for rendered in await asyncio.gather(*futures):
+                for page_number, image_binary in rendered:
+                    blob = storage_client.blob(
+                        pdf_processor.get_page_image_path(user_id, project_id, file_uuid, page_number)
+                    )
+                    await asyncio.to_thread(blob.upload_from_string, image_binary, content_type='image/png')
+                    existing[page_number] = blob.md5_hash
+
+    return [
+        PageImageRef(
+            page_number=page_number,
+            blob_path=pdf_processor.get_page_image_path(user_id, project_id, file_uuid, page_number),
+            image_hash=existing.get(page_number),
+        )
+        for page_number in sorted(target_pages)
+    ]
+
+
+def generate_page_image_url(storage_client: storage.Client, ref: PageImageRef, expiration_minutes: int = 60) -> str:
+    """ページ画像の参照から署名付きURLを生成する"""
+    blob = storage_client.blob(ref.blob_path)
+    expiration_time = datetime.utcnow() + timedelta(minutes=expiration_minutes)
+    return blob.generate_signed_url(expiration=expiration_time, method="GET", version="v4")
@@ -0,0 +1,146 @@
+import asyncio
+import logging
+from datetime import datetime, timezone
+
+import openai
+from fastapi import HTTPException
+from google.cloud import firestore
+
+import src.core.services.firebase_driver as firebase_driver
+from src.core.services import tracing
+from src.core.services.exploler import preview
+from src.core.services.firebase_driver import PageDetail
+from src.settings import Settings
+
+logger = logging.getLogger(__name__)
+
+SYSTEM_PROMPT = 'まず始めに結論を書いてください。その後それを捕捉するように文章を構成すること。 「### スライド概要、### 結論」'
+PROMPT = '画像はIR資料です。このスライドから読み取れる内容を詳細かつ丁寧に文章でまとめてください。'
+
+
+def create_chat_completion_message(system_prompt, prompt, image_url):
+    messages = [
+        {"role": "system", "content": system_prompt},
+        {
+            "role": "user",
+            "content": [
+                {
+                    "type": "text",
+                    "text": f'{prompt}',
+                },
+                {
+                    "type": "image_url",
+                    "image_url": {"url": image_url},
+                },
+            ],
+        },
+    ]
+    return messages
+
+
+def summarize_page(openai_client: openai.ChatCompletion, image_url: str) -> str:
+    """1ページ分の画像を要約する"""
+    messages = create_chat_completion_message(SYSTEM_PROMPT, PROMPT, image_url)
+    with tracing.span('llm.page_summary', model='gpt-4o-mini'):
+        response = openai_client.chat.completions.create(model='gpt-4o-mini', messages=messages)
+        tracing.record_usage(response)
+    return response.choices[0].message.content
+
+
+async def load_summarized_hashes(
+    firestore_client: firestore.Client,
+    user_id: str,
+    file_uuid: str,
+    target_collection: str,
+) -> dict[int, str | None]:
+    """前回の要約時のページ画像ハッシュを取得する"""
+    try:
+        pages = await firebase_driver.get_pages_from_analysis_result(
+            firestore_client=firestore_client,
+            user_id=user_id,
+            file_uuid=file_uuid,
+            target_collection=target_collection,
+        )
+    except HTTPException:
+        return {}
+    return {page.index: page.image_hash for page in pages}
+
+
+async def summarize_pages(
+    firestore_client: firestore.Client,
+    storage_client,
+    openai_client: openai.ChatCompletion,
+    user_id: str,
+    file_uuid: str,
+    page_refs: list[preview.PageImageRef],
+    target_collection: str = 'documents',
+    concurrency: int = Settings.explorer_summary_concurrency,
+) -> None:
+    """
+    ページ画像を同時実行数を制限しながら要約し、完了したページから順に保存する。
+    前回の要約時から画像ハッシュが変わっていないページは要約しない。
+    """
+    summarized_hashes = await load_summarized_hashes(firestore_client, user_id, file_uuid, target_collection)
+    targets = [
+        page_ref
+        for page_ref in page_refs
+        if page_ref.image_hash is None or summarized_hashes.get(page_ref.page_number) != page_ref.image_hash
+    ]
+    total = len(page_refs)
+    skipped = total - len(targets)
+    completed = 0
+    failed = 0
+    progress_lock = asyncio.Lock()
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async def report_progress():
+        await asyncio.to_thread(
+            firebase_driver.save_page_summary_progress,
+            firestore_client,
+            user_id,
+            file_uuid,
+            target_collection,
+            completed,
+            skipped,
+            failed,
+            total,
+        )
+        done = completed + skipped + failed
+        logger.info(f"[{file_uuid}] page summaries: {done}/{total} (skipped {skipped}, failed {failed})")
+
+    async def process(page_ref: preview.PageImageRef):
+        nonlocal completed, failed
+        succeeded = True
+        async with semaphore:
+            try:
+                image_url = preview.generate_page_image_url(storage_client, page_ref)
+                summary = await asyncio.to_thread(summarize_page, openai_client, image_url)
+                row = PageDetail(
+                    index=page_ref.page_number,
+                    summary=summary,
+                    updated_at=datetime.now(tz=timezone.utc),
+                    image_hash=page_ref.image_hash,
+                )
+                await asyncio.to_thread(
+                    firebase_driver.save_pages_to_analysis_result,
+                    firestore_client=firestore_client,
+                    user_id=user_id,
+                    file_uuid=file_uuid,
+                    target_collection=target_collection,
+                    pages=[row],
+                )
+
+            except Exception as e:
+                logger.error(f"[Page {page_ref.page_number}] summarization failed: {e}", exc_info=True)
+                succeeded = False
+
+        # 失敗したページも処理済みとして数え、進捗が total に届くようにする
+        async with progress_lock:
+            if succeeded:
+                completed += 1
+            else:
+                failed += 1
+            await report_progress()
+
+    await report_progress()
+    await asyncio.gather(*(process(page_ref) for page_ref in targets))
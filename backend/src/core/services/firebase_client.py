@@ -1,7 +1,8 @@
 from functools import lru_cache
 
-from firebase_admin import _apps, auth, credentials, firestore, get_app, initialize_app, storage
+from firebase_admin import _apps, credentials, firestore, get_app, initialize_app, storage
 
+from src.core.services import token_cache
 from src.settings import settings
 
 
@@ -42,17 +43,9 @@ class FirebaseClient:
     @classmethod
     def verify_token(cls, token: str) -> str:
         """
-        Firebase Auth トークンを検証して user_id を返す。
+        Firebase Auth トークンを検証して user_id を返す。検証済みのトークンはキャッシュから返す。
         """
-        try:
-            decoded_token = auth.verify_id_token(token, app=cls._app)
-            return decoded_token["uid"]
-        except auth.InvalidIdTokenError:
-            raise ValueError("Invalid token")
-        except auth.ExpiredIdTokenError:
-            raise ValueError("Token expired")
-        except Exception as e:
-            raise ValueError(f"Token verification failed: {str(e)}")
+        return token_cache.verify_id_token(token, app=cls._app)
 
 
 @lru_cache()
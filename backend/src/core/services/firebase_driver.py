@@ -1,14 +1,15 @@
 from datetime import datetime
-from decimal import Decimal, InvalidOperation
+from decimal import Decimal
 from io import BytesIO
 from typing import Literal, Optional
 
 from fastapi import HTTPException, UploadFile
 from google.cloud import firestore
 from google.cloud.firestore_v1.base_query import FieldFilter
-from openpyxl import load_workbook
 from pydantic import BaseModel, Field, validator
 
+from src.core.services import metric_codec
+
 
 async def upload_to_firebase(file: UploadFile, filename: str, storage_client):
     blob = storage_client.blob(filename)
@@ -22,6 +23,8 @@ async def upload_to_firebase(file: UploadFile, filename: str, storage_client):
 
 
 async def parse_excel_file(file: UploadFile):
+    from openpyxl import load_workbook
+
     file_content = await file.read()
     workbook = load_workbook(BytesIO(file_content), read_only=True)
     sheet = workbook.active
@@ -113,6 +116,44 @@ def save_page_analyst_report(
         raise HTTPException(status_code=500, detail=e)
 
 
+def save_page_analyst_reports(
+    firestore_client: firestore.Client,
+    user_id: str,
+    project_id: str,
+    file_uuid: str,
+    file_name: str,
+    reports: list[tuple[int, AnalystReport, TranscriptionReport]],
+) -> None:
+    """複数ページの分析結果を1回のバッチで保存する（ページ単位の内容は save_page_analyst_report と同じ）"""
+    doc_ref = (
+        firestore_client.collection('users')
+        .document(user_id)
+        .collection('projects')
+        .document(project_id)
+        .collection('documents')
+        .document(str(file_uuid))
+    )
+    batch = firestore_client.batch()
+    for page_number, analyst_report, transcription_report in reports:
+        batch.set(
+            doc_ref.collection('pages').document(str(page_number)),
+            {
+                # metadata
+                "file_uuid": str(file_uuid),
+                "file_name": file_name,
+                "page_number": str(page_number),
+                # report
+                "facts": str(analyst_report.facts),
+                "issues": str(analyst_report.issues),
+                'rationale': str(analyst_report.rationale),
+                'forecast': str(analyst_report.forecast),
+                'investigation': str(analyst_report.investigation),
+                'transcription': str(transcription_report.transcription)
+            },
+        )
+    batch.commit()
+
+
 def save_analysis_result(
     firestore_client: firestore.Client,
     user_id: str,
@@ -247,12 +288,13 @@ def save_page_image_analysis(
                 "month": business_summary.period.month,
                 "quarter": business_summary.period.quarter,
                 "period_type": business_summary.period.period_type,
-                "revenue_forecast": str(business_summary.revenue_forecast),
-                "revenue_actual": str(business_summary.revenue_actual),
-                "gross_profit_forecast": str(business_summary.gross_profit_forecast),
-                "gross_profit_actual": str(business_summary.gross_profit_actual),
-                "gross_profit_margin_forecast": str(business_summary.gross_profit_margin_forecast),
-                "gross_profit_margin_actual": str(business_summary.gross_profit_margin_actual),
+                "schema_version": metric_codec.SCHEMA_VERSION,
+                "revenue_forecast": metric_codec.to_number(business_summary.revenue_forecast),
+                "revenue_actual": metric_codec.to_number(business_summary.revenue_actual),
+                "gross_profit_forecast": metric_codec.to_number(business_summary.gross_profit_forecast),
+                "gross_profit_actual": metric_codec.to_number(business_summary.gross_profit_actual),
+                "gross_profit_margin_forecast": metric_codec.to_number(business_summary.gross_profit_margin_forecast),
+                "gross_profit_margin_actual": metric_codec.to_number(business_summary.gross_profit_margin_actual),
                 "explanation": str(explanation),
                 "output": str(output),
                 'opinion': str(opinion),
@@ -265,13 +307,8 @@ def save_page_image_analysis(
 
 
 def safe_decimal(value: Optional[str]) -> Optional[Decimal]:
-    """Convert a value to Decimal safely, return None if conversion fails."""
-    if value is None or value == "":
-        return None
-    try:
-        return Decimal(value)
-    except InvalidOperation:
-        return None
+    """Convert a stored metric (number, or legacy str(Decimal)) to Decimal, return None if missing or invalid."""
+    return metric_codec.to_decimal(value)
 
 
 def get_selected_project_id(firestore_client: firestore.Client, user_id: str) -> str:
@@ -422,6 +459,28 @@ class PageDetail(BaseModel):
     index: int
     summary: str
     updated_at: datetime
+    image_hash: str | None = None
+
+
+PAGE_SUMMARIES_COLLECTION = 'page_summaries'
+
+
+def page_detail_to_dict(page: PageDetail) -> dict:
+    return {
+        "index": page.index,
+        "summary": page.summary,
+        "updated_at": page.updated_at,
+        "image_hash": page.image_hash,
+    }
+
+
+def page_detail_from_dict(page: dict) -> PageDetail:
+    return PageDetail(
+        index=page["index"],
+        summary=page["summary"],
+        updated_at=datetime.fromtimestamp(page["updated_at"].timestamp()),
+        image_hash=page.get("image_hash"),
+    )
 
 
 def save_pages_to_analysis_result(
@@ -431,6 +490,7 @@ def save_pages_to_analysis_result(
     target_collection: str,
     pages: list[PageDetail],
 ) -> None:
+    """ページ要約を `page_summaries/{index}` にupsertする"""
     projects_ref = firestore_client.collection('users').document(user_id).collection('projects')
     is_selected_filter = FieldFilter("is_selected", "==", True)
     query = projects_ref.where(filter=is_selected_filter).limit(1)
@@ -448,17 +508,13 @@ def save_pages_to_analysis_result(
         .collection(target_collection)
         .document(str(file_uuid))
     )
+    page_summaries_ref = doc_ref.collection(PAGE_SUMMARIES_COLLECTION)
 
     try:
-        pages_dicts = [
-            {
-                "index": page.index,
-                "summary": page.summary,
-                "updated_at": page.updated_at,
-            }
-            for page in pages
-        ]
-        doc_ref.update({"pages": firestore.ArrayUnion(pages_dicts)})
+        batch = firestore_client.batch()
+        for page in pages:
+            batch.set(page_summaries_ref.document(str(page.index)), page_detail_to_dict(page))
+        batch.commit()
         return
 
     except Exception as e:
@@ -466,13 +522,26 @@ def save_pages_to_analysis_result(
         raise HTTPException(status_code=500, detail=f'{detail}: {e}')
 
 
+def latest_pages_from_array(pages_data: list[dict]) -> list[PageDetail]:
+    """旧形式の `pages` 配列から `index` ごとに最新のページを取り出す"""
+    latest_pages = {}
+    for page in pages_data:
+        row = page_detail_from_dict(page)
+
+        # `index` が存在しない、もしくは `updated_at` がより新しい場合に更新
+        if row.index not in latest_pages or row.updated_at > latest_pages[row.index].updated_at:
+            latest_pages[row.index] = row
+
+    return list(latest_pages.values())
+
+
 async def get_pages_from_analysis_result(
     firestore_client: firestore.Client,
     user_id: str,
     file_uuid: str,
     target_collection: str,
 ) -> list[PageDetail]:
-    """指定されたUUIDに紐づくデータを取得し、重複するindexがあれば最新のものを返す"""
+    """指定されたUUIDに紐づくページ要約を `index` 順に取得する"""
     projects_ref = firestore_client.collection('users').document(user_id).collection('projects')
     is_selected_filter = firestore.FieldFilter("is_selected", "==", True)
     query = projects_ref.where(filter=is_selected_filter).limit(1)
@@ -491,25 +560,195 @@ async def get_pages_from_analysis_result(
         .document(str(file_uuid))
     )
 
-    # Firestoreからデータを取得
+    # `page_summaries` は index ごとに1ドキュメントなので、読み込みはページ数に比例する
+    pages = [page_detail_from_dict(doc.to_dict()) for doc in doc_ref.collection(PAGE_SUMMARIES_COLLECTION).stream()]
+    if pages:
+        return sorted(pages, key=lambda page: page.index)
+
+    # 未移行のドキュメントは旧形式の `pages` 配列から読む
     doc_snapshot = doc_ref.get()
     if not doc_snapshot.exists:
         raise HTTPException(status_code=404, detail="No pages found for the specified UUID")
 
-    # Firestoreから取得した`pages`フィールドのリストを取得
     pages_data = doc_snapshot.to_dict().get("pages", [])
+    return sorted(latest_pages_from_array(pages_data), key=lambda page: page.index)
 
-    # `index`ごとに最新のページを取得
-    latest_pages = {}
-    for page in pages_data:
-        index = page["index"]
-        updated_at = datetime.fromtimestamp(page["updated_at"].timestamp())
 
-        # `index` が存在しない、もしくは `updated_at` がより新しい場合に更新
-        if index not in latest_pages or updated_at > latest_pages[index].updated_at:
-            latest_pages[index] = PageDetail(index=index, summary=page["summary"], updated_at=updated_at)
+def migrate_pages_array_to_subcollection(firestore_client: firestore.Client, doc_ref) -> int:
+    """
+    旧形式の `pages` 配列を `page_summaries` サブコレクションへ移行し、配列フィールドを削除する。
+    移行したページ数を返す。
+    """
+    doc_snapshot = doc_ref.get()
+    if not doc_snapshot.exists:
+        return 0
 
-    return list(latest_pages.values())
+    pages_data = doc_snapshot.to_dict().get("pages")
+    if not pages_data:
+        return 0
+
+    page_summaries_ref = doc_ref.collection(PAGE_SUMMARIES_COLLECTION)
+    existing = {doc.id: doc.to_dict() for doc in page_summaries_ref.stream()}
+
+    batch = firestore_client.batch()
+    migrated = 0
+    for page in latest_pages_from_array(pages_data):
+        current = existing.get(str(page.index))
+        # 移行先に既により新しい要約がある場合は上書きしない
+        if current and current["updated_at"].timestamp() >= page.updated_at.timestamp():
+            continue
+        batch.set(page_summaries_ref.document(str(page.index)), page_detail_to_dict(page))
+        migrated += 1
+
+    batch.update(doc_ref, {"pages": firestore.DELETE_FIELD})
+    batch.commit()
+    return migrated
+
+
+def save_page_summary_progress(
+    firestore_client: firestore.Client,
+    user_id: str,
+    file_uuid: str,
+    target_collection: str,
+    completed: int,
+    skipped: int,
+    failed: int,
+    total: int,
+) -> None:
+    """ページ要約の進捗をファイルのドキュメントに記録する（completed + skipped + failed が total になったら終了）"""
+    selected_project_id = get_selected_project_id(firestore_client, user_id)
+    doc_ref = (
+        firestore_client.collection('users')
+        .document(user_id)
+        .collection('projects')
+        .document(selected_project_id)
+        .collection(target_collection)
+        .document(str(file_uuid))
+    )
+
+    try:
+        doc_ref.update(
+            {
+                "page_summary_progress": {
+                    "completed": completed,
+                    "skipped": skipped,
+                    "failed": failed,
+                    "total": total,
+                    "updated_at": firestore.SERVER_TIMESTAMP,
+                }
+            }
+        )
+        return
+
+    except Exception as e:
+        detail = 'saving page summary progress to firebase'
+        raise HTTPException(status_code=500, detail=f'{detail}: {e}')
+
+
+def fetch_page_summary_progress(
+    firestore_client: firestore.Client,
+    user_id: str,
+    file_uuid: str,
+    target_collection: str,
+) -> dict:
+    """ページ要約の進捗を取得する"""
+    selected_project_id = get_selected_project_id(firestore_client, user_id)
+    doc_snapshot = (
+        firestore_client.collection('users')
+        .document(user_id)
+        .collection('projects')
+        .document(selected_project_id)
+        .collection(target_collection)
+        .document(str(file_uuid))
+        .get()
+    )
+    if not doc_snapshot.exists:
+        raise HTTPException(status_code=404, detail="File not found")
+
+    return doc_snapshot.to_dict().get("page_summary_progress") or {}
+
+
+class SheetSummary(BaseModel):
+    sheet_index: int
+    sheet_name: str
+    title: str
+    summary: str
+    category: str = ''
+    row_count: int
+    content_hash: str
+
+
+SHEETS_COLLECTION = 'sheets'
+SHEET_SUMMARY_CACHE_COLLECTION = 'sheet_summary_cache'
+MAX_BATCH_WRITES = 500
+
+
+def get_sheet_summary_cache_ref(firestore_client: firestore.Client, user_id: str, project_id: str):
+    return (
+        firestore_client.collection('users')
+        .document(user_id)
+        .collection('projects')
+        .document(project_id)
+        .collection(SHEET_SUMMARY_CACHE_COLLECTION)
+    )
+
+
+def fetch_cached_sheet_summaries(
+    firestore_client: firestore.Client,
+    user_id: str,
+    project_id: str,
+    content_hashes: list[str],
+) -> dict[str, dict]:
+    """シート内容のハッシュをキーに、過去の要約結果を1回の get_all でまとめて取得する"""
+    if not content_hashes:
+        return {}
+
+    cache_ref = get_sheet_summary_cache_ref(firestore_client, user_id, project_id)
+    doc_refs = [cache_ref.document(content_hash) for content_hash in set(content_hashes)]
+    return {snapshot.id: snapshot.to_dict() for snapshot in firestore_client.get_all(doc_refs) if snapshot.exists}
+
+
+def save_sheet_summaries(
+    firestore_client: firestore.Client,
+    user_id: str,
+    project_id: str,
+    file_uuid: str,
+    sheets: list[SheetSummary],
+) -> None:
+    """シートごとの要約を `documents/{file_uuid}/sheets/{sheet_index}` に保存し、要約キャッシュも更新する"""
+    doc_ref = (
+        firestore_client.collection('users')
+        .document(user_id)
+        .collection('projects')
+        .document(project_id)
+        .collection('documents')
+        .document(str(file_uuid))
+    )
+    sheets_ref = doc_ref.collection(SHEETS_COLLECTION)
+    cache_ref = get_sheet_summary_cache_ref(firestore_client, user_id, project_id)
+
+    try:
+        # 1シートあたり2件書き込むため、バッチの上限を超えないように分割する
+        chunk_size = MAX_BATCH_WRITES // 2
+        for start in range(0, len(sheets), chunk_size):
+            batch = firestore_client.batch()
+            for sheet in sheets[start : start + chunk_size]:
+                batch.set(sheets_ref.document(str(sheet.sheet_index)), sheet.model_dump())
+                batch.set(
+                    cache_ref.document(sheet.content_hash),
+                    {
+                        "title": sheet.title,
+                        "summary": sheet.summary,
+                        "category": sheet.category,
+                        "updated_at": firestore.SERVER_TIMESTAMP,
+                    },
+                )
+            batch.commit()
+        return
+
+    except Exception as e:
+        detail = 'saving sheet summaries to firebase'
+        raise HTTPException(status_code=500, detail=f'{detail}: {e}')
 
 
 def save_worker_analyst_report(
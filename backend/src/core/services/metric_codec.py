@@ -0,0 +1,116 @@
+import math
+from decimal import Decimal, InvalidOperation
+from typing import Any, Optional
+
+from pydantic import BaseModel
+
+from src.core.models.plan import BusinessScope, ProfitAndLoss, SaaSCustomerMetrics, SaaSRevenueMetrics
+
+# 数値を int（円などの整数値）/ float で保存し、欠損は null で保存する形式
+SCHEMA_VERSION = 2
+INT64_MAX = 2**63 - 1
+
+METRIC_GROUPS: dict[str, list[str]] = {
+    'profit_and_loss': list(ProfitAndLoss.model_fields),
+    'saas_revenue_metrics': list(SaaSRevenueMetrics.model_fields),
+    'saas_customer_metrics': list(SaaSCustomerMetrics.model_fields),
+}
+
+Number = int | float
+
+
+def to_number(value: Any) -> Optional[Number]:
+    """
+    指標の値を保存用の数値に変換する。
+    整数値は int、それ以外は float とし、欠損・変換できない値は None を返す。
+    旧形式の文字列（str(Decimal) や "None"）もここで変換する。
+    """
+    if value is None:
+        return None
+    value_type = type(value)
+    if value_type is int:
+        return value
+    if value_type is float:
+        return None if math.isnan(value) or math.isinf(value) else value
+    if value_type is str:
+        if value in ('', 'None'):
+            return None
+        try:
+            value = Decimal(value.replace(',', ''))
+        except InvalidOperation:
+            return None
+    if isinstance(value, Decimal):
+        if not value.is_finite():
+            return None
+        if value == value.to_integral_value() and abs(value) <= INT64_MAX:
+            return int(value)
+        return float(value)
+    return None
+
+
+def to_decimal(value: Any) -> Optional[Decimal]:
+    number = to_number(value)
+    if number is None:
+        return None
+    return Decimal(number) if type(number) is int else Decimal(repr(number))
+
+
+def format_number(value: Any) -> Optional[str]:
+    """表示用の文字列に変換する。旧形式の文字列と同じ表記になるようにする"""
+    number = to_number(value)
+    if number is None:
+        return None
+    if type(number) is float and number.is_integer():
+        return str(int(number))
+    return str(number)
+
+
+def encode_group(metrics: Optional[BaseModel], group: str) -> Optional[dict[str, Optional[Number]]]:
+    """指標グループを、すべてのキーを持つ辞書に変換する。グループ自体がない場合は None"""
+    if metrics is None:
+        return None
+    return {key: to_number(getattr(metrics, key, None)) for key in METRIC_GROUPS[group]}
+
+
+def decode_group(metrics: Any, group: str) -> Optional[dict[str, Optional[Number]]]:
+    if not isinstance(metrics, dict):
+        return None
+    return {key: to_number(metrics.get(key)) for key in METRIC_GROUPS[group]}
+
+
+def build_option(
+    file_uuid: str,
+    page_number: int,
+    business_scope: BusinessScope,
+    profit_and_loss: Optional[ProfitAndLoss] = None,
+    saas_revenue_metrics: Optional[SaaSRevenueMetrics] = None,
+    saas_customer_metrics: Optional[SaaSCustomerMetrics] = None,
+) -> dict:
+    """P&L と SaaS で共通の `option` ドキュメントを作成する"""
+    return {
+        'schema_version': SCHEMA_VERSION,
+        'file_uuid': str(file_uuid),
+        'page_number': int(page_number),
+        'business_scope': {
+            'scope_type': business_scope.scope_type,
+            'company_name': business_scope.company_name,
+            'department_name': business_scope.department_name,
+            'product_name': business_scope.product_name,
+        },
+        'profit_and_loss': encode_group(profit_and_loss, 'profit_and_loss'),
+        'saas_revenue_metrics': encode_group(saas_revenue_metrics, 'saas_revenue_metrics'),
+        'saas_customer_metrics': encode_group(saas_customer_metrics, 'saas_customer_metrics'),
+    }
+
+
+def decode_option(data: dict) -> dict:
+    """`option` ドキュメントを共通の形式で返す。新形式のドキュメントは変換せずにそのまま返す"""
+    if data.get('schema_version') == SCHEMA_VERSION:
+        return data
+
+    return {
+        **data,
+        'schema_version': SCHEMA_VERSION,
+        'page_number': int(data['page_number']),
+        **{group: decode_group(data.get(group), group) for group in METRIC_GROUPS},
+    }
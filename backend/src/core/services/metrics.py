@@ -0,0 +1,154 @@
+import os
+import time
+
+from prometheus_client import (
+    CONTENT_TYPE_LATEST,
+    REGISTRY,
+    CollectorRegistry,
+    Counter,
+    Gauge,
+    Histogram,
+    generate_latest,
+)
+from prometheus_client import multiprocess
+
+# gunicorn の複数ワーカーで集計するため、PROMETHEUS_MULTIPROC_DIR を設定して起動する（bin/start.sh）
+MULTIPROC_DIR_ENV = 'PROMETHEUS_MULTIPROC_DIR'
+
+# ラベルの種類が増えすぎないよう、パスの先頭の要素（ルーター）単位で集計する
+ROUTERS = {
+    'auth',
+    'data',
+    'explorer',
+    'image',
+    'parameter',
+    'projects',
+    'projection',
+    'retriever',
+    'upload',
+    'worker',
+}
+BACKENDS = {'firestore', 'storage', 'weaviate'}
+
+LATENCY_BUCKETS = (0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120, 300)
+
+http_request_duration = Histogram(
+    'http_request_duration_seconds',
+    'HTTP request latency by router',
+    ['router', 'method', 'status'],
+    buckets=LATENCY_BUCKETS,
+)
+http_requests_in_progress = Gauge(
+    'http_requests_in_progress',
+    'HTTP requests currently being processed',
+    ['router'],
+    multiprocess_mode='livesum',
+)
+openai_request_duration = Histogram(
+    'openai_request_duration_seconds',
+    'OpenAI API call latency',
+    ['model', 'operation'],
+    buckets=LATENCY_BUCKETS,
+)
+openai_requests = Counter('openai_requests_total', 'OpenAI API calls', ['model', 'operation', 'status'])
+openai_tokens = Counter('openai_tokens_total', 'OpenAI tokens used', ['model', 'type'])
+backend_call_duration = Histogram(
+    'backend_call_duration_seconds',
+    'Firestore / Storage / Weaviate call latency',
+    ['backend', 'operation'],
+    buckets=LATENCY_BUCKETS,
+)
+backend_calls = Counter(
+    'backend_calls_total',
+    'Firestore / Storage / Weaviate calls',
+    ['backend', 'operation', 'status'],
+)
+cache_requests = Counter('cache_requests_total', 'Cache lookups', ['cache', 'result'])
+# 共有クライアントの接続数の上限と使用中の数（client_requests_in_flight / client_pool_size が使用率）
+client_pool_size = Gauge(
+    'client_pool_size',
+    'Connection pool size of shared clients',
+    ['client'],
+    multiprocess_mode='livesum',
+)
+client_requests_in_flight = Gauge(
+    'client_requests_in_flight',
+    'Requests currently using a shared client',
+    ['client'],
+    multiprocess_mode='livesum',
+)
+client_pool_waits = Counter('client_pool_waits_total', 'Requests started while the pool was full', ['client'])
+
+
+def get_router(path: str) -> str:
+    segment = path.strip('/').split('/', 1)[0].split(':', 1)[0]
+    return segment if segment in ROUTERS else 'other'
+
+
+def observe_span(name: str, duration: float, status: str, attributes: dict) -> None:
+    """tracing のスパンを OpenAI・バックエンドの呼び出しのメトリクスとして記録する"""
+    kind, _, operation = name.partition('.')
+    if kind == 'llm':
+        model = attributes.get('model', 'unknown')
+        openai_request_duration.labels(model, operation).observe(duration)
+        openai_requests.labels(model, operation, status).inc()
+        for token_type in ('prompt_tokens', 'completion_tokens'):
+            if attributes.get(token_type):
+                openai_tokens.labels(model, token_type.removesuffix('_tokens')).inc(attributes[token_type])
+    elif kind in BACKENDS:
+        backend_call_duration.labels(kind, operation).observe(duration)
+        backend_calls.labels(kind, operation, status).inc()
+
+
+def record_cache(cache: str, hits: int = 0, misses: int = 0) -> None:
+    if hits:
+        cache_requests.labels(cache, 'hit').inc(hits)
+    if misses:
+        cache_requests.labels(cache, 'miss').inc(misses)
+
+
+def render_metrics() -> tuple[bytes, str]:
+    """全ワーカーのメトリクスを集計した Prometheus のテキスト形式を返す"""
+    registry = REGISTRY
+    if os.environ.get(MULTIPROC_DIR_ENV):
+        registry = CollectorRegistry()
+        multiprocess.MultiProcessCollector(registry)
+    return generate_latest(registry), CONTENT_TYPE_LATEST
+
+
+def mark_process_dead(pid: int) -> None:
+    """終了したワーカーの livesum ゲージを集計から外す（gunicorn の child_exit から呼ぶ）"""
+    if os.environ.get(MULTIPROC_DIR_ENV):
+        multiprocess.mark_process_dead(pid)
+
+
+class MetricsMiddleware:
+    """ルーターごとのリクエストの処理時間と処理中のリクエスト数を記録する ASGI ミドルウェア"""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope['type'] != 'http' or scope['path'] == '/metrics':
+            await self.app(scope, receive, send)
+            return
+
+        router = get_router(scope['path'])
+        status_code = 500
+
+        async def send_wrapper(message):
+            nonlocal status_code
+            if message['type'] == 'http.response.start':
+                status_code = message['status']
+            await send(message)
+
+        in_progress = http_requests_in_progress.labels(router)
+        in_progress.inc()
+        start = time.perf_counter()
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            in_progress.dec()
+            http_request_duration.labels(router, scope['method'], str(status_code)).observe(
+                time.perf_counter() - start
+            )
@@ -2,9 +2,11 @@ import json
 from typing import Generator
 
 import openai
-from openpyxl import load_workbook
+from pydantic import BaseModel
 
+from src.core.services import tracing
 from src.core.services.firebase_driver import AnalysisResult
+from src.core.services.upload import table_processor
 from src.settings import settings
 
 openai.api_key = settings.openai_api_key
@@ -43,40 +45,59 @@ def stream_generate_dd_answer_test(client: openai.ChatCompletion, background: st
             yield chunk.choices[0].delta.content
 
 
-def send_xlsx_content_to_openai(file_path: str, client: openai.ChatCompletion) -> list[str]:
-    workbook = load_workbook(file_path)
-    sheet = workbook.active
-    content = []
+class TableMetadata(BaseModel):
+    title: str
+    summary: str
+    category: str
 
-    for row in sheet.iter_rows(values_only=True):
-        content.append("\t".join([str(cell) for cell in row if cell is not None]))
-    text_content = "\n".join(content)
 
-    response = client.chat.completions.create(
-        model="gpt-4o-mini",
-        messages=[
-            {
-                "role": "user",
-                "content": f"次のビジネスで用いられる表の内容に基づいて適切な英語ファイル名のみを回答せよ。拡張子は不要。:\n\n{text_content}",
-            }
-        ],
-        stream=False,
-    )
-    title = response.choices[0].message.content
+TABLE_CATEGORIES = ['財務会計', '管理会計(売上)', '管理会計(コスト)', 'その他']
 
-    response = client.chat.completions.create(
-        model="gpt-4o-mini",
-        messages=[
-            {
-                "role": "user",
-                "content": f"次のビジネスで用いられる表の概要を1行で短く簡潔説明してください:\n\n{text_content}",
-            }
-        ],
-        stream=False,
-    )
-    sentence = response.choices[0].message.content
 
-    return title, sentence
+def send_xlsx_content_to_openai(file_path: str, client: openai.ChatCompletion) -> tuple[str, str]:
+    text_content = table_processor.sample_table_text(
+        table_processor.iter_xlsx_rows(file_path),
+        token_budget=settings.table_prompt_token_budget,
+    )
+    metadata = generate_table_metadata(text_content, client)
+    return metadata.title, metadata.summary
+
+
+def generate_table_metadata(text_content: str, client: openai.ChatCompletion) -> TableMetadata:
+    """表のサンプルからファイル名・1行の概要・分類を1回の呼び出しで生成する"""
+    system_prompt = '次のビジネスで用いられる表の内容を分析してください。表はヘッダー・等間隔に抜き出したサンプル行・列ごとの統計に縮約されています。\
+        title: 表の内容に基づいた適切な英語ファイル名。拡張子は不要。\
+        summary: 表の概要を1行で短く簡潔に説明した日本語の文章。\
+        category: 財務会計/管理会計(売上)/管理会計(コスト)/その他'
+
+    with tracing.span('llm.table_metadata', model='gpt-4o-mini'):
+        response = client.chat.completions.create(
+            model="gpt-4o-mini",
+            messages=[
+                {'role': 'system', 'content': system_prompt},
+                {"role": "user", "content": text_content},
+            ],
+            response_format={
+                "type": "json_schema",
+                "json_schema": {
+                    "name": "table_metadata",
+                    "schema": {
+                        "type": "object",
+                        "properties": {
+                            "title": {"type": "string"},
+                            "summary": {"type": "string"},
+                            "category": {"type": "string", "enum": TABLE_CATEGORIES},
+                        },
+                        "required": ["title", "summary", "category"],
+                        "additionalProperties": False,
+                    },
+                    "strict": True,
+                },
+            },
+        )
+        tracing.record_usage(response)
+    result = response.choices[0].message.content
+    return TableMetadata.model_validate_json(result)
 
 
 def generate_summary(content: str, client: openai.ChatCompletion) -> Generator[str, None, None]:
@@ -240,48 +261,50 @@ def extract_document_information(
         category:財務会計/管理会計(売上)/管理会計(コスト)/その他\
         category_ir: 財務諸表/有価証券報告書/四半期報告書/決算短信または説明資料/適時開示/株主総会招集通知および議決権行使資料/コーポレート・ガバナンス/その他'
 
-    response = openai_client.chat.completions.create(
-        model="gpt-4o-mini",
-        messages=[
-            {'role': 'system', 'content': system_prompt},
-            {"role": "user", "content": content_text},
-        ],
-        response_format={
-            "type": "json_schema",
-            "json_schema": {
-                "name": "file_analysis",
-                "schema": {
-                    "type": "object",
-                    "properties": {
-                        "abstract": {
-                            "type": "string",
-                            "description": "参照したデータの概要を日本語でまとめてください。一般的な用語説明は不要です。",
+    with tracing.span('llm.document_information', model='gpt-4o-mini'):
+        response = openai_client.chat.completions.create(
+            model="gpt-4o-mini",
+            messages=[
+                {'role': 'system', 'content': system_prompt},
+                {"role": "user", "content": content_text},
+            ],
+            response_format={
+                "type": "json_schema",
+                "json_schema": {
+                    "name": "file_analysis",
+                    "schema": {
+                        "type": "object",
+                        "properties": {
+                            "abstract": {
+                                "type": "string",
+                                "description": "参照したデータの概要を日本語でまとめてください。一般的な用語説明は不要です。",
+                            },
+                            "feature": {"type": "string"},
+                            "extractable_info": {
+                                "type": "array",
+                                "items": {"type": "string"},
+                            },
+                            "year_info": {"type": "string"},
+                            "period_type": {"type": "string"},
+                            "category": {"type": "string"},
+                            "category_ir": {"type": "string"},
                         },
-                        "feature": {"type": "string"},
-                        "extractable_info": {
-                            "type": "array",
-                            "items": {"type": "string"},
-                        },
-                        "year_info": {"type": "string"},
-                        "period_type": {"type": "string"},
-                        "category": {"type": "string"},
-                        "category_ir": {"type": "string"},
+                        "required": [
+                            "abstract",
+                            "feature",
+                            "extractable_info",
+                            "category",
+                            "year_info",
+                            "period_type",
+                            "category_ir",
+                        ],
+                        "additionalProperties": False,
                     },
-                    "required": [
-                        "abstract",
-                        "feature",
-                        "extractable_info",
-                        "category",
-                        "year_info",
-                        "period_type",
-                        "category_ir",
-                    ],
-                    "additionalProperties": False,
+                    "strict": True,
                 },
-                "strict": True,
             },
-        },
-    )
+        )
+        tracing.record_usage(response)
     result = response.choices[0].message.content
     data = json.loads(result)
 
@@ -1,7 +1,6 @@
 import io
 import os
 
-import PyPDF2
 from fastapi import HTTPException, UploadFile
 
 from src.settings import settings
@@ -11,6 +10,8 @@ def extract_text_from_pdf(file: UploadFile) -> str:
     """
     PDFファイルからテキストを抽出する
     """
+    import PyPDF2
+
     file.file.seek(0)
     contents = file.file.read()
 
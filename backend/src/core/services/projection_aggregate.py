@@ -0,0 +1,257 @@
+import hashlib
+import logging
+from typing import Optional
+
+from google.cloud import firestore
+
+from src.core.services import metric_codec
+
+logger = logging.getLogger(__name__)
+
+# 集計の形式。値ごとに報告した option を持たない古い形式の集計は option から作り直す
+AGGREGATE_VERSION = 2
+# 事業の範囲を区別するフィールド（option のドキュメントIDと同じ単位）
+SCOPE_FIELDS = ['scope_type', 'company_name', 'department_name', 'product_name']
+
+METRIC_TITLES = [
+    ("revenue", "売上高"),
+    ("cogs", "売上原価"),
+    ("gross_profit_margin", "売上総利益率"),
+    ("sg_and_a", "販売費・一般管理費"),
+    ("operating_income", "営業利益"),
+    ("operating_income_margin", "営業利益率"),
+    ("non_operating_income", "営業外収益"),
+    ("non_operating_expenses", "営業外費用"),
+    ("ordinary_income", "経常利益"),
+    ("extraordinary_income", "特別利益"),
+    ("extraordinary_losses", "特別損失"),
+    ("profit_before_tax", "税引前当期純利益"),
+    ("corporate_taxes", "法人税等"),
+    ("net_income", "当期純利益"),
+    ("ebitda", "EBITDA"),
+    ("psr", "株価収益率 (PSR)"),
+    ("ev_to_ebitda", "企業価値倍率 (EV/EBITDA)"),
+    ("arpu", "ARPU(ユーザー1人あたりの平均収益)"),
+    ("mrr", "MRR"),
+    ("arr", "ARR"),
+    ("expansion_revenue", "既存顧客からの追加収益（アップセル・クロスセル）"),
+    ("new_customer_revenue", "新規顧客からの収益"),
+    ("churn_rate", "解約率"),
+    ("retention_rate", "継続率"),
+    ("active_users", "アクティブユーザー数"),
+    ("trial_conversion_rate", "無料トライアルから有料プランへの転換率"),
+    ("average_contract_value", "顧客1件あたりの平均契約額"),
+]
+
+
+def get_projection_ref(firestore_client: firestore.Client, user_id: str, project_id: str):
+    return (
+        firestore_client.collection('users')
+        .document(user_id)
+        .collection('projects')
+        .document(project_id)
+        .collection('projection')
+    )
+
+
+def get_aggregate_ref(firestore_client: firestore.Client, user_id: str, project_id: str, year: int):
+    """年ごとの月次集計ドキュメント `projection/aggregate/year/{year}` の参照を返す"""
+    return (
+        get_projection_ref(firestore_client, user_id, project_id)
+        .document('aggregate')
+        .collection('year')
+        .document(str(year))
+    )
+
+
+def get_data_keys(option: dict) -> list[str]:
+    """事業の範囲に応じて集計対象とする指標グループを返す"""
+    if option["business_scope"]["scope_type"] == "company":
+        return ['profit_and_loss']
+    return ['saas_customer_metrics', 'saas_revenue_metrics']
+
+
+def get_source_key(option: dict) -> str:
+    """値を報告した option を区別するキー（同じページでも事業の範囲が違えば別の option として数える）"""
+    scope = option["business_scope"]
+    parts = [option["file_uuid"], str(option["page_number"])] + [str(scope.get(field)) for field in SCOPE_FIELDS]
+    return hashlib.sha256('\0'.join(parts).encode('utf-8')).hexdigest()[:16]
+
+
+def prune_month(months: dict, month: int) -> None:
+    """報告した option がなくなった値・指標・月を取り除き、表示する出典を残っている option に付け替える"""
+    month_data = months[str(month)]
+    for item in month_data['items']:
+        item['values'] = [value for value in item['values'] if value['sources']]
+        for value in item['values']:
+            sources = list(value['sources'].values())
+            if {'file_uuid': value['file_uuid'], 'page_number': value['page_number']} not in sources:
+                value.update(sources[0])
+    month_data['items'] = [item for item in month_data['items'] if item['values']]
+    if not month_data['items']:
+        del months[str(month)]
+
+
+def apply_contribution(aggregate: dict, month: int, option: Optional[dict], sign: int) -> None:
+    """
+    `option` ドキュメント1件分の値を月次集計に加える（sign=-1 で取り除く）。
+    値ごとに報告した option を記録するため、同じ option を複数回加えても1回分として扱う。
+    """
+    if option is None:
+        return
+
+    months = aggregate.setdefault('months', {})
+    if str(month) not in months:
+        if sign < 0:
+            return
+        months[str(month)] = {'page_number': int(option["page_number"]), 'items': []}
+    month_data = months[str(month)]
+    items = {item['key']: item for item in month_data['items']}
+    source_key = get_source_key(option)
+    source = {'file_uuid': option["file_uuid"], 'page_number': int(option["page_number"])}
+
+    for data_key in get_data_keys(option):
+        metrics = option.get(data_key)
+        if not isinstance(metrics, dict):
+            continue
+
+        for key, title in METRIC_TITLES:
+            value = metric_codec.format_number(metrics.get(key))
+            if value is None:
+                continue
+
+            if sign < 0:
+                for entry in items.get(key, {}).get('values', []):
+                    if entry['value'] == value:
+                        entry['sources'].pop(source_key, None)
+                continue
+
+            if key not in items:
+                items[key] = {'key': key, 'title': title, 'values': []}
+                month_data['items'].append(items[key])
+
+            entry = next((entry for entry in items[key]['values'] if entry['value'] == value), None)
+            if entry is None:
+                entry = {'value': value, **source, 'sources': {}}
+                items[key]['values'].append(entry)
+            entry['sources'][source_key] = source
+
+    prune_month(months, month)
+
+
+def get_option_collection_ref(
+    firestore_client: firestore.Client, user_id: str, project_id: str, year: int, month: int
+):
+    """`projection/period/year/{year}/month/{month}/option` の参照を返す"""
+    return (
+        get_projection_ref(firestore_client, user_id, project_id)
+        .document('period')
+        .collection('year')
+        .document(str(year))
+        .collection('month')
+        .document(str(month))
+        .collection('option')
+    )
+
+
+def build_month(
+    firestore_client: firestore.Client, user_id: str, project_id: str, year: int, month: int, transaction=None
+) -> Optional[dict]:
+    """保存済みの option ドキュメントから1か月分の集計を作り直す"""
+    aggregate = {'months': {}}
+    option_ref = get_option_collection_ref(firestore_client, user_id, project_id, year, month)
+    for doc in option_ref.stream(transaction=transaction):
+        apply_contribution(aggregate, month, doc.to_dict(), 1)
+    return aggregate['months'].get(str(month))
+
+
+def build_aggregate(
+    firestore_client: firestore.Client, user_id: str, project_id: str, year: int, transaction=None
+) -> dict:
+    """既存の option ドキュメントから月次集計を作り直す"""
+    months = {}
+    for month in range(1, 13):
+        month_data = build_month(firestore_client, user_id, project_id, year, month, transaction=transaction)
+        if month_data is not None:
+            months[str(month)] = month_data
+    return {'months': months}
+
+
+def is_stale(aggregate: Optional[dict]) -> bool:
+    """集計ドキュメントがない、反映に失敗して古いままになっている、または古い形式のまま"""
+    return aggregate is None or bool(aggregate.get('stale')) or aggregate.get('version') != AGGREGATE_VERSION
+
+
+@firestore.transactional
+def _apply_option_in_transaction(
+    transaction, firestore_client, user_id, project_id, year, month, current: Optional[dict], merged: dict
+):
+    aggregate_ref = get_aggregate_ref(firestore_client, user_id, project_id, year)
+    snapshot = aggregate_ref.get(transaction=transaction)
+    aggregate = snapshot.to_dict() if snapshot.exists else None
+
+    if is_stale(aggregate):
+        # 集計ドキュメントがまだない年・古いままの年は、保存済みの option（今回の option を含む）から作成する
+        aggregate = build_aggregate(firestore_client, user_id, project_id, year, transaction=transaction)
+    else:
+        apply_contribution(aggregate, month, current, -1)
+        apply_contribution(aggregate, month, merged, 1)
+
+    transaction.set(
+        aggregate_ref,
+        {**aggregate, 'stale': False, 'version': AGGREGATE_VERSION, 'updated_at': firestore.SERVER_TIMESTAMP},
+    )
+
+
+def apply_option(
+    firestore_client: firestore.Client,
+    user_id: str,
+    project_id: str,
+    year: int,
+    month: int,
+    current: Optional[dict],
+    merged: dict,
+) -> None:
+    """
+    upsert_option で置き換えた option の差分を月次集計に反映する（古い option の値を除き、新しい option の値を加える）。
+    反映に失敗した場合は集計を古いものとして印を付け、次に読み込む時に作り直させる。
+    印も付けられない場合は例外を送出する（呼び出し元のタスクが再試行される）
+    """
+    try:
+        _apply_option_in_transaction(
+            firestore_client.transaction(), firestore_client, user_id, project_id, year, month, current, merged
+        )
+    except Exception as e:
+        logger.error(f"failed to update projection aggregate {year}/{month}, marking it stale: {e}", exc_info=True)
+        get_aggregate_ref(firestore_client, user_id, project_id, year).set(
+            {'stale': True, 'updated_at': firestore.SERVER_TIMESTAMP}, merge=True
+        )
+
+
+@firestore.transactional
+def _rebuild_in_transaction(transaction, firestore_client, user_id, project_id, year) -> dict:
+    aggregate_ref = get_aggregate_ref(firestore_client, user_id, project_id, year)
+    snapshot = aggregate_ref.get(transaction=transaction)
+    aggregate = snapshot.to_dict() if snapshot.exists else None
+    if not is_stale(aggregate):
+        # 他のリクエストが先に作り直した
+        return aggregate
+
+    aggregate = build_aggregate(firestore_client, user_id, project_id, year, transaction=transaction)
+    transaction.set(
+        aggregate_ref,
+        {**aggregate, 'stale': False, 'version': AGGREGATE_VERSION, 'updated_at': firestore.SERVER_TIMESTAMP},
+    )
+    return aggregate
+
+
+def load_aggregate(firestore_client: firestore.Client, user_id: str, project_id: str, year: int) -> dict:
+    """
+    月次集計を1回の読み込みで取得する。まだ作成されていない・古いままの場合は作り直して保存する
+    作り直しはトランザクション内で行い、同時に行われた apply_option の書き込みを上書きしない
+    """
+    snapshot = get_aggregate_ref(firestore_client, user_id, project_id, year).get()
+    aggregate = snapshot.to_dict() if snapshot.exists else None
+    if not is_stale(aggregate):
+        return aggregate
+    return _rebuild_in_transaction(firestore_client.transaction(), firestore_client, user_id, project_id, year)
@@ -0,0 +1,180 @@
+import hashlib
+import logging
+from typing import Optional
+
+from google.cloud import firestore
+
+from src.core.services import metric_codec
+from src.core.services.projection_aggregate import SCOPE_FIELDS, get_projection_ref
+
+logger = logging.getLogger(__name__)
+
+# 代表値の形式。古い形式（事業の範囲の種類ごと）の代表値は option から作り直す
+CANONICAL_VERSION = 2
+# 月のドキュメントのうち代表値のフィールドだけを丸ごと置き換える（他のフィールドは残す）
+CANONICAL_FIELDS = ['canonical', 'canonical_version', 'updated_at']
+
+
+def get_month_ref(firestore_client: firestore.Client, user_id: str, project_id: str, year: int, month: int):
+    """期間ごとの代表値を持つ `projection/period/year/{year}/month/{month}` の参照を返す"""
+    return (
+        get_projection_ref(firestore_client, user_id, project_id)
+        .document('period')
+        .collection('year')
+        .document(str(year))
+        .collection('month')
+        .document(str(month))
+    )
+
+
+def get_option_id(option: dict, year: int, month: int) -> str:
+    """(file_uuid, page_number, 事業の範囲, 期間) から option のドキュメントIDを決める"""
+    scope = option['business_scope']
+    parts = [
+        option['file_uuid'],
+        str(option['page_number']),
+        str(scope.get('scope_type')),
+        str(scope.get('company_name')),
+        str(scope.get('department_name')),
+        str(scope.get('product_name')),
+        str(year),
+        str(month),
+    ]
+    return hashlib.sha256('\0'.join(parts).encode('utf-8')).hexdigest()[:32]
+
+
+def get_scope_key(scope: dict) -> str:
+    """
+    事業の範囲（種類・会社・部署・製品）から代表値のキーを決める
+    Firestore のフィールドパスにそのまま使えるよう、名前はハッシュにする
+    """
+    parts = [str(scope.get(field)) for field in SCOPE_FIELDS]
+    return 'scope_' + hashlib.sha256('\0'.join(parts).encode('utf-8')).hexdigest()[:16]
+
+
+def merge_option_values(current: Optional[dict], option: dict) -> dict:
+    """同じキーの option を統合する。新しい値が null の指標は既存の値を残す"""
+    if current is None:
+        return metric_codec.decode_option(option)
+
+    current = metric_codec.decode_option(current)
+    merged = {**current, **{key: value for key, value in option.items() if key not in metric_codec.METRIC_GROUPS}}
+    for group in metric_codec.METRIC_GROUPS:
+        current_group, new_group = current.get(group), option.get(group)
+        if current_group is None or new_group is None:
+            merged[group] = new_group if new_group is not None else current_group
+            continue
+        merged[group] = {
+            key: new_group.get(key) if new_group.get(key) is not None else current_group.get(key)
+            for key in metric_codec.METRIC_GROUPS[group]
+        }
+    return merged
+
+
+def apply_contribution(canonical: dict, option: Optional[dict], sign: int) -> None:
+    """option 1件分の値を代表値の集計に加える（sign=-1 で取り除く）"""
+    if option is None:
+        return
+
+    option = metric_codec.decode_option(option)
+    scope = option['business_scope']
+    scope_entry = canonical.setdefault(
+        get_scope_key(scope),
+        {'business_scope': {field: scope.get(field) for field in SCOPE_FIELDS}, 'metrics': {}},
+    )
+    for group in metric_codec.METRIC_GROUPS:
+        metrics = option.get(group)
+        if not isinstance(metrics, dict):
+            continue
+        for key, value in metrics.items():
+            formatted = metric_codec.format_number(value)
+            if formatted is None:
+                continue
+            entry = scope_entry['metrics'].setdefault(group, {}).setdefault(key, {'counts': {}})
+            entry['counts'][formatted] = entry['counts'].get(formatted, 0) + sign
+            if entry['counts'][formatted] <= 0:
+                del entry['counts'][formatted]
+
+
+def summarize_canonical(canonical: dict) -> dict:
+    """件数から代表値（最も多く報告された値）と資料の件数を計算する"""
+    for scope_key, scope_entry in list(canonical.items()):
+        groups = scope_entry['metrics']
+        for group, metrics in list(groups.items()):
+            for key, entry in list(metrics.items()):
+                if not entry['counts']:
+                    del metrics[key]
+                    continue
+                formatted, _ = max(entry['counts'].items(), key=lambda item: item[1])
+                entry['value'] = metric_codec.to_number(formatted)
+                entry['sources'] = sum(entry['counts'].values())
+            if not metrics:
+                del groups[group]
+        if not groups:
+            del canonical[scope_key]
+    return canonical
+
+
+def collect_canonical(month_ref, transaction=None) -> dict:
+    """保存済みの option から期間の代表値の件数を集計する"""
+    canonical = {}
+    for doc in month_ref.collection('option').stream(transaction=transaction):
+        apply_contribution(canonical, doc.to_dict(), 1)
+    return canonical
+
+
+@firestore.transactional
+def _upsert_in_transaction(transaction, month_ref, option_ref, option: dict) -> tuple[Optional[dict], dict]:
+    option_snapshot = option_ref.get(transaction=transaction)
+    month_snapshot = month_ref.get(transaction=transaction)
+
+    current = option_snapshot.to_dict() if option_snapshot.exists else None
+    merged = merge_option_values(current, option)
+
+    month_data = (month_snapshot.to_dict() or {}) if month_snapshot.exists else {}
+    if month_data.get('canonical_version') == CANONICAL_VERSION:
+        canonical = month_data.get('canonical', {})
+    else:
+        canonical = collect_canonical(month_ref, transaction)
+    apply_contribution(canonical, current, -1)
+    apply_contribution(canonical, merged, 1)
+
+    transaction.set(option_ref, merged)
+    transaction.set(
+        month_ref,
+        {
+            'canonical': summarize_canonical(canonical),
+            'canonical_version': CANONICAL_VERSION,
+            'updated_at': firestore.SERVER_TIMESTAMP,
+        },
+        merge=CANONICAL_FIELDS,
+    )
+    return current, merged
+
+
+def upsert_option(
+    firestore_client: firestore.Client,
+    user_id: str,
+    project_id: str,
+    year: int,
+    month: int,
+    option: dict,
+) -> tuple[Optional[dict], dict]:
+    """
+    option を (file_uuid, page_number, 事業の範囲, 期間) 単位で保存し、期間ごとの代表値を更新する。
+    同じページを再解析しても option は増えず、代表値の件数も重複して数えない。
+    置き換える前の option（ない場合は None）と保存した option を返す（月次集計の差分の反映に使う）
+    """
+    month_ref = get_month_ref(firestore_client, user_id, project_id, year, month)
+    option_ref = month_ref.collection('option').document(get_option_id(option, year, month))
+    return _upsert_in_transaction(firestore_client.transaction(), month_ref, option_ref, option)
+
+
+def rebuild_canonical(month_ref) -> dict:
+    """保存済みの option から期間の代表値を作り直す"""
+    canonical = summarize_canonical(collect_canonical(month_ref))
+    month_ref.set(
+        {'canonical': canonical, 'canonical_version': CANONICAL_VERSION, 'updated_at': firestore.SERVER_TIMESTAMP},
+        merge=CANONICAL_FIELDS,
+    )
+    return canonical
@@ -1,5 +1,6 @@
 from google.cloud import firestore
 
+from src.core.services import metric_codec
 from src.core.services.firebase_driver import get_selected_project_id
 
 
@@ -25,8 +26,7 @@ def fetch_saas_metrics_by_year_month(
             .collection('option')
             .stream()
         )
-        print([doc.to_dict() for doc in documents])
-        return [doc.to_dict() for doc in documents]
+        return [metric_codec.decode_option(doc.to_dict()) for doc in documents]
 
     except Exception as e:
         raise ValueError(f"Error while fetching data: {str(e)}")
@@ -71,7 +71,7 @@ def fetch_saas_metrics_by_year(
             option_documents = options_ref.stream()
             # サブコレクションが空でない場合にデータを追加
             for doc in option_documents:
-                doc_data = doc.to_dict()
+                doc_data = metric_codec.decode_option(doc.to_dict())
                 doc_data['month'] = month
                 print('------', doc_data)
                 all_data.append(doc_data)
@@ -0,0 +1,181 @@
+import asyncio
+from typing import Literal, Optional
+
+from google.cloud import firestore
+from pydantic import BaseModel
+
+from src.core.services import metric_codec, projection_option
+
+ScopeType = Literal['company', 'department', 'product']
+
+MAX_MONTHS = 60
+
+
+class MetricSeries(BaseModel):
+    """期間ごとの値を列として持つ時系列データ"""
+
+    periods: list[str]
+    series: dict[str, list[Optional[float]]]
+    sources: dict[str, list[int]]
+    # 値を返した事業の範囲（該当するデータがない場合は None）
+    business_scope: Optional[dict] = None
+
+
+def parse_period(period: str) -> tuple[int, int]:
+    """'YYYY-MM' 形式の文字列を (年, 月) に変換する"""
+    try:
+        year, month = (int(part) for part in period.split('-'))
+    except ValueError:
+        raise ValueError(f"Invalid period: {period}. Use YYYY-MM")
+    if not (1 <= month <= 12):
+        raise ValueError(f"Invalid month: {period}")
+    return year, month
+
+
+def iter_months(start: tuple[int, int], end: tuple[int, int]) -> list[tuple[int, int]]:
+    start_index = start[0] * 12 + start[1] - 1
+    end_index = end[0] * 12 + end[1] - 1
+    if end_index < start_index:
+        raise ValueError("end must not be before start")
+    if end_index - start_index + 1 > MAX_MONTHS:
+        raise ValueError(f"period range must be {MAX_MONTHS} months or less")
+    return [divmod(index, 12) for index in range(start_index, end_index + 1)]
+
+
+def get_metric_groups(scope_type: ScopeType) -> list[str]:
+    """事業の範囲に応じて参照する指標グループ（月次集計と同じ対応）"""
+    if scope_type == 'company':
+        return ['profit_and_loss']
+    return ['saas_customer_metrics', 'saas_revenue_metrics']
+
+
+def get_field_paths(keys: list[str], scope_type: ScopeType) -> dict[str, list[str]]:
+    """指標キーごとに、読み込むフィールドのパスを返す"""
+    field_paths = {}
+    for key in keys:
+        paths = [
+            f'{group}.{key}' for group in get_metric_groups(scope_type) if key in metric_codec.METRIC_GROUPS[group]
+        ]
+        if not paths:
+            raise ValueError(f"Unknown metric for scope '{scope_type}': {key}")
+        field_paths[key] = paths
+    return field_paths
+
+
+def fetch_canonical_records(
+    firestore_client: firestore.Client,
+    user_id: str,
+    project_id: str,
+    months: list[tuple[int, int]],
+    field_paths: list[str],
+) -> dict[str, dict]:
+    """期間ごとの代表値を1回の get_all で取得する。必要な指標のフィールドだけを読み込む"""
+    month_refs = [
+        projection_option.get_month_ref(firestore_client, user_id, project_id, year, month + 1)
+        for year, month in months
+    ]
+    snapshots = firestore_client.get_all(month_refs, field_paths=field_paths)
+    return {snapshot.reference.path: snapshot.to_dict() or {} for snapshot in snapshots if snapshot.exists}
+
+
+def get_nested(data: dict, path: str):
+    for part in path.split('.'):
+        if not isinstance(data, dict):
+            return None
+        data = data.get(part)
+    return data
+
+
+def matches_scope(business_scope: dict, scope: dict) -> bool:
+    """指定のない（None の）フィールドはどの値にも一致する"""
+    return all(value is None or business_scope.get(field) == value for field, value in scope.items())
+
+
+def select_scope(records: dict[str, dict], scope: dict) -> Optional[tuple[str, dict]]:
+    """
+    期間内の代表値から、指定した事業の範囲に一致するものを1つ選ぶ
+    複数の会社・部署・製品が一致する場合は値が混ざらないよう ValueError にする
+    """
+    matched = {}
+    for record in records.values():
+        for scope_key, entry in (record.get('canonical') or {}).items():
+            business_scope = entry.get('business_scope') or {}
+            if matches_scope(business_scope, scope):
+                matched[scope_key] = business_scope
+    if len(matched) > 1:
+        candidates = sorted(
+            '/'.join(str(business_scope.get(field)) for field in projection_option.SCOPE_FIELDS)
+            for business_scope in matched.values()
+        )
+        raise ValueError(
+            f"Multiple business scopes match; specify company_name, department_name or product_name: {candidates}"
+        )
+    return next(iter(matched.items()), None)
+
+
+async def fetch_metric_series(
+    firestore_client: firestore.Client,
+    user_id: str,
+    project_id: str,
+    keys: list[str],
+    start: str,
+    end: str,
+    scope_type: ScopeType = 'company',
+    company_name: Optional[str] = None,
+    department_name: Optional[str] = None,
+    product_name: Optional[str] = None,
+) -> MetricSeries:
+    """
+    指定した指標・期間・事業の範囲の時系列データを、期間ごとの代表値から取得する
+    会社・部署・製品をすべて指定した場合はその範囲のフィールドだけを読み込む
+    """
+    months = iter_months(parse_period(start), parse_period(end))
+    field_paths = get_field_paths(keys, scope_type)
+    select_paths = sorted({path for paths in field_paths.values() for path in paths})
+    scope = {
+        'scope_type': scope_type,
+        'company_name': company_name,
+        'department_name': department_name,
+        'product_name': product_name,
+    }
+
+    if all(value is not None for value in scope.values()):
+        scope_key = projection_option.get_scope_key(scope)
+        read_paths = [f'canonical.{scope_key}.business_scope'] + [
+            f'canonical.{scope_key}.metrics.{path}.{field}' for path in select_paths for field in ('value', 'sources')
+        ]
+    else:
+        # 範囲のキーが決まらないため、代表値をまとめて読み込んでから選ぶ
+        read_paths = ['canonical']
+
+    records = await asyncio.to_thread(
+        fetch_canonical_records,
+        firestore_client,
+        user_id,
+        project_id,
+        months,
+        read_paths,
+    )
+    selected = select_scope(records, scope)
+    scope_key, business_scope = selected if selected else (None, None)
+
+    series = {key: [] for key in keys}
+    sources = {key: [] for key in keys}
+    for year, month in months:
+        month_ref = projection_option.get_month_ref(firestore_client, user_id, project_id, year, month + 1)
+        metrics = {}
+        if scope_key is not None:
+            metrics = get_nested(records.get(month_ref.path, {}), f'canonical.{scope_key}.metrics') or {}
+        for key, paths in field_paths.items():
+            # 同じ指標が複数のグループにある場合は、報告件数の多い方を採用する
+            entries = [entry for entry in (get_nested(metrics, path) for path in paths) if entry]
+            entry = max(entries, key=lambda entry: entry['sources'], default=None)
+            series[key].append(entry['value'] if entry else None)
+            sources[key].append(entry['sources'] if entry else 0)
+
+    return MetricSeries(
+        periods=[f'{year}-{month + 1:02d}' for year, month in months],
+        series=series,
+        sources=sources,
+        business_scope=business_scope,
+    )
@@ -0,0 +1,89 @@
+from datetime import datetime
+from typing import TYPE_CHECKING, Iterable
+
+from google.cloud import firestore
+
+from src.core.services.firebase_driver import get_selected_project_id
+
+if TYPE_CHECKING:
+    import pandas as pd
+
+PLACEHOLDER_URL = "https://placehold.jp/300x200.png"
+
+METRICS = [
+    ("revenue", "売上高"),
+    ("gross_profit", "売上総利益"),
+    ("gross_profit_margin", "売上総利益率"),
+]
+VALUE_COLUMNS = [f"{key}_{kind}" for key, _ in METRICS for kind in ("forecast", "actual")]
+PERIOD_COLUMNS = ["year", "quarter"]
+
+
+def fetch_parameter_records(
+    firestore_client: firestore.Client,
+    user_id: str,
+    target_collection: str = 'sales',
+) -> list[dict]:
+    """集計に必要なフィールドのみを取得する（説明文などの長いフィールドは読み込まない）"""
+    selected_project_id = get_selected_project_id(firestore_client, user_id)
+    collection_ref = (
+        firestore_client.collection('users')
+        .document(user_id)
+        .collection('projects')
+        .document(selected_project_id)
+        .collection(target_collection)
+    )
+    return [doc.to_dict() for doc in collection_ref.select(PERIOD_COLUMNS + VALUE_COLUMNS).stream()]
+
+
+def load_summary_frame(records: Iterable[dict]) -> 'pd.DataFrame':
+    """
+    保存済みのサマリーを1度だけ DataFrame に読み込む。
+    数値は float に変換し、"None" など数値でない文字列は NaN として扱う。
+    """
+    # pandas は読み込みに時間がかかるため、起動時ではなく集計する時に import する
+    import pandas as pd
+
+    frame = pd.DataFrame.from_records(list(records), columns=PERIOD_COLUMNS + VALUE_COLUMNS)
+    for column in PERIOD_COLUMNS + VALUE_COLUMNS:
+        frame[column] = pd.to_numeric(frame[column], errors='coerce')
+    return frame
+
+
+def build_financial_data(frame: 'pd.DataFrame') -> list[dict]:
+    """
+    四半期が設定されたサマリーを指標ごとに集計し、FinancialResponse と同じ形のデータを作成する。
+    絞り込みは列単位でまとめて行い、各データポイントは辞書として1回だけ作成する。
+    """
+    import numpy as np
+
+    frame = frame[frame["quarter"].between(1, 4) & frame["year"].notna()]
+    years = frame["year"].to_numpy(dtype=np.int64)
+    quarters = frame["quarter"].to_numpy(dtype=np.int64)
+
+    this_year = datetime.now().year
+    forecast_source = f"{this_year}年 予測データ"
+    actual_source = f"{this_year}年 実績データ"
+
+    financial_data = []
+    for key, name in METRICS:
+        forecast = frame[f"{key}_forecast"].to_numpy(dtype=float)
+        actual = frame[f"{key}_actual"].to_numpy(dtype=float)
+        has_forecast = ~np.isnan(forecast)
+        has_actual = ~np.isnan(actual)
+        rows = np.flatnonzero(has_forecast | has_actual)
+        if rows.size == 0:
+            continue
+
+        values = []
+        for row in rows:
+            data = []
+            if has_forecast[row]:
+                data.append({"value": float(forecast[row]), "source": forecast_source, "url": PLACEHOLDER_URL})
+            if has_actual[row]:
+                data.append({"value": float(actual[row]), "source": actual_source, "url": PLACEHOLDER_URL})
+            values.append({"year": int(years[row]), "quarter": f"Q{quarters[row]}", "data": data})
+
+        financial_data.append({"key": key, "metric": name, "values": values, "selected": None})
+
+    return financial_data
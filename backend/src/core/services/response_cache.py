@@ -0,0 +1,92 @@
+import hashlib
+import logging
+from datetime import datetime, timedelta, timezone
+from typing import Any, Iterable, Optional
+
+from google.cloud import firestore
+from pydantic import BaseModel
+
+from src.core.services import metrics
+
+logger = logging.getLogger(__name__)
+
+
+class CachedResponse(BaseModel):
+    etag: str
+    content: Any
+
+
+def get_cache_ref(firestore_client: firestore.Client, user_id: str, project_id: str, cache_key: str):
+    """プロジェクト単位のレスポンスキャッシュのドキュメント参照を返す"""
+    return (
+        firestore_client.collection('users')
+        .document(user_id)
+        .collection('projects')
+        .document(project_id)
+        .collection('response_cache')
+        .document(cache_key)
+    )
+
+
+def compute_fingerprint(parts: Iterable[str]) -> str:
+    """キャッシュ元データの識別子（ドキュメントIDと更新時刻など）からフィンガープリントを計算する"""
+    digest = hashlib.sha256()
+    for part in parts:
+        digest.update(part.encode('utf-8'))
+        digest.update(b'\0')
+    return digest.hexdigest()
+
+
+def load_cached_response(cache_ref, fingerprint: str) -> Optional[CachedResponse]:
+    """フィンガープリントが一致し、有効期限内のキャッシュがあれば返す"""
+    cached = _load_cached_response(cache_ref, fingerprint)
+    metrics.record_cache(f'response:{cache_ref.id}', hits=int(cached is not None), misses=int(cached is None))
+    return cached
+
+
+def _load_cached_response(cache_ref, fingerprint: str) -> Optional[CachedResponse]:
+    try:
+        snapshot = cache_ref.get()
+    except Exception as e:
+        logger.warning(f"failed to read response cache {cache_ref.path}: {e}")
+        return None
+
+    if not snapshot.exists:
+        return None
+
+    data = snapshot.to_dict()
+    if data.get('fingerprint') != fingerprint:
+        return None
+    if data['expires_at'] <= datetime.now(tz=timezone.utc):
+        return None
+
+    return CachedResponse(etag=data['etag'], content=data['content'])
+
+
+def save_cached_response(cache_ref, fingerprint: str, content: Any, ttl: timedelta) -> CachedResponse:
+    """レスポンスをキャッシュに保存し、ETagを付与して返す"""
+    now = datetime.now(tz=timezone.utc)
+    etag = compute_fingerprint([fingerprint, now.isoformat()])[:32]
+
+    try:
+        cache_ref.set(
+            {
+                'fingerprint': fingerprint,
+                'etag': etag,
+                'content': content,
+                'created_at': now,
+                'expires_at': now + ttl,
+            }
+        )
+    except Exception as e:
+        logger.warning(f"failed to write response cache {cache_ref.path}: {e}")
+
+    return CachedResponse(etag=etag, content=content)
+
+
+def is_not_modified(if_none_match: Optional[str], etag: str) -> bool:
+    """If-None-Match ヘッダーが現在のETagと一致するか"""
+    if not if_none_match:
+        return False
+    candidates = [tag.strip().removeprefix('W/').strip('"') for tag in if_none_match.split(',')]
+    return etag in candidates or '*' in candidates
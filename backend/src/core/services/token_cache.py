@@ -0,0 +1,102 @@
+import hashlib
+import threading
+import time
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Optional
+
+from firebase_admin import auth
+
+from src.core.services import metrics
+from src.settings import Settings
+
+# 署名の検証に使う公開鍵は firebase_admin がアプリごとに Cache-Control に従ってキャッシュしている。
+# 同じアプリで検証し続ければ、公開鍵の取得は有効期限ごとに1回だけになる
+
+
+@dataclass
+class VerifiedToken:
+    uid: str
+    # トークンの exp（UNIX 時間）
+    expires_at: float
+    # 最後に失効（revoke）していないかを確認した時刻
+    checked_at: float
+
+
+class TokenCache:
+    """検証済みの ID トークンを、トークンのハッシュをキーに有効期限まで保持する。件数は LRU で制限する"""
+
+    def __init__(self, max_size: int):
+        self.max_size = max_size
+        self.tokens: OrderedDict[str, VerifiedToken] = OrderedDict()
+        self.lock = threading.Lock()
+
+    def get(self, key: str, now: float) -> Optional[VerifiedToken]:
+        with self.lock:
+            token = self.tokens.get(key)
+            if token is None:
+                return None
+            if token.expires_at <= now:
+                del self.tokens[key]
+                return None
+            self.tokens.move_to_end(key)
+            return token
+
+    def put(self, key: str, token: VerifiedToken) -> None:
+        with self.lock:
+            self.tokens[key] = token
+            self.tokens.move_to_end(key)
+            while len(self.tokens) > self.max_size:
+                self.tokens.popitem(last=False)
+
+    def discard(self, key: str) -> None:
+        with self.lock:
+            self.tokens.pop(key, None)
+
+    def clear(self) -> None:
+        with self.lock:
+            self.tokens.clear()
+
+
+_cache = TokenCache(Settings.auth_token_cache_size)
+
+
+def hash_token(token: str) -> str:
+    # トークンそのものはメモリに残さない
+    return hashlib.sha256(token.encode('utf-8')).hexdigest()
+
+
+def verify_id_token(token: str, app=None) -> str:
+    """
+    Firebase の ID トークンを検証して uid を返す。検証済みのトークンは exp までキャッシュする
+    AUTH_REVOCATION_CHECK_SECONDS が 0 より大きい場合は、その間隔で失効していないかを確認し直す
+    """
+    key = hash_token(token)
+    now = time.time()
+    revocation_window = Settings.auth_revocation_check_seconds
+    cached = _cache.get(key, now)
+    if cached is not None and (revocation_window <= 0 or now - cached.checked_at < revocation_window):
+        metrics.record_cache('id_token', hits=1)
+        return cached.uid
+
+    metrics.record_cache('id_token', misses=1)
+    try:
+        decoded_token = auth.verify_id_token(token, app=app, check_revoked=revocation_window > 0)
+    # Expired・Revoked は InvalidIdTokenError のサブクラスのため先に判定する
+    except auth.ExpiredIdTokenError:
+        _cache.discard(key)
+        raise ValueError("Token expired")
+    except auth.RevokedIdTokenError:
+        _cache.discard(key)
+        raise ValueError("Token revoked")
+    except auth.InvalidIdTokenError:
+        raise ValueError("Invalid token")
+    except Exception as e:
+        raise ValueError(f"Token verification failed: {str(e)}")
+
+    _cache.put(key, VerifiedToken(uid=decoded_token['uid'], expires_at=decoded_token['exp'], checked_at=now))
+    return decoded_token['uid']
+
+
+def clear_cache() -> None:
+    _cache.clear()
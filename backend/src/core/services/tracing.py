@@ -0,0 +1,202 @@
+import contextvars
+import json
+import logging
+import threading
+import time
+import uuid
+from contextlib import contextmanager
+from typing import Any, Iterator, Optional
+
+from src.core.services import metrics
+from src.settings import Settings
+
+logger = logging.getLogger(__name__)
+
+# 1M トークンあたりの料金（USD）。入力・出力の順
+MODEL_PRICES: dict[str, tuple[float, float]] = {
+    'gpt-4o': (2.50, 10.00),
+    'gpt-4o-2024-08-06': (2.50, 10.00),
+    'gpt-4o-mini': (0.15, 0.60),
+    'o1-2024-12-17': (15.00, 60.00),
+    'gpt-4-0125-preview': (10.00, 30.00),
+}
+
+# file_uuid・page など、以降に作成されるスパンに付ける属性
+_attributes: contextvars.ContextVar[dict] = contextvars.ContextVar('trace_attributes', default={})
+_current_span: contextvars.ContextVar[Optional['Span']] = contextvars.ContextVar('trace_current_span', default=None)
+_exporter = None
+_exporter_lock = threading.Lock()
+
+
+class Span:
+    """処理1回分の計測結果"""
+
+    def __init__(self, name: str, attributes: dict, parent: Optional['Span']):
+        self.name = name
+        self.trace_id = parent.trace_id if parent else uuid.uuid4().hex
+        self.span_id = uuid.uuid4().hex[:16]
+        self.parent_id = parent.span_id if parent else None
+        self.attributes = attributes
+        self.start_ns = time.time_ns()
+        self.end_ns: Optional[int] = None
+        self.status = 'ok'
+        self.error: Optional[str] = None
+
+    def set(self, **attributes: Any) -> None:
+        self.attributes.update({key: value for key, value in attributes.items() if value is not None})
+
+    def to_dict(self) -> dict:
+        return {
+            'name': self.name,
+            'trace_id': self.trace_id,
+            'span_id': self.span_id,
+            'parent_id': self.parent_id,
+            'start_ns': self.start_ns,
+            'end_ns': self.end_ns,
+            'duration_ms': (self.end_ns - self.start_ns) / 1e6,
+            'status': self.status,
+            'error': self.error,
+            'attributes': self.attributes,
+        }
+
+
+class JsonlExporter:
+    """スパンを JSON Lines 形式でファイルに追記する"""
+
+    def __init__(self, path: str):
+        self.path = path
+        self.lock = threading.Lock()
+
+    def export(self, span: Span) -> None:
+        line = json.dumps(span.to_dict(), ensure_ascii=False, default=str)
+        with self.lock, open(self.path, 'a', encoding='utf-8') as f:
+            f.write(line + '\n')
+
+
+class OtlpExporter:
+    """
+    スパンを OpenTelemetry の OTLP エクスポーターで送信する
+    送信先は OTEL_EXPORTER_OTLP_ENDPOINT などの標準の環境変数で指定する
+    """
+
+    def __init__(self):
+        from opentelemetry.exporter.otlp.proto.http.trace_exporter import OTLPSpanExporter
+        from opentelemetry.sdk.resources import Resource
+        from opentelemetry.sdk.trace import TracerProvider
+        from opentelemetry.sdk.trace.export import BatchSpanProcessor
+
+        self.provider = TracerProvider(resource=Resource.create({'service.name': 'granite-api'}))
+        self.provider.add_span_processor(BatchSpanProcessor(OTLPSpanExporter()))
+        self.tracer = self.provider.get_tracer(__name__)
+
+    def export(self, span: Span) -> None:
+        from opentelemetry.trace import Status, StatusCode
+
+        attributes = {
+            key: value for key, value in span.attributes.items() if isinstance(value, (str, int, float, bool))
+        }
+        otel_span = self.tracer.start_span(span.name, start_time=span.start_ns, attributes=attributes)
+        if span.status == 'error':
+            otel_span.set_status(Status(StatusCode.ERROR, span.error))
+        otel_span.end(end_time=span.end_ns)
+
+    def shutdown(self) -> None:
+        self.provider.shutdown()
+
+
+def get_exporter():
+    """TRACE_EXPORTER の設定に応じたエクスポーターをプロセスごとに1つ作成する。none の場合は None"""
+    global _exporter
+    if _exporter is None and Settings.trace_exporter != 'none':
+        with _exporter_lock:
+            if _exporter is None:
+                if Settings.trace_exporter == 'otlp':
+                    try:
+                        _exporter = OtlpExporter()
+                    except ImportError:
+                        logger.warning('opentelemetry-sdk is not installed; falling back to the JSONL exporter')
+                if _exporter is None:
+                    _exporter = JsonlExporter(Settings.trace_jsonl_path)
+    return _exporter
+
+
+def shutdown_exporter() -> None:
+    global _exporter
+    if isinstance(_exporter, OtlpExporter):
+        _exporter.shutdown()
+    _exporter = None
+
+
+def merge_attributes(values: dict) -> dict:
+    return {**_attributes.get(), **{key: value for key, value in values.items() if value is not None}}
+
+
+def bind(**values: Any) -> None:
+    """現在のリクエスト（タスク）でこれ以降に作成されるスパンに属性を付ける"""
+    _attributes.set(merge_attributes(values))
+
+
+@contextmanager
+def attributes(**values: Any) -> Iterator[None]:
+    """ブロック内で作成されるスパンに file_uuid・page などの属性を付ける"""
+    token = _attributes.set(merge_attributes(values))
+    try:
+        yield
+    finally:
+        _attributes.reset(token)
+
+
+@contextmanager
+def span(name: str, **values: Any) -> Iterator[Span]:
+    """
+    処理時間を計測するスパン。同期・非同期どちらの処理でも `with` で使える
+    例外が発生した場合は status を error にして再送出する
+    """
+    exporter = get_exporter()
+    current = Span(name, {**_attributes.get(), **values}, _current_span.get())
+    token = _current_span.set(current)
+    try:
+        yield current
+    except BaseException as e:
+        current.status = 'error'
+        current.error = f'{type(e).__name__}: {e}'
+        raise
+    finally:
+        _current_span.reset(token)
+        current.end_ns = time.time_ns()
+        metrics.observe_span(name, (current.end_ns - current.start_ns) / 1e9, current.status, current.attributes)
+        if exporter is not None:
+            try:
+                exporter.export(current)
+            except Exception as e:
+                logger.warning(f'failed to export span {name}: {e}')
+
+
+def estimate_cost(model: str, prompt_tokens: int, completion_tokens: int) -> Optional[float]:
+    prices = MODEL_PRICES.get(model)
+    if prices is None:
+        return None
+    return (prompt_tokens * prices[0] + completion_tokens * prices[1]) / 1_000_000
+
+
+def record_usage(response: Any) -> None:
+    """OpenAI のレスポンスの usage（トークン数）と推定コストを現在のスパンに記録する"""
+    current = _current_span.get()
+    usage = getattr(response, 'usage', None)
+    if current is None or usage is None:
+        return
+
+    requested_model = current.attributes.get('model', '')
+    response_model = getattr(response, 'model', None) or requested_model
+    prompt_tokens = getattr(usage, 'prompt_tokens', 0) or 0
+    completion_tokens = getattr(usage, 'completion_tokens', 0) or 0
+    cost = estimate_cost(requested_model, prompt_tokens, completion_tokens)
+    if cost is None:
+        cost = estimate_cost(response_model, prompt_tokens, completion_tokens)
+    current.set(
+        response_model=response_model,
+        prompt_tokens=prompt_tokens,
+        completion_tokens=completion_tokens,
+        total_tokens=getattr(usage, 'total_tokens', None) or prompt_tokens + completion_tokens,
+        cost_usd=cost,
+    )
@@ -7,6 +7,7 @@ from pydantic import BaseModel, Field
 from pydantic_core import ValidationError
 
 import src.core.services.firebase_driver as firebase_driver
+from src.core.services import tracing
 
 logger = logging.getLogger(__name__)
 
@@ -33,29 +34,33 @@ async def get_revenue_report(openai_client, image_base64, max_retries=3):
     retry_count = 0
     while retry_count < max_retries:
         try:
-            response = openai_client.beta.chat.completions.parse(
-                model='gpt-4o-2024-08-06',
-                messages=[
-                    {
-                        "role": "system",
-                        "content": "接頭語に気をつけながら、かならず単位を円で計算しなさい。「百万円」や「億円」をすべて「円」に統一する",
-                    },
-                    {
-                        "role": "user",
-                        "content": [
-                            {
-                                "type": "text",
-                                "text": "次のデータに含まれる情報を、集計期間に気をつけながら段階的に整理します。",
-                            },
-                            {
-                                "type": "image_url",
-                                "image_url": {"url": f"data:image/jpeg;base64,{image_base64}"},
-                            },
-                        ],
-                    },
-                ],
-                response_format=firebase_driver.BusinessSummary,
-            )
+            with tracing.span('llm.revenue_report', model='gpt-4o-2024-08-06', attempt=retry_count + 1):
+                # 同期クライアントの呼び出しでイベントループを止めないようにスレッドで実行する
+                response = await asyncio.to_thread(
+                    openai_client.beta.chat.completions.parse,
+                    model='gpt-4o-2024-08-06',
+                    messages=[
+                        {
+                            "role": "system",
+                            "content": "接頭語に気をつけながら、かならず単位を円で計算しなさい。「百万円」や「億円」をすべて「円」に統一する",
+                        },
+                        {
+                            "role": "user",
+                            "content": [
+                                {
+                                    "type": "text",
+                                    "text": "次のデータに含まれる情報を、集計期間に気をつけながら段階的に整理します。",
+                                },
+                                {
+                                    "type": "image_url",
+                                    "image_url": {"url": f"data:image/jpeg;base64,{image_base64}"},
+                                },
+                            ],
+                        },
+                    ],
+                    response_format=firebase_driver.BusinessSummary,
+                )
+                tracing.record_usage(response)
             parsed_response = response.choices[0].message.parsed
             return parsed_response
 
@@ -83,29 +88,33 @@ async def get_analyst_report(openai_client, image_base64, max_retries=3):
     retry_count = 0
     while retry_count < max_retries:
         try:
-            response = openai_client.beta.chat.completions.parse(
-                model='gpt-4o-2024-08-06',
-                messages=[
-                    {
-                        "role": "system",
-                        "content": "- 日本語で回答せよ。- 回答の際には「です、ます」ではなく「だ、である」を使用せよ。- 日本の資料の「▲」はマイナスを意味する。 - ロジカルに、そして丁寧に詳しく説明すること。",
-                    },
-                    {
-                        "role": "user",
-                        "content": [
-                            {
-                                "type": "text",
-                                "text": prompt,
-                            },
-                            {
-                                "type": "image_url",
-                                "image_url": {"url": f"data:image/jpeg;base64,{image_base64}"},
-                            },
-                        ],
-                    },
-                ],
-                response_format=firebase_driver.AnalystReport,
-            )
+            with tracing.span('llm.analyst_report', model='gpt-4o-2024-08-06', attempt=retry_count + 1):
+                # 同期クライアントの呼び出しでイベントループを止めないようにスレッドで実行する
+                response = await asyncio.to_thread(
+                    openai_client.beta.chat.completions.parse,
+                    model='gpt-4o-2024-08-06',
+                    messages=[
+                        {
+                            "role": "system",
+                            "content": "- 日本語で回答せよ。- 回答の際には「です、ます」ではなく「だ、である」を使用せよ。- 日本の資料の「▲」はマイナスを意味する。 - ロジカルに、そして丁寧に詳しく説明すること。",
+                        },
+                        {
+                            "role": "user",
+                            "content": [
+                                {
+                                    "type": "text",
+                                    "text": prompt,
+                                },
+                                {
+                                    "type": "image_url",
+                                    "image_url": {"url": f"data:image/jpeg;base64,{image_base64}"},
+                                },
+                            ],
+                        },
+                    ],
+                    response_format=firebase_driver.AnalystReport,
+                )
+                tracing.record_usage(response)
             parsed_response = response.choices[0].message.parsed
             return parsed_response
 
@@ -131,29 +140,33 @@ async def get_transcription(openai_client, image_base64, max_retries=3):
     retry_count = 0
     while retry_count < max_retries:
         try:
-            response = openai_client.beta.chat.completions.parse(
-                model='gpt-4o-2024-08-06',
-                messages=[
-                    {
-                        "role": "system",
-                        "content": "- 日本語で回答せよ。- 回答の際には「です、ます」ではなく「だ、である」を使用せよ。",
-                    },
-                    {
-                        "role": "user",
-                        "content": [
-                            {
-                                "type": "text",
-                                "text": prompt,
-                            },
-                            {
-                                "type": "image_url",
-                                "image_url": {"url": f"data:image/jpeg;base64,{image_base64}"},
-                            },
-                        ],
-                    },
-                ],
-                response_format=firebase_driver.TranscriptionReport,
-            )
+            with tracing.span('llm.transcription', model='gpt-4o-2024-08-06', attempt=retry_count + 1):
+                # 同期クライアントの呼び出しでイベントループを止めないようにスレッドで実行する
+                response = await asyncio.to_thread(
+                    openai_client.beta.chat.completions.parse,
+                    model='gpt-4o-2024-08-06',
+                    messages=[
+                        {
+                            "role": "system",
+                            "content": "- 日本語で回答せよ。- 回答の際には「です、ます」ではなく「だ、である」を使用せよ。",
+                        },
+                        {
+                            "role": "user",
+                            "content": [
+                                {
+                                    "type": "text",
+                                    "text": prompt,
+                                },
+                                {
+                                    "type": "image_url",
+                                    "image_url": {"url": f"data:image/jpeg;base64,{image_base64}"},
+                                },
+                            ],
+                        },
+                    ],
+                    response_format=firebase_driver.TranscriptionReport,
+                )
+                tracing.record_usage(response)
             parsed_response = response.choices[0].message.parsed
             return parsed_response
 
@@ -1,33 +1,47 @@
 import io
 import logging
 from datetime import datetime, timedelta
+from typing import TYPE_CHECKING
 
-import fitz
 from fastapi import HTTPException
 from firebase_admin import exceptions
 from google.cloud import storage
-from PIL import Image
+
+if TYPE_CHECKING:
+    import fitz
 
 logger = logging.getLogger(__name__)
 
 
-async def read_pdf_file(contents: bytes) -> fitz.Document:
+def get_page_image_path(user_id: str, project_id: str, file_uuid: str, page_number: int) -> str:
+    """
+    ページ画像のStorage上のパスを返す
+    """
+    return f"{user_id}/projects/{project_id}/image/{file_uuid}/{page_number}"
+
+
+async def read_pdf_file(contents: bytes) -> 'fitz.Document':
     """
     FastAPIのUploadFileオブジェクトからPDFドキュメントを作成する関数
     :param file: FastAPIのUploadFileオブジェクト
     :return: PyMuPDFのDocumentオブジェクト
     """
+    # fitz（PyMuPDF）は読み込みに時間がかかるため、起動時ではなく使う時に import する
+    import fitz
+
     pdf_document = fitz.open(stream=contents, filetype="pdf")
     return pdf_document
 
 
-def convert_pdf_page_to_image(pdf_document: fitz.Document, page_number: int) -> io.BytesIO:
+def convert_pdf_page_to_image(pdf_document: 'fitz.Document', page_number: int) -> io.BytesIO:
     """
     PyMuPDFのDocumentオブジェクトから特定のページを画像化する関数
     :param pdf_document: PyMuPDFのDocumentオブジェクト
     :param page_number: ページ番号
     :return: 画像データをバイナリストリームとして返す
     """
+    from PIL import Image
+
     if page_number >= len(pdf_document):
         raise HTTPException(status_code=400, detail="Invalid page number")
 
@@ -56,7 +70,7 @@ async def upload_image_to_firebase(
     :param page_number: ページ番号
     :param storage_client: Firebase StorageのBucketクライアント
     """
-    blob = storage_client.blob(f"{user_id}/projects/{project_id}/image/{file_uuid}/{page_number}")
+    blob = storage_client.blob(get_page_image_path(user_id, project_id, file_uuid, page_number))
 
     try:
         blob.upload_from_file(image_bytes, content_type='image/png')
@@ -93,7 +107,7 @@ async def generate_signed_url(
     :param expiration_minutes: URLの有効期限（分単位）
     :return: 署名付きURL
     """
-    blob_path = f"{user_id}/projects/{project_id}/image/{file_uuid}/{page_number}"
+    blob_path = get_page_image_path(user_id, project_id, file_uuid, page_number)
     blob = storage_client.blob(blob_path)
 
     expiration_time = datetime.utcnow() + timedelta(minutes=expiration_minutes)
@@ -0,0 +1,145 @@
+import asyncio
+import io
+import json
+import logging
+from typing import TYPE_CHECKING, Optional
+
+from google.cloud import storage
+
+if TYPE_CHECKING:
+    import pandas as pd
+
+logger = logging.getLogger(__name__)
+
+PREVIEW_ROWS = 100
+
+
+def get_table_blob_path(user_id: str, project_id: str, file_uuid: str, file_name: str) -> str:
+    """アップロードされた表のパス（署名付きURLでアップロードする先と同じ）"""
+    return f"{user_id}/projects/{project_id}/documents/{file_uuid}_{file_name}"
+
+
+def get_legacy_table_blob_path(user_id: str, file_uuid: str, file_name: str) -> str:
+    """プロジェクトごとに分ける前の表のパス"""
+    return f"{user_id}/documents/{file_uuid}_{file_name}"
+
+
+def get_preview_blob_path(source_blob_path: str) -> str:
+    """先頭 PREVIEW_ROWS 行のプレビューJSONのパス"""
+    return f"{source_blob_path}.preview.json"
+
+
+def get_columnar_blob_path(source_blob_path: str) -> str:
+    """パース済みの表全体を列指向 (orient='split') で保存したJSONのパス"""
+    return f"{source_blob_path}.columns.json"
+
+
+def parse_table(file_bytes: bytes, file_extension: str) -> Optional['pd.DataFrame']:
+    # pandas は読み込みに時間がかかるため、起動時ではなく表を読む時に import する
+    import pandas as pd
+
+    file_io = io.BytesIO(file_bytes)
+    if file_extension == 'xlsx':
+        return pd.read_excel(file_io, engine="openpyxl")
+    elif file_extension == 'csv':
+        return pd.read_csv(file_io)
+    return None
+
+
+def build_preview_rows(df: 'pd.DataFrame', rows: int = PREVIEW_ROWS) -> list[dict]:
+    """表示用のプレビュー行を作成する。置換処理は表示する行だけに行う"""
+    output = df.head(rows)
+    output = output.replace('^Unnamed.*', '', regex=True)
+    output = output.fillna('')
+    output = output.astype(str)
+    return output.to_dict(orient="records")
+
+
+def materialize_table_preview(
+    storage_client: storage.Client,
+    source_blob: storage.Blob,
+    file_bytes: Optional[bytes] = None,
+) -> Optional[list[dict]]:
+    """
+    元ファイルを1度だけパースし、プレビューJSONと列指向のコピーを元ファイルの隣に保存する。
+    どちらにも元ファイルの generation を記録し、元ファイルが更新された場合に再生成できるようにする。
+    ダウンロード済みの内容があれば file_bytes に渡す。
+    """
+    file_extension = source_blob.name.split('.')[-1].lower()
+    if file_bytes is None:
+        file_bytes = source_blob.download_as_bytes()
+    df = parse_table(file_bytes, file_extension)
+    if df is None:
+        return None
+
+    rows = build_preview_rows(df)
+    metadata = {'source_generation': str(source_blob.generation)}
+
+    preview_blob = storage_client.blob(get_preview_blob_path(source_blob.name))
+    preview_blob.metadata = metadata
+    preview_blob.upload_from_string(json.dumps(rows, ensure_ascii=False), content_type='application/json')
+
+    columnar_blob = storage_client.blob(get_columnar_blob_path(source_blob.name))
+    columnar_blob.metadata = metadata
+    columnar_blob.upload_from_string(
+        df.to_json(orient='split', date_format='iso', force_ascii=False),
+        content_type='application/json',
+    )
+
+    logger.info(f"table preview materialized: {source_blob.name}")
+    return rows
+
+
+def load_table_preview(
+    storage_client: storage.Client,
+    source_blob: storage.Blob,
+    preview_blob: Optional[storage.Blob],
+) -> Optional[list[dict]]:
+    """プレビューが元ファイルと同じ generation から作られていればそれを返し、古ければ再生成する"""
+    if preview_blob is not None and (preview_blob.metadata or {}).get('source_generation') == str(
+        source_blob.generation
+    ):
+        return json.loads(preview_blob.download_as_bytes())
+
+    return materialize_table_preview(storage_client, source_blob)
+
+
+def load_file_preview(
+    storage_client: storage.Client,
+    user_id: str,
+    project_id: str,
+    file_uuid: str,
+    file_name: str,
+) -> Optional[list[dict]]:
+    """
+    1ファイル分のプレビューを返す。元ファイルとプレビューはパスを指定してメタデータだけを取得する
+    （ユーザーの全ファイルを一覧しない）
+    """
+    for source_path in (
+        get_table_blob_path(user_id, project_id, file_uuid, file_name),
+        get_legacy_table_blob_path(user_id, file_uuid, file_name),
+    ):
+        source_blob = storage_client.get_blob(source_path)
+        if source_blob is not None:
+            preview_blob = storage_client.get_blob(get_preview_blob_path(source_path))
+            return load_table_preview(storage_client, source_blob, preview_blob)
+    return None
+
+
+async def load_table_previews(
+    storage_client: storage.Client,
+    user_id: str,
+    project_id: str,
+    files: list[tuple[str, str]],
+) -> dict[str, list[dict]]:
+    """
+    プロジェクトの (file_uuid, file_name) の一覧に対するプレビューを並行して取得する
+    ファイルがストレージに存在しない、または表形式でない場合は結果に含めない
+    """
+    results = await asyncio.gather(
+        *(
+            asyncio.to_thread(load_file_preview, storage_client, user_id, project_id, file_uuid, file_name)
+            for file_uuid, file_name in files
+        )
+    )
+    return {file_uuid: rows for (file_uuid, _), rows in zip(files, results) if rows is not None}
@@ -1,28 +1,244 @@
 import csv
 import io
+from itertools import islice
+from os import PathLike
+from typing import Any, Iterable, Iterator, Optional
 
-from openpyxl import load_workbook
+from pydantic import BaseModel
 
+CSV_ENCODING = "utf-8"
+MAX_COLUMN_EXAMPLES = 3
 
-def convert_xlsx_row_to_text(contents) -> str:
-    file_stream = io.BytesIO(contents)
-    workbook = load_workbook(file_stream)
-    sheet = workbook.active
 
-    sheet_content = []
-    for row in sheet.iter_rows(values_only=True):
-        sheet_content.append("\t".join([str(cell) for cell in row if cell is not None]))
-    text_content = "\n".join(sheet_content)
-    return text_content
+def iter_xlsx_rows(source: bytes | str | PathLike, sheet_name: Optional[str] = None) -> Iterator[tuple]:
+    """
+    xlsxを読み取り専用モードで開き、行を1行ずつ返す。
+    ワークブック全体をメモリに展開しないため、大きなシートでもメモリ使用量は一定に近い。
+    """
+    # openpyxl は読み込みに時間がかかるため、起動時ではなく使う時に import する
+    from openpyxl import load_workbook
 
+    file_stream = io.BytesIO(source) if isinstance(source, bytes) else source
+    workbook = load_workbook(file_stream, read_only=True)
+    try:
+        sheet = workbook[sheet_name] if sheet_name else workbook.active
+        yield from sheet.iter_rows(values_only=True)
+    finally:
+        workbook.close()
 
-def analyze_csv_content(contents: bytes) -> str:
-    file_stream = io.StringIO(contents.decode("utf-8"))
-    reader = csv.reader(file_stream)
 
-    csv_content = []
-    for row in reader:
-        csv_content.append("\t".join(row))
-    text_content = "\n".join(csv_content)
+def list_sheet_names(source: bytes | str | PathLike) -> list[str]:
+    """シート名の一覧を取得する（読み取り専用モードのためシートの中身は読み込まない）"""
+    from openpyxl import load_workbook
 
-    return text_content
+    file_stream = io.BytesIO(source) if isinstance(source, bytes) else source
+    workbook = load_workbook(file_stream, read_only=True)
+    try:
+        return list(workbook.sheetnames)
+    finally:
+        workbook.close()
+
+
+def iter_csv_rows(contents: bytes, encoding: str = CSV_ENCODING) -> Iterator[list[str]]:
+    """
+    csvのバイト列を逐次デコードしながら1行ずつ返す。
+    全体を一度に decode した文字列を作らない。
+    """
+    text_stream = io.TextIOWrapper(io.BytesIO(contents), encoding=encoding, newline="")
+    try:
+        yield from csv.reader(text_stream)
+    finally:
+        text_stream.detach()
+
+
+def rows_to_text(
+    rows: Iterable[Iterable],
+    max_rows: Optional[int] = None,
+    max_chars: Optional[int] = None,
+) -> str:
+    """
+    行をタブ区切りのテキストに変換する。
+    max_rows / max_chars に達した時点で読み込みを打ち切る（LLMのプロンプト用の上限）。
+    """
+    if max_rows is not None:
+        rows = islice(rows, max_rows)
+
+    lines = []
+    total_chars = 0
+    for row in rows:
+        line = "\t".join([str(cell) for cell in row if cell is not None])
+        if max_chars is not None and total_chars + len(line) > max_chars:
+            remaining = max_chars - total_chars
+            if remaining > 0:
+                lines.append(line[:remaining])
+            break
+        lines.append(line)
+        total_chars += len(line) + 1
+
+    return "\n".join(lines)
+
+
+def convert_xlsx_row_to_text(
+    contents,
+    max_rows: Optional[int] = None,
+    max_chars: Optional[int] = None,
+) -> str:
+    return rows_to_text(iter_xlsx_rows(contents), max_rows=max_rows, max_chars=max_chars)
+
+
+def analyze_csv_content(
+    contents: bytes,
+    max_rows: Optional[int] = None,
+    max_chars: Optional[int] = None,
+) -> str:
+    return rows_to_text(iter_csv_rows(contents), max_rows=max_rows, max_chars=max_chars)
+
+
+class ColumnStats(BaseModel):
+    """列ごとの統計（サンプルに含まれない行も含めて集計する）"""
+
+    index: int
+    name: str = ''
+    non_empty: int = 0
+    numeric: int = 0
+    minimum: Optional[float] = None
+    maximum: Optional[float] = None
+    total: float = 0.0
+    examples: list[str] = []
+
+    def update(self, value: Any) -> None:
+        if value is None or value == '':
+            return
+        self.non_empty += 1
+
+        number = to_number(value)
+        if number is None:
+            text = str(value)
+            if len(self.examples) < MAX_COLUMN_EXAMPLES and text not in self.examples:
+                self.examples.append(text)
+            return
+
+        self.numeric += 1
+        self.total += number
+        self.minimum = number if self.minimum is None else min(self.minimum, number)
+        self.maximum = number if self.maximum is None else max(self.maximum, number)
+
+    def describe(self) -> str:
+        name = self.name or f'列{self.index + 1}'
+        if self.numeric:
+            mean = self.total / self.numeric
+            return f"{name}: 値あり{self.non_empty}件, 数値{self.numeric}件, 最小{self.minimum:g}, 最大{self.maximum:g}, 平均{mean:g}"
+        return f"{name}: 値あり{self.non_empty}件, 例: {', '.join(self.examples)}"
+
+
+class TableSample(BaseModel):
+    """プロンプト用に縮約した表"""
+
+    header: list[list[str]]
+    rows: list[list[str]]
+    total_rows: int
+    columns: list[ColumnStats]
+
+
+def to_number(value: Any) -> Optional[float]:
+    if isinstance(value, bool):
+        return None
+    if isinstance(value, (int, float)):
+        return float(value)
+    try:
+        return float(str(value).replace(',', ''))
+    except ValueError:
+        return None
+
+
+def format_row(row: Iterable) -> list[str]:
+    """セルを文字列に変換し、末尾の空セルを取り除く"""
+    cells = ['' if cell is None else str(cell) for cell in row]
+    while cells and cells[-1] == '':
+        cells.pop()
+    return cells
+
+
+def sample_table(rows: Iterable[Iterable], header_rows: int = 1, max_sample_rows: int = 200) -> TableSample:
+    """
+    行を1度だけ走査し、ヘッダー行・本文から等間隔に抜き出したサンプル行・列ごとの統計を作成する。
+    サンプルが上限を超えるたびに間隔を2倍にして間引くため、行数に関係なくメモリ使用量は一定。
+    """
+    header: list[list[str]] = []
+    sampled: list[tuple[int, list[str]]] = []
+    columns: list[ColumnStats] = []
+    stride = 1
+    body_rows = 0
+
+    for row in rows:
+        row = list(row)
+        cells = format_row(row)
+        if not cells:
+            continue
+        if len(header) < header_rows:
+            header.append(cells)
+            continue
+
+        for index, value in enumerate(row):
+            if index >= len(columns):
+                columns.append(ColumnStats(index=index))
+            columns[index].update(value)
+
+        if body_rows % stride == 0:
+            sampled.append((body_rows, cells))
+            if len(sampled) > max_sample_rows:
+                stride *= 2
+                sampled = [(position, sample) for position, sample in sampled if position % stride == 0]
+        body_rows += 1
+
+    if header:
+        for column in columns:
+            if column.index < len(header[-1]):
+                column.name = header[-1][column.index]
+
+    return TableSample(
+        header=header,
+        rows=[cells for _, cells in sampled],
+        total_rows=body_rows,
+        columns=[column for column in columns if column.non_empty],
+    )
+
+
+def estimate_tokens(text: str) -> int:
+    """トークン数の概算。ASCIIは4文字で1トークン、それ以外（日本語など）は1文字1トークンとみなす"""
+    ascii_chars = sum(1 for char in text if char.isascii())
+    return ascii_chars // 4 + (len(text) - ascii_chars)
+
+
+def render_table_sample(sample: TableSample, token_budget: int) -> str:
+    """サンプルをテキスト化する。トークン数の上限を超える場合はサンプル行を等間隔に間引く"""
+
+    def render(rows: list[list[str]]) -> str:
+        lines = ["[ヘッダー]"]
+        lines += ["\t".join(cells) for cells in sample.header]
+        lines.append(f"[サンプル行] {len(rows)}/{sample.total_rows}行")
+        lines += ["\t".join(cells) for cells in rows]
+        lines.append("[列の統計]")
+        lines += [column.describe() for column in sample.columns]
+        return "\n".join(lines)
+
+    rows = sample.rows
+    text = render(rows)
+    while rows and estimate_tokens(text) > token_budget:
+        rows = rows[::2] if len(rows) > 1 else []
+        text = render(rows)
+
+    # 列数が非常に多い場合など、サンプル行がなくても上限を超える場合は末尾を切り詰める
+    while text and estimate_tokens(text) > token_budget:
+        text = text[: len(text) * token_budget // estimate_tokens(text)]
+    return text
+
+
+def sample_table_text(
+    rows: Iterable[Iterable],
+    token_budget: int,
+    header_rows: int = 1,
+    max_sample_rows: int = 200,
+) -> str:
+    sample = sample_table(rows, header_rows=header_rows, max_sample_rows=max_sample_rows)
+    return render_table_sample(sample, token_budget)
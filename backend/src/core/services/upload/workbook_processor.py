@@ -0,0 +1,155 @@
+import asyncio
+import hashlib
+import logging
+from concurrent.futures import ProcessPoolExecutor
+from typing import Iterable, Iterator, Optional
+
+import openai
+from google.cloud import firestore
+from pydantic import BaseModel
+
+import src.core.services.firebase_driver as firebase_driver
+from src.core.services import metrics
+from src.core.services import openai_client as openai_service
+from src.core.services.firebase_driver import SheetSummary
+from src.core.services.openai_client import TableMetadata
+from src.core.services.upload import table_processor
+from src.settings import Settings
+
+logger = logging.getLogger(__name__)
+
+_extract_executor: ProcessPoolExecutor | None = None
+
+
+class SheetContent(BaseModel):
+    """1シート分の抽出結果"""
+
+    sheet_index: int
+    sheet_name: str
+    text: str
+    row_count: int
+    content_hash: str
+
+
+def get_extract_executor() -> ProcessPoolExecutor:
+    """シート抽出用のプロセスプールをプロセスごとに1つだけ生成して返す"""
+    global _extract_executor
+    if _extract_executor is None:
+        _extract_executor = ProcessPoolExecutor(max_workers=Settings.sheet_extract_workers)
+    return _extract_executor
+
+
+def shutdown_extract_executor() -> None:
+    """プロセスプールを停止する（アプリケーション終了時に呼ぶ）"""
+    global _extract_executor
+    if _extract_executor is not None:
+        _extract_executor.shutdown(wait=False, cancel_futures=True)
+        _extract_executor = None
+
+
+def extract_sheet(contents: bytes, sheet_index: int, sheet_name: str, token_budget: int) -> SheetContent:
+    """
+    ワーカープロセス内で1シートを読み込み、プロンプト用にサンプリングしたテキストを作成する。
+    ハッシュはサンプリングに関係なくシート全体の行から計算し、内容の変更を検知できるようにする。
+    """
+    digest = hashlib.sha256()
+    row_count = 0
+
+    def hashed(rows: Iterable[tuple]) -> Iterator[tuple]:
+        nonlocal row_count
+        for row in rows:
+            digest.update(repr(row).encode('utf-8'))
+            row_count += 1
+            yield row
+
+    rows = hashed(table_processor.iter_xlsx_rows(contents, sheet_name))
+    text = table_processor.sample_table_text(rows, token_budget=token_budget)
+
+    return SheetContent(
+        sheet_index=sheet_index,
+        sheet_name=sheet_name,
+        text=text,
+        row_count=row_count,
+        content_hash=digest.hexdigest(),
+    )
+
+
+async def extract_sheets(contents: bytes, token_budget: int = Settings.table_prompt_token_budget) -> list[SheetContent]:
+    """全シートをプロセスプールで並列に抽出する。空のシートは除外する"""
+    sheet_names = await asyncio.to_thread(table_processor.list_sheet_names, contents)
+    loop = asyncio.get_running_loop()
+    executor = get_extract_executor()
+
+    sheets = await asyncio.gather(
+        *(
+            loop.run_in_executor(executor, extract_sheet, contents, sheet_index, sheet_name, token_budget)
+            for sheet_index, sheet_name in enumerate(sheet_names)
+        )
+    )
+    return [sheet for sheet in sheets if sheet.row_count > 0]
+
+
+async def summarize_sheets(
+    firestore_client: firestore.Client,
+    openai_client: openai.ChatCompletion,
+    user_id: str,
+    project_id: str,
+    file_uuid: str,
+    sheets: list[SheetContent],
+    concurrency: int = Settings.sheet_summary_concurrency,
+) -> list[SheetSummary]:
+    """
+    シートごとの要約を同時実行数を制限しながら作成し、まとめて保存する。
+    同じ内容のシートが過去に要約されていれば、キャッシュを使いLLMを呼ばない。
+    """
+    cached = await asyncio.to_thread(
+        firebase_driver.fetch_cached_sheet_summaries,
+        firestore_client,
+        user_id,
+        project_id,
+        [sheet.content_hash for sheet in sheets],
+    )
+    hits = sum(1 for sheet in sheets if sheet.content_hash in cached)
+    metrics.record_cache('sheet_summary', hits=hits, misses=len(sheets) - hits)
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async def summarize(sheet: SheetContent) -> Optional[SheetSummary]:
+        if sheet.content_hash in cached:
+            metadata = TableMetadata(
+                title=cached[sheet.content_hash]['title'],
+                summary=cached[sheet.content_hash]['summary'],
+                category=cached[sheet.content_hash].get('category', ''),
+            )
+        else:
+            async with semaphore:
+                try:
+                    metadata = await asyncio.to_thread(
+                        openai_service.generate_table_metadata, sheet.text, openai_client
+                    )
+                except Exception as e:
+                    logger.error(f"[Sheet {sheet.sheet_name}] summarization failed: {e}", exc_info=True)
+                    return None
+
+        return SheetSummary(
+            sheet_index=sheet.sheet_index,
+            sheet_name=sheet.sheet_name,
+            title=metadata.title,
+            summary=metadata.summary,
+            category=metadata.category,
+            row_count=sheet.row_count,
+            content_hash=sheet.content_hash,
+        )
+
+    results = await asyncio.gather(*(summarize(sheet) for sheet in sheets))
+    summaries = [result for result in results if result is not None]
+    logger.info(f"[{file_uuid}] sheet summaries: {len(summaries)}/{len(sheets)} (cached {len(cached)})")
+
+    await asyncio.to_thread(
+        firebase_driver.save_sheet_summaries,
+        firestore_client,
+        user_id,
+        project_id,
+        file_uuid,
+        summaries,
+    )
+    return summaries
@@ -1,5 +1,7 @@
 import openai
 
+from src.core.services import tracing
+
 ORDER = """
 ## **1. 分析の基本構造**
 **IR資料を分析する際の一貫した流れ**
@@ -99,14 +101,16 @@ def create_response(
     context = order
     sentence = f'次のドキュメントがIRを文字起こししたものである。:{fact_sentence}'
 
-    response = openai_client.chat.completions.create(
-        model='o1-2024-12-17',
-        messages=[
-            {"role": "system", "content": system_prompt},
-            {"role": "system", "content": context},
-            {"role": "user", "content": sentence},
-        ],
-    )
+    with tracing.span('llm.analyst_view', model='o1-2024-12-17'):
+        response = openai_client.chat.completions.create(
+            model='o1-2024-12-17',
+            messages=[
+                {"role": "system", "content": system_prompt},
+                {"role": "system", "content": context},
+                {"role": "user", "content": sentence},
+            ],
+        )
+        tracing.record_usage(response)
     parsed_response = response.choices[0].message.content
 
     return parsed_response
@@ -119,13 +123,15 @@ def create_rag_response(
 ) -> str:
 
     system_prompt = 'ユーザーからの指示に従って、丁寧に文章で回答してください。'
-    response = openai_client.chat.completions.create(
-        model='gpt-4o',
-        messages=[
-            {"role": "system", "content": system_prompt},
-            {"role": "system", "content": context},
-            {"role": "user", "content": prompt},
-        ],
-    )
+    with tracing.span('llm.rag_response', model='gpt-4o'):
+        response = openai_client.chat.completions.create(
+            model='gpt-4o',
+            messages=[
+                {"role": "system", "content": system_prompt},
+                {"role": "system", "content": context},
+                {"role": "user", "content": prompt},
+            ],
+        )
+        tracing.record_usage(response)
     parsed_response = response.choices[0].message.content
     return parsed_response
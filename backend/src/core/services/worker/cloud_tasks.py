@@ -1,17 +1,22 @@
 import json
 
-from google.cloud import tasks_v2
 
-
-def create_task_payload(worker_url, payload):
+def create_task_payload(worker_url, payload, task_name=None):
     """
     Cloud Tasks用のタスクペイロードを作成
+    task_name を指定すると、同じ名前のタスクは重複して登録されない
     """
-    return {
+    from google.cloud import tasks_v2
+
+    body = payload if isinstance(payload, dict) else payload.model_dump()
+    task = {
         "http_request": {
             "http_method": tasks_v2.HttpMethod.POST,
             "url": worker_url,
             "headers": {"Content-Type": "application/json"},
-            "body": json.dumps(payload.model_dump()).encode('utf-8'),
+            "body": json.dumps(body).encode('utf-8'),
         }
     }
+    if task_name:
+        task["name"] = task_name
+    return task
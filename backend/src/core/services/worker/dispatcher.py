@@ -0,0 +1,199 @@
+import asyncio
+import json
+import logging
+from abc import ABC, abstractmethod
+from typing import TYPE_CHECKING, Optional
+
+from google.api_core import exceptions as google_exceptions
+from pydantic import BaseModel
+
+from src.core.services import clients
+from src.core.services.worker import cloud_tasks
+from src.settings import Settings
+
+if TYPE_CHECKING:
+    from google.cloud import tasks_v2
+
+logger = logging.getLogger(__name__)
+
+_dispatcher: Optional['TaskDispatcher'] = None
+
+
+class TaskRequest(BaseModel):
+    """キューに登録する1件のタスク"""
+
+    path: str
+    payload: dict
+    # 同じ task_id のタスクは1度だけ登録される（Cloud Tasks のタスク名として使う。ledger.get_task_id で作る）
+    task_id: Optional[str] = None
+
+    @classmethod
+    def from_model(cls, path: str, payload: BaseModel, task_id: Optional[str] = None) -> 'TaskRequest':
+        return cls(path=path, payload=payload.model_dump(), task_id=task_id)
+
+    @property
+    def key(self) -> str:
+        return self.task_id or f'{self.path}:{json.dumps(self.payload, sort_keys=True)}'
+
+
+class EnqueueResult(BaseModel):
+    created: int = 0
+    coalesced: int = 0
+    failed: int = 0
+
+
+def coalesce(requests: list[TaskRequest]) -> list[TaskRequest]:
+    """同じタスクが複数含まれる場合は最初の1件にまとめる"""
+    unique = {}
+    for request in requests:
+        unique.setdefault(request.key, request)
+    return list(unique.values())
+
+
+class TaskDispatcher(ABC):
+    @abstractmethod
+    async def enqueue(self, requests: list[TaskRequest]) -> EnqueueResult:
+        """
+        タスクをまとめてキューに登録する
+        """
+        pass
+
+    async def close(self) -> None:
+        pass
+
+
+class CloudTasksDispatcher(TaskDispatcher):
+    """Cloud Tasks にタスクを並列に登録する"""
+
+    def __init__(self, client: 'tasks_v2.CloudTasksClient', queue_path: str, concurrency: int):
+        self.client = client
+        self.queue_path = queue_path
+        self.concurrency = concurrency
+
+    def create_task(self, request: TaskRequest) -> bool:
+        task_name = f'{self.queue_path}/tasks/{request.task_id}' if request.task_id else None
+        task = cloud_tasks.create_task_payload(
+            f'{Settings.google_cloud.api_base_url}{request.path}', request.payload, task_name=task_name
+        )
+        try:
+            with clients.track('cloud_tasks'):
+                self.client.create_task(parent=self.queue_path, task=task)
+        except google_exceptions.AlreadyExists:
+            # 同じ名前のタスクが登録済み（再配信された親タスクからの重複登録）
+            return False
+        return True
+
+    async def enqueue(self, requests: list[TaskRequest]) -> EnqueueResult:
+        unique = coalesce(requests)
+        semaphore = asyncio.Semaphore(self.concurrency)
+
+        async def create(request: TaskRequest) -> bool:
+            async with semaphore:
+                return await asyncio.to_thread(self.create_task, request)
+
+        results = await asyncio.gather(*(create(request) for request in unique), return_exceptions=True)
+
+        result = EnqueueResult(coalesced=len(requests) - len(unique))
+        for request, created in zip(unique, results):
+            if isinstance(created, Exception):
+                logger.error(f"Error occurred while creating a task {request.path}: {created}")
+                result.failed += 1
+            elif created:
+                result.created += 1
+            else:
+                result.coalesced += 1
+        return result
+
+
+class LocalTaskDispatcher(TaskDispatcher):
+    """
+    GCP を使わずにプロセス内の asyncio キューでタスクを実行する（ローカル実行・負荷試験用）
+    ワーカーは同じアプリケーションのエンドポイントを ASGI 経由で直接呼び出す
+    """
+
+    def __init__(self, app, workers: int, max_attempts: int = 3):
+        self.app = app
+        self.workers = workers
+        self.max_attempts = max_attempts
+        self.queue: asyncio.Queue = asyncio.Queue()
+        self.seen: set[str] = set()
+        self.tasks: list[asyncio.Task] = []
+        self.client = None
+
+    def start(self) -> None:
+        import httpx
+
+        self.client = httpx.AsyncClient(transport=httpx.ASGITransport(app=self.app), base_url='http://local-tasks')
+        self.tasks = [asyncio.create_task(self.work()) for _ in range(self.workers)]
+
+    async def enqueue(self, requests: list[TaskRequest]) -> EnqueueResult:
+        result = EnqueueResult()
+        for request in requests:
+            if request.key in self.seen:
+                result.coalesced += 1
+                continue
+            self.seen.add(request.key)
+            self.queue.put_nowait((request, 1))
+            result.created += 1
+        return result
+
+    async def work(self) -> None:
+        while True:
+            request, attempt = await self.queue.get()
+            try:
+                response = await self.client.post(request.path, json=request.payload, timeout=None)
+                # Cloud Tasks と同様に 2xx 以外は再試行する
+                if response.status_code >= 300 and attempt < self.max_attempts:
+                    await asyncio.sleep(2 ** attempt)
+                    self.queue.put_nowait((request, attempt + 1))
+                elif response.status_code >= 300:
+                    logger.error(f'local task failed: {request.path} ({response.status_code})')
+            except Exception as e:
+                logger.error(f'local task failed: {request.path}: {e}', exc_info=True)
+            finally:
+                self.queue.task_done()
+
+    async def join(self) -> None:
+        """キューが空になり、実行中のタスクがすべて終わるまで待つ"""
+        await self.queue.join()
+
+    async def close(self) -> None:
+        for task in self.tasks:
+            task.cancel()
+        await asyncio.gather(*self.tasks, return_exceptions=True)
+        self.tasks = []
+        if self.client is not None:
+            await self.client.aclose()
+            self.client = None
+
+
+def start_dispatcher(app) -> None:
+    """アプリケーション起動時に呼ぶ。ローカルのキューを使う場合はここでワーカーを起動する"""
+    global _dispatcher
+    if Settings.task_queue_backend == 'local':
+        dispatcher = LocalTaskDispatcher(app, workers=Settings.local_task_workers)
+        dispatcher.start()
+        _dispatcher = dispatcher
+
+
+def get_dispatcher() -> TaskDispatcher:
+    """プロセスごとに1つのディスパッチャーを返す"""
+    global _dispatcher
+    if _dispatcher is None:
+        if Settings.task_queue_backend == 'local':
+            raise RuntimeError('local task dispatcher is not started')
+        client = clients.get_clients().cloud_tasks
+        queue_path = client.queue_path(
+            Settings.google_cloud.project_id,
+            Settings.google_cloud.location_id,
+            Settings.google_cloud.queue_id,
+        )
+        _dispatcher = CloudTasksDispatcher(client, queue_path, concurrency=Settings.task_enqueue_concurrency)
+    return _dispatcher
+
+
+async def shutdown_dispatcher() -> None:
+    global _dispatcher
+    if _dispatcher is not None:
+        await _dispatcher.close()
+        _dispatcher = None
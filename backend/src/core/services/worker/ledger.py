@@ -0,0 +1,193 @@
+import asyncio
+import logging
+import uuid
+from contextlib import asynccontextmanager
+from datetime import datetime, timedelta, timezone
+from typing import AsyncIterator, Literal, Optional
+
+from google.cloud import firestore
+from pydantic import BaseModel
+
+from src.settings import Settings
+
+logger = logging.getLogger(__name__)
+
+# Firestore の TTL ポリシーはこのコレクショングループの `expires_at` に設定する
+TASK_LEDGER_COLLECTION = 'task_ledger'
+
+LeaseStatus = Literal['acquired', 'leased', 'completed']
+
+
+class TaskLease(BaseModel):
+    """(file_uuid, stage, page) 単位のタスク実行権"""
+
+    user_id: str
+    file_uuid: str
+    stage: str
+    page: Optional[int] = None
+    run_id: str = ''
+    token: str
+    status: LeaseStatus
+    attempts: int = 0
+
+    @property
+    def acquired(self) -> bool:
+        return self.status == 'acquired'
+
+
+def get_task_id(file_uuid: str, stage: str, page: Optional[int] = None, run_id: str = '') -> str:
+    """
+    ファイル・解析の実行・ステージ・ページから、Cloud Tasks のタスク名と台帳のドキュメントIDに使うIDを作る
+    （英数字・ハイフン・アンダースコアのみ）
+    Cloud Tasks は削除・完了したタスクの名前をしばらく再利用できないため、再解析では run_id を変えて別の名前にする
+    """
+    parts = [file_uuid, run_id, stage] if run_id else [file_uuid, stage]
+    if page is not None:
+        parts.append(str(int(page)))
+    return ''.join(char if char.isalnum() or char in '-_' else '_' for char in '-'.join(parts))
+
+
+def get_task_ref(
+    firestore_client: firestore.Client,
+    user_id: str,
+    file_uuid: str,
+    stage: str,
+    page: Optional[int],
+    run_id: str = '',
+):
+    return (
+        firestore_client.collection('users')
+        .document(user_id)
+        .collection(TASK_LEDGER_COLLECTION)
+        .document(get_task_id(file_uuid, stage, page, run_id))
+    )
+
+
+@firestore.transactional
+def _acquire_in_transaction(transaction, task_ref, lease: TaskLease, now: datetime) -> TaskLease:
+    snapshot = task_ref.get(transaction=transaction)
+    data = snapshot.to_dict() if snapshot.exists else {}
+    attempts = data.get('attempts', 0)
+
+    if data.get('status') == 'completed':
+        return lease.model_copy(update={'status': 'completed', 'attempts': attempts})
+
+    # 実行中のリースは期限が切れるまで他の配信に渡さない（期限切れはクラッシュしたものとして取り直す）
+    lease_expires_at = data.get('lease_expires_at')
+    if data.get('status') == 'leased' and lease_expires_at is not None and lease_expires_at > now:
+        return lease.model_copy(update={'status': 'leased', 'attempts': attempts})
+
+    transaction.set(
+        task_ref,
+        {
+            'file_uuid': lease.file_uuid,
+            'stage': lease.stage,
+            'page': lease.page,
+            'status': 'leased',
+            'token': lease.token,
+            'attempts': attempts + 1,
+            'leased_at': now,
+            'lease_expires_at': now + timedelta(seconds=Settings.task_lease_seconds),
+            'expires_at': now + timedelta(days=Settings.task_ledger_ttl_days),
+        },
+    )
+    return lease.model_copy(update={'status': 'acquired', 'attempts': attempts + 1})
+
+
+def acquire_lease(
+    firestore_client: firestore.Client,
+    user_id: str,
+    file_uuid: str,
+    stage: str,
+    page: Optional[int] = None,
+    run_id: str = '',
+) -> TaskLease:
+    """
+    タスクの実行権を取得する。
+    完了済みのタスク、または他の配信が実行中のタスクは acquired 以外の状態で返す。
+    """
+    lease = TaskLease(
+        user_id=user_id,
+        file_uuid=file_uuid,
+        stage=stage,
+        page=page,
+        run_id=run_id,
+        token=uuid.uuid4().hex,
+        status='acquired',
+    )
+    task_ref = get_task_ref(firestore_client, user_id, file_uuid, stage, page, run_id)
+    return _acquire_in_transaction(firestore_client.transaction(), task_ref, lease, datetime.now(timezone.utc))
+
+
+@firestore.transactional
+def _finish_in_transaction(transaction, task_ref, lease: TaskLease, data: Optional[dict]) -> bool:
+    snapshot = task_ref.get(transaction=transaction)
+    # リースの期限が切れて別の配信に取り直されている場合は何もしない
+    if not snapshot.exists or snapshot.get('token') != lease.token:
+        return False
+    if data is None:
+        transaction.delete(task_ref)
+    else:
+        transaction.update(task_ref, data)
+    return True
+
+
+def complete_lease(firestore_client: firestore.Client, lease: TaskLease) -> None:
+    """タスクを完了済みにする。以降の重複配信はすぐに返される"""
+    now = datetime.now(timezone.utc)
+    task_ref = get_task_ref(firestore_client, lease.user_id, lease.file_uuid, lease.stage, lease.page, lease.run_id)
+    finished = _finish_in_transaction(
+        firestore_client.transaction(),
+        task_ref,
+        lease,
+        {
+            'status': 'completed',
+            'completed_at': now,
+            'lease_expires_at': None,
+            'expires_at': now + timedelta(days=Settings.task_ledger_ttl_days),
+        },
+    )
+    if not finished:
+        logger.warning(f'lease for {task_ref.id} was taken over before completion')
+
+
+def release_lease(firestore_client: firestore.Client, lease: TaskLease) -> None:
+    """失敗したタスクのリースを解放し、再配信ですぐに再実行できるようにする"""
+    task_ref = get_task_ref(firestore_client, lease.user_id, lease.file_uuid, lease.stage, lease.page, lease.run_id)
+    _finish_in_transaction(firestore_client.transaction(), task_ref, lease, None)
+
+
+@asynccontextmanager
+async def task_lease(
+    firestore_client: firestore.Client,
+    user_id: str,
+    file_uuid: str,
+    stage: str,
+    page: Optional[int] = None,
+    run_id: str = '',
+) -> AsyncIterator[TaskLease]:
+    """
+    リースを取得してブロック内の処理を実行する。
+    正常に終了すれば完了済み、例外が発生すればリースを解放する。
+    取得できなかった場合（lease.acquired が False）は呼び出し側で処理をスキップすること。
+    """
+    lease = await asyncio.to_thread(acquire_lease, firestore_client, user_id, file_uuid, stage, page, run_id)
+    task_id = get_task_id(file_uuid, stage, page, run_id)
+    if not lease.acquired:
+        logger.info(f'skipping duplicate delivery: {task_id} ({lease.status})')
+        yield lease
+        return
+
+    try:
+        yield lease
+    except Exception:
+        try:
+            await asyncio.to_thread(release_lease, firestore_client, lease)
+        except Exception as e:
+            logger.error(f'failed to release lease {task_id}: {e}')
+        raise
+
+    try:
+        await asyncio.to_thread(complete_lease, firestore_client, lease)
+    except Exception as e:
+        logger.error(f'failed to complete lease {task_id}: {e}')
@@ -6,6 +6,8 @@ class SummaryMetadata(BaseModel):
     file_uuid: str
     file_name: str
     summary_text: str
+    # 元のアップロードのタスク（SingedUrlMetadata）から引き継ぐ解析の実行ID
+    run_id: str = ''
 
 
 class PageMetadata(BaseModel):
@@ -15,6 +17,8 @@ class PageMetadata(BaseModel):
     file_name: str
     page_number: str
     max_page_number: str
+    # 元のアップロードのタスク（SingedUrlMetadata）から引き継ぐ解析の実行ID
+    run_id: str = ''
 
 
 class SingedUrlMetadata(BaseModel):
@@ -23,3 +27,19 @@ class SingedUrlMetadata(BaseModel):
     gcs_path: str
     filename: str
     file_uuid: str
+    # 解析の実行ごとのID。同じファイルを再解析した場合に、前回の実行とタスク名・リースが重ならないようにする
+    run_id: str = ''
+
+
+class PageBatchMetadata(BaseModel):
+    """start_page から end_page の前までのページをまとめて解析するタスク"""
+
+    user_id: str
+    project_id: str
+    file_uuid: str
+    file_name: str
+    start_page: int
+    end_page: int
+    max_page_number: int
+    # 元のアップロードのタスク（SingedUrlMetadata）から引き継ぐ解析の実行ID
+    run_id: str = ''
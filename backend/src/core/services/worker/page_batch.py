@@ -0,0 +1,234 @@
+import asyncio
+import base64
+import logging
+from dataclasses import dataclass, field
+
+import openai
+from google.api_core import exceptions as google_exceptions
+from google.cloud import firestore
+from pydantic import BaseModel
+
+import src.core.services.firebase_driver as firebase_driver
+from src.core.services import tracing
+from src.core.services.endpoints import projection
+from src.core.services.firebase_driver import AnalystReport, TranscriptionReport
+from src.core.services.upload import generate_summary, pdf_processor
+from src.core.services.worker import ledger
+from src.core.services.worker.ledger import TaskLease
+from src.core.services.worker.models import PageBatchMetadata
+from src.schemas.documents import Documents, Item
+from src.repositories.abstract import DocumentRepository
+
+logger = logging.getLogger(__name__)
+
+
+class PageAnalysis(BaseModel):
+    """1ページ分の文章の解析結果"""
+
+    page_number: int
+    analyst_report: AnalystReport
+    transcription_report: TranscriptionReport
+
+
+class PageFailed(Exception):
+    """画像がない・GPTで失敗したなど、再試行しても解決しないページのエラー"""
+
+
+@dataclass
+class PageOutcomes:
+    """バッチ内のページごとの処理結果"""
+
+    completed: list[int] = field(default_factory=list)
+    # 再試行しても解決しないエラーで打ち切ったページ（リースは完了にし、進捗に失敗を記録する）
+    failed: dict[int, str] = field(default_factory=dict)
+    # 再試行するページ（リースを解放する）
+    errors: dict[int, BaseException] = field(default_factory=dict)
+    analyses: list[PageAnalysis] = field(default_factory=list)
+
+
+def collect_outcomes(pages: list[int], results: list) -> PageOutcomes:
+    """return_exceptions=True の gather の結果をページごとに振り分ける"""
+    outcomes = PageOutcomes()
+    for page_number, result in zip(pages, results):
+        if isinstance(result, PageFailed):
+            outcomes.failed[page_number] = str(result)
+        elif isinstance(result, BaseException):
+            outcomes.errors[page_number] = result
+        else:
+            outcomes.completed.append(page_number)
+            if isinstance(result, PageAnalysis):
+                outcomes.analyses.append(result)
+    return outcomes
+
+
+def split_pages(max_pages: int, batch_size: int) -> list[tuple[int, int]]:
+    """ページを batch_size ごとの (開始, 終了) の範囲に分ける"""
+    batch_size = max(1, batch_size)
+    return [(start, min(start + batch_size, max_pages)) for start in range(0, max_pages, batch_size)]
+
+
+async def acquire_leases(
+    firestore_client: firestore.Client,
+    metadata: PageBatchMetadata,
+    stage: str,
+) -> list[TaskLease]:
+    return await asyncio.gather(
+        *(
+            asyncio.to_thread(
+                ledger.acquire_lease,
+                firestore_client,
+                metadata.user_id,
+                metadata.file_uuid,
+                stage,
+                page_number,
+                metadata.run_id,
+            )
+            for page_number in range(metadata.start_page, metadata.end_page)
+        )
+    )
+
+
+async def finish_leases(firestore_client: firestore.Client, leases: list[TaskLease], outcomes: PageOutcomes) -> None:
+    """
+    ページごとの結果に応じてリースを終える
+    完了・失敗を記録したページは完了済みにし、再試行するページだけ解放する
+    """
+
+    def finish(lease: TaskLease) -> None:
+        if lease.page in outcomes.errors:
+            ledger.release_lease(firestore_client, lease)
+        else:
+            ledger.complete_lease(firestore_client, lease)
+
+    results = await asyncio.gather(*(asyncio.to_thread(finish, lease) for lease in leases), return_exceptions=True)
+    for lease, result in zip(leases, results):
+        if isinstance(result, Exception):
+            logger.error(f'failed to finish lease {lease.stage}/{lease.page}: {result}')
+
+
+async def analyze_page(
+    openai_client: openai.ChatCompletion,
+    storage_client,
+    metadata: PageBatchMetadata,
+    project_id: str,
+    page_number: int,
+) -> PageAnalysis:
+    """ページ画像を読み込み、分析と転写を並行して行う。画像がない・GPTで失敗したページは PageFailed を送出する"""
+    blob_path = pdf_processor.get_page_image_path(metadata.user_id, project_id, metadata.file_uuid, page_number)
+    try:
+        with tracing.span('storage.download_image'):
+            image_bytes = await asyncio.to_thread(storage_client.blob(blob_path).download_as_bytes)
+    except google_exceptions.NotFound:
+        logger.error(f"Skipping page {page_number} because the image is not available: {blob_path}")
+        raise PageFailed(f'page {page_number}: image is not available')
+    image_base64 = base64.b64encode(image_bytes).decode('utf-8')
+
+    try:
+        analyst_report, transcription_report = await asyncio.gather(
+            generate_summary.get_analyst_report(openai_client, image_base64, max_retries=3),
+            generate_summary.get_transcription(openai_client, image_base64, max_retries=3),
+        )
+    except Exception as e:
+        logger.error(f"Failed to create summary {page_number}: {e}")
+        raise PageFailed(f'page {page_number}: {e}')
+
+    return PageAnalysis(
+        page_number=page_number,
+        analyst_report=analyst_report,
+        transcription_report=transcription_report,
+    )
+
+
+async def analyze_pages(
+    firestore_client: firestore.Client,
+    storage_client,
+    openai_client: openai.ChatCompletion,
+    doc_repository: DocumentRepository,
+    metadata: PageBatchMetadata,
+    project_id: str,
+    pages: list[int],
+    concurrency: int,
+) -> PageOutcomes:
+    """
+    ページを並行して解析し、結果を Firestore へ1回のバッチで、Weaviate へ1回の登録で保存する
+    1ページの失敗でバッチ全体を失敗にしないよう、結果はページごとに返す
+    """
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async def analyze(page_number: int) -> PageAnalysis:
+        async with semaphore:
+            with tracing.attributes(page=page_number), tracing.span('page.analyze'):
+                return await analyze_page(openai_client, storage_client, metadata, project_id, page_number)
+
+    results = await asyncio.gather(*(analyze(page) for page in pages), return_exceptions=True)
+    outcomes = collect_outcomes(pages, results)
+    if not outcomes.analyses:
+        return outcomes
+
+    try:
+        with tracing.span('firestore.save_pages', pages=len(outcomes.analyses)):
+            await asyncio.to_thread(
+                firebase_driver.save_page_analyst_reports,
+                firestore_client,
+                metadata.user_id,
+                project_id,
+                metadata.file_uuid,
+                metadata.file_name,
+                [
+                    (analysis.page_number, analysis.analyst_report, analysis.transcription_report)
+                    for analysis in outcomes.analyses
+                ],
+            )
+
+        documents = Documents(
+            items=[
+                Item(
+                    user_id=metadata.user_id,
+                    project_id=project_id,
+                    file_uuid=metadata.file_uuid,
+                    file_name=metadata.file_name,
+                    page_number=str(analysis.page_number),
+                    transcription=analysis.transcription_report.transcription,
+                )
+                for analysis in outcomes.analyses
+            ]
+        )
+        with tracing.span('weaviate.add_documents', documents=len(documents.items)):
+            await asyncio.to_thread(doc_repository.add_documents, documents)
+
+    # まとめて保存しているため、保存に失敗した場合は解析したページをすべて再試行する
+    except Exception as e:
+        for analysis in outcomes.analyses:
+            outcomes.errors[analysis.page_number] = e
+        outcomes.completed = [page for page in outcomes.completed if page not in outcomes.errors]
+        outcomes.analyses = []
+    return outcomes
+
+
+async def project_pages(
+    firestore_client: firestore.Client,
+    storage_client,
+    openai_client: openai.ChatCompletion,
+    metadata: PageBatchMetadata,
+    project_id: str,
+    pages: list[int],
+    concurrency: int,
+) -> PageOutcomes:
+    """ページごとの数値情報（事業計画用）を並行して解析し、結果をページごとに返す"""
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async def project(page_number: int) -> None:
+        async with semaphore:
+            with tracing.attributes(page=page_number), tracing.span('page.project'):
+                await projection.process_single_page_profit_and_loss(
+                    metadata.user_id,
+                    metadata.file_uuid,
+                    firestore_client,
+                    storage_client,
+                    openai_client,
+                    page_number,
+                    project_id=project_id,
+                )
+
+    results = await asyncio.gather(*(project(page) for page in pages), return_exceptions=True)
+    return collect_outcomes(pages, results)
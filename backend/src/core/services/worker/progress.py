@@ -0,0 +1,311 @@
+import asyncio
+import logging
+from datetime import datetime, timedelta, timezone
+from typing import AsyncIterator, Literal, Optional
+
+from google.cloud import firestore
+from google.cloud.firestore_v1.base_query import FieldFilter
+from pydantic import BaseModel
+
+from src.settings import Settings
+
+logger = logging.getLogger(__name__)
+
+PROGRESS_COLLECTION = 'progress'
+
+ProgressStatus = Literal['queued', 'processing', 'completed', 'failed']
+# 解析が終わった（これ以上進まない）状態
+TERMINAL_STATUSES = ('completed', 'failed')
+# ページ単位で進捗を記録するステージ（ページ番号の配列で持つため、再配信されても重複して数えない）
+PageStage = Literal['analyzed', 'projected', 'indexed']
+# 失敗を記録するページ単位のステージ。全ページが完了または失敗したらステージの終了とする
+FailablePageStage = Literal['analyzed', 'projected']
+FAILABLE_PAGE_STAGES = ('analyzed', 'projected')
+FileStage = Literal['summarized', 'analyst']
+FILE_STAGES = ('summarized', 'analyst')
+
+
+class FileProgress(BaseModel):
+    """ファイルごとの解析の進捗"""
+
+    file_uuid: str
+    file_name: str = ''
+    status: ProgressStatus = 'queued'
+    total_pages: int = 0
+    pages_split: int = 0
+    pages_analyzed: int = 0
+    pages_projected: int = 0
+    pages_indexed: int = 0
+    # 再試行しても解決しないエラーで処理を打ち切ったページ数
+    pages_analysis_failed: int = 0
+    pages_projection_failed: int = 0
+    summarized: bool = False
+    analyst: bool = False
+    # 失敗したファイル単位のステージと、最後に記録したエラー
+    failed_stages: list[str] = []
+    error: Optional[str] = None
+    updated_at: Optional[datetime] = None
+
+    @property
+    def remaining_tasks(self) -> int:
+        """残りの処理の件数（ページごとの解析・数値の解析、サマリー、analyst view）。失敗した処理は残りに数えない"""
+        if self.status in TERMINAL_STATUSES:
+            return 0
+        return (
+            max(self.total_pages - self.pages_analyzed - self.pages_analysis_failed, 0)
+            + max(self.total_pages - self.pages_projected - self.pages_projection_failed, 0)
+            + (0 if self.summarized or 'summarized' in self.failed_stages else 1)
+            + (0 if self.analyst or 'analyst' in self.failed_stages else 1)
+        )
+
+
+def get_progress_ref(firestore_client: firestore.Client, user_id: str, file_uuid: str):
+    return (
+        firestore_client.collection('users')
+        .document(user_id)
+        .collection(PROGRESS_COLLECTION)
+        .document(str(file_uuid))
+    )
+
+
+def parse_progress(file_uuid: str, data: dict) -> FileProgress:
+    return FileProgress(
+        file_uuid=file_uuid,
+        file_name=data.get('file_name', ''),
+        status=data.get('status', 'queued'),
+        total_pages=data.get('total_pages', 0),
+        pages_split=data.get('pages_split', 0),
+        pages_analyzed=len(data.get('analyzed_pages', [])),
+        pages_projected=len(data.get('projected_pages', [])),
+        pages_indexed=len(data.get('indexed_pages', [])),
+        pages_analysis_failed=len(data.get('analyzed_failed_pages', [])),
+        pages_projection_failed=len(data.get('projected_failed_pages', [])),
+        summarized=data.get('summarized', False),
+        analyst=data.get('analyst', False),
+        failed_stages=data.get('failed_stages', []),
+        error=data.get('error'),
+        updated_at=data.get('updated_at'),
+    )
+
+
+def resolve_status(data: dict) -> ProgressStatus:
+    """
+    全てのステージが終わった（完了または失敗した）時点で、ファイルの最終的な状態を決める
+    ページ数が決まる前（PDFの分割前）や、ページのないファイルは記録されている状態のままにする
+    """
+    status = data.get('status', 'queued')
+    if 'total_pages' not in data:
+        return status
+
+    total_pages = data['total_pages']
+    failed_stages = set(data.get('failed_stages', []))
+    pages_finished = all(
+        len(set(data.get(f'{stage}_pages', [])) | set(data.get(f'{stage}_failed_pages', []))) >= total_pages
+        for stage in FAILABLE_PAGE_STAGES
+    )
+    stages_finished = all(data.get(stage) or stage in failed_stages for stage in FILE_STAGES)
+    if not (pages_finished and stages_finished):
+        return 'processing'
+
+    pages_failed = any(data.get(f'{stage}_failed_pages') for stage in FAILABLE_PAGE_STAGES)
+    return 'failed' if failed_stages or pages_failed else 'completed'
+
+
+def start_progress(firestore_client: firestore.Client, user_id: str, file_uuid: str, file_name: str) -> None:
+    """解析タスクを登録したときに進捗ドキュメントを作成する"""
+    get_progress_ref(firestore_client, user_id, file_uuid).set(
+        {
+            'file_uuid': str(file_uuid),
+            'file_name': file_name,
+            'status': 'queued',
+            'created_at': firestore.SERVER_TIMESTAMP,
+            'updated_at': firestore.SERVER_TIMESTAMP,
+        }
+    )
+
+
+def set_pages_split(firestore_client: firestore.Client, user_id: str, file_uuid: str, total_pages: int) -> None:
+    """PDFの分割・画像化が終わったページ数を記録する"""
+    get_progress_ref(firestore_client, user_id, file_uuid).set(
+        {
+            'status': 'processing',
+            'total_pages': total_pages,
+            'pages_split': total_pages,
+            'updated_at': firestore.SERVER_TIMESTAMP,
+        },
+        merge=True,
+    )
+
+
+@firestore.transactional
+def _update_in_transaction(
+    transaction, progress_ref, build_changes, status: Optional[ProgressStatus] = None
+) -> FileProgress:
+    """進捗を更新し、更新後の内容からファイルの状態を決め直す"""
+    snapshot = progress_ref.get(transaction=transaction)
+    data = snapshot.to_dict() if snapshot.exists else {}
+    changes = build_changes(data)
+    changes['status'] = status or resolve_status({**data, **changes})
+    changes['updated_at'] = firestore.SERVER_TIMESTAMP
+    transaction.set(progress_ref, changes, merge=True)
+    return parse_progress(progress_ref.id, {**data, **changes, 'updated_at': None})
+
+
+def update_in_transaction(
+    firestore_client: firestore.Client,
+    user_id: str,
+    file_uuid: str,
+    build_changes,
+    status: Optional[ProgressStatus] = None,
+) -> FileProgress:
+    progress_ref = get_progress_ref(firestore_client, user_id, file_uuid)
+    return _update_in_transaction(firestore_client.transaction(), progress_ref, build_changes, status)
+
+
+def add_pages(
+    firestore_client: firestore.Client,
+    user_id: str,
+    file_uuid: str,
+    updates: dict[PageStage, list[int]],
+) -> FileProgress:
+    """ステージごとに処理が終わったページを記録し、更新後の進捗を返す"""
+
+    def build_changes(data: dict) -> dict:
+        changes = {}
+        for stage, pages in updates.items():
+            changes[f'{stage}_pages'] = sorted(set(data.get(f'{stage}_pages', [])) | set(pages))
+            # 再試行で成功したページは失敗から除く
+            if stage in FAILABLE_PAGE_STAGES and data.get(f'{stage}_failed_pages'):
+                changes[f'{stage}_failed_pages'] = sorted(set(data[f'{stage}_failed_pages']) - set(pages))
+        return changes
+
+    return update_in_transaction(firestore_client, user_id, file_uuid, build_changes)
+
+
+def add_failed_pages(
+    firestore_client: firestore.Client,
+    user_id: str,
+    file_uuid: str,
+    stage: FailablePageStage,
+    pages: list[int],
+    error: str,
+) -> FileProgress:
+    """再試行しても解決しないエラーで処理を打ち切ったページを記録する。ファイルの状態は全ステージの終了後に決まる"""
+
+    def build_changes(data: dict) -> dict:
+        succeeded = set(data.get(f'{stage}_pages', []))
+        failed = set(data.get(f'{stage}_failed_pages', [])) | set(pages)
+        return {f'{stage}_failed_pages': sorted(failed - succeeded), 'error': error}
+
+    return update_in_transaction(firestore_client, user_id, file_uuid, build_changes)
+
+
+def mark_stage(
+    firestore_client: firestore.Client,
+    user_id: str,
+    file_uuid: str,
+    stage: FileStage,
+    status: Optional[ProgressStatus] = None,
+) -> FileProgress:
+    """
+    ファイル単位のステージの完了を記録する
+    status を指定しない場合は、全ステージが終わっていれば completed / failed にする
+    """
+
+    def build_changes(data: dict) -> dict:
+        changes = {stage: True}
+        if stage in data.get('failed_stages', []):
+            changes['failed_stages'] = [name for name in data['failed_stages'] if name != stage]
+        return changes
+
+    return update_in_transaction(firestore_client, user_id, file_uuid, build_changes, status)
+
+
+def mark_stage_failed(
+    firestore_client: firestore.Client,
+    user_id: str,
+    file_uuid: str,
+    stage: FileStage,
+    error: str,
+) -> FileProgress:
+    """再試行しても解決しないエラーで打ち切ったファイル単位のステージを記録する"""
+
+    def build_changes(data: dict) -> dict:
+        failed_stages = data.get('failed_stages', [])
+        return {'failed_stages': failed_stages if stage in failed_stages else [*failed_stages, stage], 'error': error}
+
+    return update_in_transaction(firestore_client, user_id, file_uuid, build_changes)
+
+
+def is_stale(file_progress: FileProgress, now: datetime) -> bool:
+    """
+    タスクのリース期間を過ぎても更新されていない進捗は、再試行を使い切って止まったものとみなす
+    （500 で失敗し続けたタスクは失敗を記録できないため）
+    """
+    if file_progress.updated_at is None:
+        return False
+    return file_progress.updated_at < now - timedelta(seconds=Settings.task_lease_seconds)
+
+
+def fetch_progress(firestore_client: firestore.Client, user_id: str, file_uuid: str) -> Optional[FileProgress]:
+    snapshot = get_progress_ref(firestore_client, user_id, file_uuid).get()
+    if not snapshot.exists:
+        return None
+    return parse_progress(snapshot.id, snapshot.to_dict())
+
+
+def fetch_active_progress(firestore_client: firestore.Client, user_id: str) -> list[FileProgress]:
+    """解析中（queued / processing）のファイルの進捗を返す。止まったまま更新されていないものは除く"""
+    query = (
+        firestore_client.collection('users')
+        .document(user_id)
+        .collection(PROGRESS_COLLECTION)
+        .where(filter=FieldFilter('status', 'in', ['queued', 'processing']))
+    )
+    now = datetime.now(timezone.utc)
+    files = [parse_progress(doc.id, doc.to_dict()) for doc in query.stream()]
+    return [file_progress for file_progress in files if not is_stale(file_progress, now)]
+
+
+async def watch_progress(
+    firestore_client: firestore.Client,
+    user_id: str,
+    file_uuid: str,
+    heartbeat_seconds: float,
+) -> AsyncIterator[Optional[FileProgress]]:
+    """
+    進捗ドキュメントの変更を購読して返す。変更がない間は heartbeat_seconds ごとに None を返す。
+    解析が完了（または失敗）したら終了する。
+    """
+    loop = asyncio.get_running_loop()
+    queue: asyncio.Queue = asyncio.Queue()
+
+    def on_snapshot(snapshots, changes, read_time):
+        # Firestore のリスナーは別スレッドで呼ばれる
+        for snapshot in snapshots:
+            if snapshot.exists:
+                loop.call_soon_threadsafe(queue.put_nowait, parse_progress(snapshot.id, snapshot.to_dict()))
+
+    watch = get_progress_ref(firestore_client, user_id, file_uuid).on_snapshot(on_snapshot)
+    try:
+        while True:
+            try:
+                progress = await asyncio.wait_for(queue.get(), timeout=heartbeat_seconds)
+            except asyncio.TimeoutError:
+                yield None
+                continue
+
+            yield progress
+            if progress.status in TERMINAL_STATUSES:
+                return
+    finally:
+        watch.unsubscribe()
+
+
+def update_progress(operation, *args, **kwargs):
+    """進捗の更新に失敗しても解析の処理は止めない"""
+    try:
+        return operation(*args, **kwargs)
+    except Exception as e:
+        logger.error(f'failed to update progress ({operation.__name__}): {e}', exc_info=True)
+        return None
@@ -1,17 +1,24 @@
+from typing import TYPE_CHECKING
+
 from fastapi import Depends
-from google.cloud import tasks_v2
 
+from src.core.services import clients
+from src.core.services.worker import dispatcher
+from src.core.services.worker.dispatcher import TaskDispatcher
 from src.settings import Settings
 
+if TYPE_CHECKING:
+    from google.cloud import tasks_v2
+
 
 def get_cloud_tasks_client():
     """
-    CloudTasksClient を生成して返す依存関数
+    ワーカープロセスで共有する CloudTasksClient（gRPC のチャネル）を返す依存関数
     """
-    return tasks_v2.CloudTasksClient()
+    return clients.get_clients().cloud_tasks
 
 
-def get_queue_path(client: tasks_v2.CloudTasksClient = Depends(get_cloud_tasks_client)):
+def get_queue_path(client: 'tasks_v2.CloudTasksClient' = Depends(get_cloud_tasks_client)):
     """
     CloudTasksClient を使って queue_path を返す依存関数
     """
@@ -20,3 +27,10 @@ def get_queue_path(client: tasks_v2.CloudTasksClient = Depends(get_cloud_tasks_c
         Settings.google_cloud.location_id,
         Settings.google_cloud.queue_id,
     )
+
+
+def get_task_dispatcher() -> TaskDispatcher:
+    """
+    タスクの登録先（Cloud Tasks またはプロセス内のキュー）を返す依存関数
+    """
+    return dispatcher.get_dispatcher()
@@ -1,12 +1,6 @@
-from openai import OpenAI
-
-from src.settings import settings
+from src.core.services import clients
 
 
 def get_openai_client():
-    openai_client = OpenAI(
-        organization=settings.openai_organization_id,
-        project=settings.openai_project_id,
-        api_key=settings.openai_api_key,
-    )
-    return openai_client
+    """ワーカープロセスで共有する OpenAI クライアントを返す依存関数"""
+    return clients.get_clients().openai
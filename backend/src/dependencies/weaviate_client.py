@@ -1,19 +1,9 @@
-import weaviate
-from weaviate.classes.init import Auth
-from src.settings import settings
+from src.core.services import clients
+
 
 def get_weaviate_client():
     """
-    FastAPI の依存性注入で使用するための Weaviate クライアントを生成し返す関数
+    FastAPI の依存性注入で使用するための Weaviate クライアントを返す関数
+    クライアントはワーカープロセスで共有し、アプリケーションの終了時に閉じる
     """
-    client = weaviate.connect_to_weaviate_cloud(
-        cluster_url=settings.weaviate_url,
-        auth_credentials=Auth.api_key(settings.weaviate_api_key),
-        headers={
-            "X-OpenAI-Api-Key": settings.openai_api_key
-        }
-    )
-    try:
-        yield client
-    finally:
-        client.close()
+    return clients.get_clients().weaviate
@@ -0,0 +1,8 @@
+"""gunicorn の設定（bin/start.sh から `-c python:src.gunicorn_conf` で読み込む）"""
+
+from src.core.services import metrics
+
+
+def child_exit(server, worker):
+    # 終了したワーカーの処理中リクエスト数を集計から外す
+    metrics.mark_process_dead(worker.pid)
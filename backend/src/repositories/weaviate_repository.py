@@ -1,13 +1,16 @@
 import logging
-import weaviate
+from typing import TYPE_CHECKING
+from src.core.services import clients, tracing
 from src.repositories.abstract import DocumentRepository
 from src.schemas.documents import Documents
-from weaviate.classes.query import Filter
+
+if TYPE_CHECKING:
+    import weaviate
 
 logger = logging.getLogger(__name__)
 
 class WeaviateDocumentRepository(DocumentRepository):
-    def __init__(self, client: weaviate.Client):
+    def __init__(self, client: 'weaviate.Client'):
         self.client = client
         self.class_name = "Documents"
 
@@ -15,7 +18,7 @@ class WeaviateDocumentRepository(DocumentRepository):
 
         # クラス名が "Documents" のコレクションオブジェクトを取得
         documents_collection = self.client.collections.get("Documents")
-        with documents_collection.batch.dynamic() as batch:
+        with clients.track('weaviate'), documents_collection.batch.dynamic() as batch:
             for item in docs.items:
                 batch.add_object({
                     "user_id":       item.user_id,
@@ -44,30 +47,14 @@ class WeaviateDocumentRepository(DocumentRepository):
     ):
         documents_collection = self.client.collections.get("Documents")
 
-        if file_uuid_list:
+        with tracing.span('weaviate.search', limit=limit), clients.track('weaviate'):
             response = documents_collection.query.hybrid(
                 query=query,
                 limit=limit,
-                filters=(
-                    Filter.by_property("project_id").equal(project_id) &
-                    Filter.by_property("user_id").equal(user_id) &
-                    Filter.by_property("file_uuid").contains_any(file_uuid_list)
-                ),
+                filters=build_filters(user_id, project_id, file_uuid_list),
                 query_properties=["transcription"],
             )
-            return response
-
-        else:
-            response = documents_collection.query.hybrid(
-                query=query,
-                limit=limit,
-                filters=(
-                    Filter.by_property("project_id").equal(project_id) &
-                    Filter.by_property("user_id").equal(user_id)
-                ),
-                query_properties=["transcription"],
-            )
-            return response
+        return response
 
     def search_documents_and_generate_response(
         self,
@@ -80,29 +67,21 @@ class WeaviateDocumentRepository(DocumentRepository):
     ):
         documents_collection = self.client.collections.get("Documents")
 
-        if file_uuid_list:
+        with tracing.span('weaviate.generate', limit=limit), clients.track('weaviate'):
             response = documents_collection.generate.near_text(
                 query=query,
                 limit=limit,
-                filters=(
-                    Filter.by_property("project_id").equal(project_id) &
-                    Filter.by_property("user_id").equal(user_id) &
-                    Filter.by_property("file_uuid").contains_any(file_uuid_list)
-                ),
+                filters=build_filters(user_id, project_id, file_uuid_list),
                 grouped_properties=["transcription"],
                 grouped_task=grouped_task,
             )
-            return response
+        return response
 
-        else:
-            response = documents_collection.generate.near_text(
-                query=query,
-                limit=limit,
-                filters=(
-                    Filter.by_property("project_id").equal(project_id) &
-                    Filter.by_property("user_id").equal(user_id)
-                ),
-                grouped_properties=["transcription"],
-                grouped_task=grouped_task,
-            )
-            return response
+
+def build_filters(user_id: str, project_id: str, file_uuid_list: list[str] = None):
+    from weaviate.classes.query import Filter
+
+    filters = Filter.by_property("project_id").equal(project_id) & Filter.by_property("user_id").equal(user_id)
+    if file_uuid_list:
+        filters = filters & Filter.by_property("file_uuid").contains_any(file_uuid_list)
+    return filters
@@ -7,8 +7,23 @@ from contextlib import asynccontextmanager
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
 
-from src.core.routers import auth, data, explorer, image, parameter, project, projection, retriever, upload, worker
-from src.core.services import firebase_client
+from src.core.routers import (
+    auth,
+    data,
+    explorer,
+    image,
+    metrics as metrics_router,
+    parameter,
+    project,
+    projection,
+    retriever,
+    upload,
+    worker,
+)
+from src.core.services import clients, firebase_client, metrics, tracing
+from src.core.services.exploler import preview
+from src.core.services.upload import workbook_processor
+from src.core.services.worker import dispatcher
 from src.settings import settings
 
 TITLE: Final[str] = 'Granite API'
@@ -18,11 +33,18 @@ VERSION: Final[str] = '1.0.0'
 async def lifespan(app: FastAPI):
     # スタートアップ時に行いたい処理
     firebase_client.FirebaseClient.initialize_firebase()
+    clients.start_clients(firebase_client.FirebaseClient.get_storage())
+    dispatcher.start_dispatcher(app)
 
     # アプリケーション起動
     yield
 
     # シャットダウン時に必要なら行う処理は以降
+    preview.shutdown_render_executor()
+    workbook_processor.shutdown_extract_executor()
+    await dispatcher.shutdown_dispatcher()
+    clients.shutdown_clients()
+    tracing.shutdown_exporter()
 
 app = FastAPI(
     title=TITLE,
@@ -39,6 +61,7 @@ app.add_middleware(
     allow_methods=["*"],
     allow_headers=["*"],
 )
+app.add_middleware(metrics.MetricsMiddleware)
 
 app.include_router(auth.router)
 app.include_router(data.router)
@@ -50,6 +73,7 @@ app.include_router(projection.router)
 app.include_router(retriever.router)
 app.include_router(upload.router)
 app.include_router(worker.router)
+app.include_router(metrics_router.router)
 
 
 if __name__ == "__main__":
@@ -15,6 +15,10 @@ class Settings:
     firebase_auth_secret_key: str = os.environ['FIREBASE_AUTH_SECRET_KEY']
     access_token_expire_minutes: int = int(os.getenv("ACCESS_TOKEN_EXPIRE_MINUTES", "60"))
     algorithm: str = str(os.getenv("ALGORITHM", "HS256"))
+    # 検証済みの Firebase ID トークンをキャッシュする件数（ワーカープロセスごと）
+    auth_token_cache_size: int = int(os.getenv("AUTH_TOKEN_CACHE_SIZE", "10000"))
+    # 0 より大きい場合、キャッシュしたトークンもこの秒数ごとに失効（revoke）していないかを Firebase Auth に確認する
+    auth_revocation_check_seconds: int = int(os.getenv("AUTH_REVOCATION_CHECK_SECONDS", "0"))
     firebase_credentials: str = str(
         os.getenv(
             "FIREBASE_CREDENTIALS",
@@ -22,6 +26,29 @@ class Settings:
         )
     )
     max_pages_to_parse: int = 60
+    explorer_max_preview_pages: int = 10
+    preview_render_workers: int = int(os.getenv("PREVIEW_RENDER_WORKERS", "2"))
+    explorer_summary_concurrency: int = int(os.getenv("EXPLORER_SUMMARY_CONCURRENCY", "4"))
+    table_prompt_token_budget: int = int(os.getenv("TABLE_PROMPT_TOKEN_BUDGET", "4000"))
+    sheet_extract_workers: int = int(os.getenv("SHEET_EXTRACT_WORKERS", "2"))
+    sheet_summary_concurrency: int = int(os.getenv("SHEET_SUMMARY_CONCURRENCY", "4"))
+    task_lease_seconds: int = int(os.getenv("TASK_LEASE_SECONDS", "600"))
+    task_ledger_ttl_days: int = int(os.getenv("TASK_LEDGER_TTL_DAYS", "7"))
+    # cloud_tasks: Cloud Tasks に登録する / local: プロセス内のキューで実行する（GCP なしでの実行・負荷試験用）
+    task_queue_backend: str = str(os.getenv("TASK_QUEUE_BACKEND", "cloud_tasks"))
+    task_enqueue_concurrency: int = int(os.getenv("TASK_ENQUEUE_CONCURRENCY", "16"))
+    local_task_workers: int = int(os.getenv("LOCAL_TASK_WORKERS", "4"))
+    # 1つのワーカータスクで解析するページ数（1 にするとページ単位で再試行される）
+    worker_page_batch_size: int = int(os.getenv("WORKER_PAGE_BATCH_SIZE", "4"))
+    worker_page_concurrency: int = int(os.getenv("WORKER_PAGE_CONCURRENCY", "4"))
+    # ワーカープロセスごとの共有クライアントの同時接続数の上限
+    openai_max_connections: int = int(os.getenv("OPENAI_MAX_CONNECTIONS", "20"))
+    storage_max_connections: int = int(os.getenv("STORAGE_MAX_CONNECTIONS", "20"))
+    weaviate_max_connections: int = int(os.getenv("WEAVIATE_MAX_CONNECTIONS", "10"))
+    progress_heartbeat_seconds: int = int(os.getenv("PROGRESS_HEARTBEAT_SECONDS", "15"))
+    # none / jsonl / otlp（otlp は opentelemetry-sdk と OTLP エクスポーターが必要）
+    trace_exporter: str = str(os.getenv("TRACE_EXPORTER", "none"))
+    trace_jsonl_path: str = str(os.getenv("TRACE_JSONL_PATH", "traces.jsonl"))
 
     class APIDocs(BaseSettings):
         """APIDocs settings."""
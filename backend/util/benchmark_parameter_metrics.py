@@ -0,0 +1,89 @@
+"""
+/parameter/sales のレスポンス作成処理のベンチマーク。
+サマリーごとに pydantic モデルを作成する従来の処理と、DataFrame に1度だけ読み込む処理を比較し、結果が一致することも確認する。
+
+```sh
+poetry run python -m util.benchmark_parameter_metrics --summaries 10000
+```
+"""
+
+import argparse
+import random
+import time
+from decimal import Decimal
+
+import src.core.services.firebase_driver as firebase_driver
+from src.core.routers.parameter import convert_business_summary_to_financial_response
+from src.core.services.query import parameter_metrics
+
+
+class FakeDocument:
+    """Firestore の DocumentSnapshot の代わり"""
+
+    def __init__(self, data: dict):
+        self._data = data
+
+    def to_dict(self) -> dict:
+        return dict(self._data)
+
+
+def generate_records(count: int, seed: int = 0) -> list[dict]:
+    """save_page_image_analysis と同じ形式（数値は str(Decimal)、欠損は "None"）のデータを作成する"""
+    rng = random.Random(seed)
+
+    def value() -> str:
+        if rng.random() < 0.4:
+            return str(None)
+        return str(Decimal(rng.randrange(1_000_000, 900_000_000)))
+
+    return [
+        {
+            "year": rng.choice([2022, 2023, 2024]),
+            "month": rng.randint(1, 12),
+            "quarter": rng.choice([None, 1, 2, 3, 4]),
+            "period_type": "四半期",
+            **{column: value() for column in parameter_metrics.VALUE_COLUMNS},
+        }
+        for _ in range(count)
+    ]
+
+
+def run_legacy(records: list[dict]) -> list[dict]:
+    summaries = [firebase_driver.parse_business_summary(FakeDocument(record)) for record in records]
+    financial_data = convert_business_summary_to_financial_response(summaries)
+    return [data.model_dump(mode='json') for data in financial_data]
+
+
+def run_columnar(records: list[dict]) -> list[dict]:
+    frame = parameter_metrics.load_summary_frame(records)
+    return parameter_metrics.build_financial_data(frame)
+
+
+def measure(target, records: list[dict], repeat: int) -> tuple[float, list[dict]]:
+    best = float('inf')
+    result = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = target(records)
+        best = min(best, time.perf_counter() - start)
+    return best, result
+
+
+def main(count: int, repeat: int) -> None:
+    records = generate_records(count)
+    legacy_seconds, legacy_result = measure(run_legacy, records, repeat)
+    columnar_seconds, columnar_result = measure(run_columnar, records, repeat)
+
+    data_points = sum(len(values["values"]) for values in columnar_result)
+    print(f'summaries: {count}, quarter data points: {data_points}')
+    print(f'legacy:   {legacy_seconds * 1000:.1f} ms')
+    print(f'columnar: {columnar_seconds * 1000:.1f} ms ({legacy_seconds / columnar_seconds:.1f}x)')
+    print(f'results match: {legacy_result == columnar_result}')
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--summaries', type=int, default=10_000, help='サマリーの件数')
+    parser.add_argument('--repeat', type=int, default=3, help='計測回数（最速値を表示する）')
+    args = parser.parse_args()
+    main(args.summaries, args.repeat)
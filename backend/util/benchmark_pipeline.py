@@ -0,0 +1,256 @@
+"""
+PDF の解析パイプライン（file:separate → pages:analyze → analyst:analyze）を、外部サービスをすべてフェイクにして実行するベンチマーク。
+ページ/秒、タスクごと・ファイルごとの p50 / p95、ピーク RSS、1ページあたりの外部サービスの呼び出し回数を表示する。
+閾値を指定すると、超えた場合に終了コード 1 で終了する（CI での性能の劣化の検知用）。
+
+```sh
+poetry run python -m util.benchmark_pipeline --files 4 --pages 20
+poetry run python -m util.benchmark_pipeline --corpus ./samples --openai-latency-ms 1500 --json result.json
+poetry run python -m util.benchmark_pipeline --openai-latency-ms 50 --min-pages-per-second 5 --max-calls-per-page 40
+```
+"""
+
+import argparse
+import asyncio
+import json
+import logging
+import resource
+import sys
+import time
+import uuid
+from collections import defaultdict
+from pathlib import Path
+
+import fitz
+
+from util import fake_backends
+from util.trace_report import percentile
+
+USER_ID = 'bench-user'
+PROJECT_ID = 'bench-project'
+
+
+def generate_pdf(pages: int, seed: int) -> bytes:
+    """テキストと表のような罫線を含むPDFを作成する"""
+    with fitz.open() as document:
+        for page_number in range(pages):
+            page = document.new_page()
+            page.insert_text((72, 72), f'Quarterly report {seed}-{page_number + 1}', fontsize=20)
+            for row in range(12):
+                y = 120 + row * 24
+                page.draw_line((72, y), (520, y))
+                page.insert_text((80, y + 16), f'Revenue FY{2020 + row % 5} Q{row % 4 + 1}: {(seed + row) * 1234567}')
+        return document.tobytes()
+
+
+def load_corpus(corpus: str | None, files: int, pages: int) -> list[tuple[str, bytes]]:
+    if corpus:
+        paths = sorted(Path(corpus).glob('*.pdf'))
+        if not paths:
+            raise SystemExit(f'no PDF files found in {corpus}')
+        return [(path.name, path.read_bytes()) for path in paths]
+    return [(f'synthetic-{index}.pdf', generate_pdf(pages, index)) for index in range(files)]
+
+
+def seed_project(backends: fake_backends.FakeBackends) -> None:
+    backends.firestore.collection('users').document(USER_ID).set({'email': 'bench@example.com'})
+    backends.firestore.collection('users').document(USER_ID).collection('projects').document(PROJECT_ID).set(
+        {'name': 'benchmark', 'is_selected': True, 'is_archived': False}
+    )
+
+
+def build_app():
+    from fastapi import FastAPI
+
+    from src.core.routers import worker
+
+    app = FastAPI()
+    app.include_router(worker.router)
+    return app
+
+
+def peak_rss_mb() -> float:
+    # Linux では KB、macOS ではバイト
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak / (1024 * 1024) if sys.platform == 'darwin' else peak / 1024
+
+
+def summarize_tasks(records: list[fake_backends.TaskRecord]) -> dict:
+    groups = defaultdict(list)
+    for record in records:
+        groups[record.path].append(record)
+    return {
+        path: {
+            'count': len(items),
+            'retries': sum(1 for record in items if record.attempt > 1),
+            'failed': sum(1 for record in items if record.status_code >= 300),
+            'p50_ms': percentile([record.seconds * 1000 for record in items], 0.5),
+            'p95_ms': percentile([record.seconds * 1000 for record in items], 0.95),
+            'max_ms': max(record.seconds * 1000 for record in items),
+        }
+        for path, items in sorted(groups.items())
+    }
+
+
+async def run(args) -> dict:
+    from src.core.services.worker import dispatcher, ledger, models, progress
+    from src.settings import Settings
+
+    Settings.worker_page_batch_size = args.batch_size
+    Settings.worker_page_concurrency = args.page_concurrency
+    Settings.max_pages_to_parse = args.max_pages
+
+    backends = fake_backends.FakeBackends.create(
+        firestore_latency_ms=args.firestore_latency_ms,
+        storage_latency_ms=args.storage_latency_ms,
+        weaviate_latency_ms=args.weaviate_latency_ms,
+        openai=fake_backends.FakeOpenAIConfig(
+            latency_ms=args.openai_latency_ms,
+            jitter=args.openai_jitter,
+            prompt_tokens=args.prompt_tokens,
+            completion_tokens=args.completion_tokens,
+            error_rate=args.openai_error_rate,
+            seed=args.seed,
+        ),
+    )
+    app = build_app()
+    task_dispatcher = fake_backends.install(app, backends)
+    seed_project(backends)
+
+    corpus = load_corpus(args.corpus, args.files, args.pages)
+    uploads = []
+    for file_name, pdf_bytes in corpus:
+        file_uuid = str(uuid.uuid4())
+        gcs_path = f'{USER_ID}/projects/{PROJECT_ID}/documents/{file_uuid}.pdf'
+        backends.bucket.blob(gcs_path).upload_from_string(pdf_bytes, content_type='application/pdf')
+        progress.start_progress(backends.firestore, USER_ID, file_uuid, file_name)
+        uploads.append(
+            models.SingedUrlMetadata(
+                user_id=USER_ID, project_id=PROJECT_ID, gcs_path=gcs_path, filename=file_name, file_uuid=file_uuid
+            )
+        )
+    backends.counter.reset()
+
+    async with fake_backends.TaskDeliverer(app, backends.tasks, workers=args.task_workers) as deliverer:
+        start = time.perf_counter()
+        await task_dispatcher.enqueue(
+            [
+                dispatcher.TaskRequest.from_model(
+                    '/worker/file:separate', metadata, ledger.get_task_id(metadata.file_uuid, 'separate')
+                )
+                for metadata in uploads
+            ]
+        )
+        await deliverer.join()
+        elapsed = time.perf_counter() - start
+
+    file_progress = [progress.fetch_progress(backends.firestore, USER_ID, upload.file_uuid) for upload in uploads]
+    pages = sum(item.total_pages for item in file_progress if item)
+    finished = {
+        record.file_uuid: record.finished_at - start
+        for record in deliverer.records
+        if record.path == '/worker/analyst:analyze' and record.status_code < 300
+    }
+    file_seconds = [finished[upload.file_uuid] for upload in uploads if upload.file_uuid in finished]
+    calls = defaultdict(int)
+    for (service, operation), count in backends.counter.totals.items():
+        calls[f'{service}.{operation}'] += count
+
+    return {
+        'files': len(uploads),
+        'files_completed': sum(1 for item in file_progress if item and item.status == 'completed'),
+        'pages': pages,
+        'elapsed_s': elapsed,
+        'pages_per_second': pages / elapsed if elapsed else 0.0,
+        'file_p50_s': percentile(file_seconds, 0.5) if file_seconds else None,
+        'file_p95_s': percentile(file_seconds, 0.95) if file_seconds else None,
+        'peak_rss_mb': peak_rss_mb(),
+        'tasks': summarize_tasks(deliverer.records),
+        'calls': dict(sorted(calls.items())),
+        'calls_per_page': {
+            service: count / pages if pages else 0.0
+            for service, count in sorted(backends.counter.by_service().items())
+        },
+        'tokens_per_page': sum(backends.openai.tokens.values()) / pages if pages else 0.0,
+    }
+
+
+def print_report(result: dict) -> None:
+    print(f"files: {result['files_completed']}/{result['files']} completed, pages: {result['pages']}")
+    print(f"elapsed: {result['elapsed_s']:.2f} s, throughput: {result['pages_per_second']:.2f} pages/s")
+    if result['file_p50_s'] is not None:
+        print(f"file latency: p50 {result['file_p50_s']:.2f} s, p95 {result['file_p95_s']:.2f} s")
+    print(f"peak RSS: {result['peak_rss_mb']:.1f} MB, tokens per page: {result['tokens_per_page']:.0f}")
+
+    print(f"\n{'task':<28} {'count':>6} {'retries':>8} {'failed':>7} {'p50 ms':>10} {'p95 ms':>10} {'max ms':>10}")
+    for path, row in result['tasks'].items():
+        print(
+            f"{path:<28} {row['count']:>6} {row['retries']:>8} {row['failed']:>7}"
+            f" {row['p50_ms']:>10.1f} {row['p95_ms']:>10.1f} {row['max_ms']:>10.1f}"
+        )
+
+    pages = result['pages'] or 1
+    print(f"\n{'call':<40} {'total':>8} {'per page':>9}")
+    for name, count in result['calls'].items():
+        print(f'{name:<40} {count:>8} {count / pages:>9.2f}')
+    print('\ncalls per page: ' + ', '.join(f'{name} {value:.2f}' for name, value in result['calls_per_page'].items()))
+
+
+def check_thresholds(result: dict, args) -> list[str]:
+    failures = []
+    if result['files_completed'] < result['files']:
+        failures.append(f"{result['files'] - result['files_completed']} files did not complete")
+    if args.min_pages_per_second is not None and result['pages_per_second'] < args.min_pages_per_second:
+        failures.append(f"throughput {result['pages_per_second']:.2f} < {args.min_pages_per_second} pages/s")
+    if args.max_file_p95_s is not None and (result['file_p95_s'] or 0) > args.max_file_p95_s:
+        failures.append(f"file p95 {result['file_p95_s']:.2f} > {args.max_file_p95_s} s")
+    if args.max_calls_per_page is not None:
+        calls_per_page = sum(
+            value for service, value in result['calls_per_page'].items() if service in ('firestore', 'storage')
+        )
+        if calls_per_page > args.max_calls_per_page:
+            failures.append(f'Firestore/Storage calls per page {calls_per_page:.1f} > {args.max_calls_per_page}')
+    if args.max_rss_mb is not None and result['peak_rss_mb'] > args.max_rss_mb:
+        failures.append(f"peak RSS {result['peak_rss_mb']:.1f} > {args.max_rss_mb} MB")
+    return failures
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--corpus', default=None, help='PDFファイルのディレクトリ。省略するとPDFを生成する')
+    parser.add_argument('--files', type=int, default=4, help='生成するPDFの数')
+    parser.add_argument('--pages', type=int, default=20, help='生成するPDFのページ数')
+    parser.add_argument('--max-pages', type=int, default=60, help='MAX_PAGES_TO_PARSE')
+    parser.add_argument('--batch-size', type=int, default=4, help='WORKER_PAGE_BATCH_SIZE')
+    parser.add_argument('--page-concurrency', type=int, default=4, help='WORKER_PAGE_CONCURRENCY')
+    parser.add_argument('--task-workers', type=int, default=16, help='同時に配信するタスク数（キューの maxConcurrentDispatches）')
+    parser.add_argument('--openai-latency-ms', type=float, default=200)
+    parser.add_argument('--openai-jitter', type=float, default=0.3)
+    parser.add_argument('--openai-error-rate', type=float, default=0.0)
+    parser.add_argument('--prompt-tokens', type=int, default=1200)
+    parser.add_argument('--completion-tokens', type=int, default=400)
+    parser.add_argument('--firestore-latency-ms', type=float, default=5)
+    parser.add_argument('--storage-latency-ms', type=float, default=20)
+    parser.add_argument('--weaviate-latency-ms', type=float, default=30)
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--json', default=None, help='結果をJSONで保存するパス')
+    parser.add_argument('--min-pages-per-second', type=float, default=None)
+    parser.add_argument('--max-file-p95-s', type=float, default=None)
+    parser.add_argument('--max-calls-per-page', type=float, default=None, help='Firestore と Storage の合計')
+    parser.add_argument('--max-rss-mb', type=float, default=None)
+    parser.add_argument('--log-level', default='WARNING')
+    args = parser.parse_args()
+
+    logging.basicConfig(level=args.log_level)
+    logging.getLogger().setLevel(args.log_level)
+
+    result = asyncio.run(run(args))
+    print_report(result)
+    if args.json:
+        with open(args.json, 'w', encoding='utf-8') as f:
+            json.dump(result, f, ensure_ascii=False, indent=2)
+
+    failures = check_thresholds(result, args)
+    for failure in failures:
+        print(f'FAILED: {failure}')
+    sys.exit(1 if failures else 0)
@@ -0,0 +1,117 @@
+"""
+表ファイル読み込みのメモリ使用量を比較するベンチマーク。
+全体を読み込む従来の方法と、行単位のストリーミング読み込み（行数・文字数の上限あり）を比較する。
+各計測は別プロセスで実行し、ピークRSSを比較する。
+
+```sh
+poetry run python -m util.benchmark_table_reader --rows 200000
+poetry run python -m util.benchmark_table_reader --rows 200000 --max-rows 500 --max-chars 30000
+```
+"""
+
+import argparse
+import csv
+import io
+import multiprocessing
+import resource
+import tempfile
+import time
+from pathlib import Path
+
+from openpyxl import Workbook, load_workbook
+
+from src.core.services.upload import table_processor
+
+COLUMNS = 12
+
+
+def generate_xlsx(path: Path, rows: int) -> None:
+    workbook = Workbook(write_only=True)
+    sheet = workbook.create_sheet('data')
+    sheet.append([f'column_{i}' for i in range(COLUMNS)])
+    for row in range(rows):
+        sheet.append([f'item_{row}'] + [row * i for i in range(1, COLUMNS)])
+    workbook.save(path)
+
+
+def generate_csv(path: Path, rows: int) -> None:
+    with open(path, 'w', newline='', encoding='utf-8') as f:
+        writer = csv.writer(f)
+        writer.writerow([f'column_{i}' for i in range(COLUMNS)])
+        for row in range(rows):
+            writer.writerow([f'品目_{row}'] + [row * i for i in range(1, COLUMNS)])
+
+
+def read_xlsx_full(path: Path, max_rows, max_chars) -> int:
+    """従来の実装: ワークブック全体を展開してから全行をテキスト化する"""
+    workbook = load_workbook(path)
+    sheet = workbook.active
+    content = []
+    for row in sheet.iter_rows(values_only=True):
+        content.append("\t".join([str(cell) for cell in row if cell is not None]))
+    return len("\n".join(content))
+
+
+def read_xlsx_streaming(path: Path, max_rows, max_chars) -> int:
+    return len(table_processor.convert_xlsx_row_to_text(path, max_rows=max_rows, max_chars=max_chars))
+
+
+def read_csv_full(path: Path, max_rows, max_chars) -> int:
+    """従来の実装: バイト列全体を decode してからパースする"""
+    contents = path.read_bytes()
+    decoded_content = contents.decode('utf-8')
+    reader = csv.reader(io.StringIO(decoded_content))
+    return len("\n".join("\t".join(row) for row in reader))
+
+
+def read_csv_streaming(path: Path, max_rows, max_chars) -> int:
+    return len(table_processor.analyze_csv_content(path.read_bytes(), max_rows=max_rows, max_chars=max_chars))
+
+
+def run_case(target, path, max_rows, max_chars, queue) -> None:
+    baseline = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    start = time.perf_counter()
+    length = target(path, max_rows, max_chars)
+    elapsed = time.perf_counter() - start
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    queue.put((length, elapsed, peak, peak - baseline))
+
+
+def measure(target, path: Path, max_rows, max_chars) -> tuple[int, float, int, int]:
+    queue = multiprocessing.Queue()
+    process = multiprocessing.Process(target=run_case, args=(target, path, max_rows, max_chars, queue))
+    process.start()
+    result = queue.get()
+    process.join()
+    return result
+
+
+def main(rows: int, max_rows, max_chars) -> None:
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        xlsx_path = Path(tmp_dir) / 'bench.xlsx'
+        csv_path = Path(tmp_dir) / 'bench.csv'
+        generate_xlsx(xlsx_path, rows)
+        generate_csv(csv_path, rows)
+        print(f'rows: {rows}, xlsx: {xlsx_path.stat().st_size / 1e6:.1f}MB, csv: {csv_path.stat().st_size / 1e6:.1f}MB')
+        print(f'max_rows: {max_rows}, max_chars: {max_chars}')
+
+        cases = [
+            ('xlsx full', read_xlsx_full, xlsx_path),
+            ('xlsx streaming', read_xlsx_streaming, xlsx_path),
+            ('csv full', read_csv_full, csv_path),
+            ('csv streaming', read_csv_streaming, csv_path),
+        ]
+        print(f'{"case":<16}{"chars":>12}{"seconds":>10}{"peak RSS(MB)":>14}{"delta(MB)":>12}')
+        for name, target, path in cases:
+            length, elapsed, peak, delta = measure(target, path, max_rows, max_chars)
+            # ru_maxrss は Linux では KB 単位
+            print(f'{name:<16}{length:>12}{elapsed:>10.2f}{peak / 1024:>14.1f}{delta / 1024:>12.1f}')
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--rows', type=int, default=200_000, help='生成する行数')
+    parser.add_argument('--max-rows', type=int, default=None, help='ストリーミング読み込み時の最大行数')
+    parser.add_argument('--max-chars', type=int, default=None, help='ストリーミング読み込み時の最大文字数')
+    args = parser.parse_args()
+    main(args.rows, args.max_rows, args.max_chars)
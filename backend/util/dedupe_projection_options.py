@@ -0,0 +1,74 @@
+"""
+ランダムなIDで保存された `option` ドキュメントを (file_uuid, page_number, 事業の範囲, 期間) 単位に統合し、
+期間ごとの代表値 (`projection/period/year/{y}/month/{m}` の `canonical`) を作成する。
+
+```sh
+poetry run python -m util.dedupe_projection_options --dry-run
+poetry run python -m util.dedupe_projection_options
+```
+"""
+
+import argparse
+from collections import defaultdict
+
+from src.core.services import projection_option
+from src.core.services.firebase_client import FirebaseClient
+
+BATCH_SIZE = 400
+
+
+def dedupe_month(firestore_client, month_ref, docs: list, dry_run: bool) -> int:
+    """1か月分の option を統合し、削除したドキュメント数を返す"""
+    year = month_ref.parent.parent.id
+    month = month_ref.id
+
+    merged = {}
+    for doc in docs:
+        option = doc.to_dict()
+        option_id = projection_option.get_option_id(option, year, month)
+        merged[option_id] = projection_option.merge_option_values(merged.get(option_id), option)
+
+    stale_refs = [doc.reference for doc in docs if doc.id not in merged]
+    if dry_run:
+        return len(stale_refs)
+
+    operations = [('set', month_ref.collection('option').document(option_id), option) for option_id, option in merged.items()]
+    operations += [('delete', doc_ref, None) for doc_ref in stale_refs]
+    for start in range(0, len(operations), BATCH_SIZE):
+        batch = firestore_client.batch()
+        for operation, doc_ref, data in operations[start : start + BATCH_SIZE]:
+            if operation == 'set':
+                batch.set(doc_ref, data)
+            else:
+                batch.delete(doc_ref)
+        batch.commit()
+
+    projection_option.rebuild_canonical(month_ref)
+    return len(stale_refs)
+
+
+def main(dry_run: bool) -> None:
+    FirebaseClient.initialize_firebase()
+    firestore_client = FirebaseClient.get_firestore()
+
+    docs_by_month = defaultdict(list)
+    month_refs = {}
+    for doc in firestore_client.collection_group('option').stream():
+        month_ref = doc.reference.parent.parent
+        docs_by_month[month_ref.path].append(doc)
+        month_refs[month_ref.path] = month_ref
+
+    total_removed = 0
+    for path, docs in docs_by_month.items():
+        removed = dedupe_month(firestore_client, month_refs[path], docs, dry_run)
+        total_removed += removed
+        print(f'{path}: {len(docs)} options, {removed} duplicates {"to remove" if dry_run else "removed"}')
+
+    print(f'periods: {len(docs_by_month)}, duplicates: {total_removed}')
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--dry-run', action='store_true', help='統合対象の件数のみ表示する')
+    args = parser.parse_args()
+    main(args.dry_run)
@@ -0,0 +1,1084 @@
+"""
+ベンチマーク・負荷試験用の外部サービス（Firestore・Storage・Cloud Tasks・OpenAI・Weaviate）のインメモリ実装。
+呼び出し回数を CallCounter で数え、latency_ms を指定するとネットワークの往復時間として待機する。
+
+```python
+from util import fake_backends
+
+backends = fake_backends.FakeBackends.create(
+    firestore_latency_ms=5, openai=fake_backends.FakeOpenAIConfig(latency_ms=800)
+)
+fake_backends.install(app, backends)  # イベントループの中で呼ぶ
+```
+"""
+
+import asyncio
+import contextvars
+import copy
+import itertools
+import json
+import os
+import random
+import threading
+import time
+import typing
+import uuid
+from collections import Counter, defaultdict
+from contextlib import contextmanager
+from dataclasses import dataclass, field
+from datetime import date, datetime, timezone
+from decimal import Decimal
+from enum import Enum
+from typing import Any, Iterator, Optional
+from urllib.parse import urlsplit
+
+# src.settings は import 時に環境変数を読むため、未設定の値はダミーで埋める
+OFFLINE_ENV = {
+    'OPENAI_API_KEY': 'sk-offline',
+    'OPENAI_PROJECT_ID': 'offline',
+    'OPENAI_ORGANIZATION_ID': 'offline',
+    'WEAVIATE_URL': 'http://weaviate.offline',
+    'WEAVIATE_API_KEY': 'offline',
+    'FIREBASE_AUTH_SECRET_KEY': 'offline',
+    'GOOGLE_CLOUD_PROJECT_ID': 'offline',
+    'GOOGLE_CLOUD_LOCATION_ID': 'offline',
+    'GOOGLE_CLOUD_QUEUE_ID': 'offline',
+    'GOOGLE_CLOUD_API_BASE_URL': 'http://api.offline',
+}
+for _key, _value in OFFLINE_ENV.items():
+    os.environ.setdefault(_key, _value)
+
+from google.api_core import exceptions as google_exceptions  # noqa: E402
+from google.cloud import firestore  # noqa: E402
+from pydantic import BaseModel  # noqa: E402
+
+from src.repositories.abstract import DocumentRepository  # noqa: E402
+from src.schemas.documents import Documents  # noqa: E402
+
+
+def sleep_ms(latency_ms: float) -> None:
+    if latency_ms > 0:
+        time.sleep(latency_ms / 1000)
+
+
+class CallCounter:
+    """
+    外部サービスの呼び出し回数を (サービス, 操作) ごとに数える
+    scope() の中では、そのリクエスト（タスク）の呼び出しだけを別に数える
+    """
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.totals: Counter = Counter()
+        self._scope: contextvars.ContextVar[Optional[Counter]] = contextvars.ContextVar('call_scope', default=None)
+
+    def record(self, service: str, operation: str) -> None:
+        key = (service, operation)
+        with self.lock:
+            self.totals[key] += 1
+            scoped = self._scope.get()
+            if scoped is not None:
+                scoped[key] += 1
+
+    @contextmanager
+    def scope(self) -> Iterator[Counter]:
+        calls: Counter = Counter()
+        token = self._scope.set(calls)
+        try:
+            yield calls
+        finally:
+            self._scope.reset(token)
+
+    def by_service(self, calls: Optional[Counter] = None) -> dict[str, int]:
+        result: dict[str, int] = defaultdict(int)
+        for (service, _), count in (self.totals if calls is None else calls).items():
+            result[service] += count
+        return dict(result)
+
+    def reset(self) -> None:
+        with self.lock:
+            self.totals.clear()
+
+
+# ===== Firestore =====
+
+
+def resolve_path(data: dict, field_path: str) -> Any:
+    value: Any = data
+    for part in field_path.split('.'):
+        if not isinstance(value, dict) or part not in value:
+            return None
+        value = value[part]
+    return value
+
+
+def apply_value(current: Any, value: Any) -> Any:
+    """SERVER_TIMESTAMP・ArrayUnion・Increment などの特殊な値を解決する"""
+    if value is firestore.SERVER_TIMESTAMP:
+        return datetime.now(tz=timezone.utc)
+    if isinstance(value, firestore.ArrayUnion):
+        values = list(current or [])
+        return values + [item for item in value.values if item not in values]
+    if isinstance(value, firestore.ArrayRemove):
+        return [item for item in (current or []) if item not in value.values]
+    if isinstance(value, firestore.Increment):
+        return (current or 0) + value.value
+    if isinstance(value, dict):
+        return {key: apply_value(None, item) for key, item in value.items()}
+    return copy.deepcopy(value)
+
+
+def merge_data(current: dict, changes: dict) -> dict:
+    """set(merge=True) と同様に、マップは再帰的にマージする"""
+    merged = dict(current)
+    for key, value in changes.items():
+        if value is firestore.DELETE_FIELD:
+            merged.pop(key, None)
+        elif isinstance(value, dict) and isinstance(merged.get(key), dict):
+            merged[key] = merge_data(merged[key], value)
+        else:
+            merged[key] = apply_value(merged.get(key), value)
+    return merged
+
+
+def update_data(current: dict, changes: dict) -> dict:
+    """update() と同様に、ドット区切りのキーは入れ子のフィールドとして扱う"""
+    updated = copy.deepcopy(current)
+    for key, value in changes.items():
+        *parents, leaf = key.split('.')
+        target = updated
+        for parent in parents:
+            target = target.setdefault(parent, {})
+        if value is firestore.DELETE_FIELD:
+            target.pop(leaf, None)
+        else:
+            target[leaf] = apply_value(target.get(leaf), value)
+    return updated
+
+
+def matches(value: Any, op: str, expected: Any) -> bool:
+    if op == '==':
+        return value == expected
+    if op == '!=':
+        return value is not None and value != expected
+    if op == 'in':
+        return value in expected
+    if op == 'not-in':
+        return value is not None and value not in expected
+    if op == 'array_contains':
+        return isinstance(value, list) and expected in value
+    if op == 'array_contains_any':
+        return isinstance(value, list) and any(item in value for item in expected)
+    if value is None:
+        return False
+    try:
+        return {'<': value < expected, '<=': value <= expected, '>': value > expected, '>=': value >= expected}[op]
+    except TypeError:
+        return False
+
+
+class FakeDocumentSnapshot:
+    def __init__(self, reference: 'FakeDocumentReference', data: Optional[dict], update_time: Optional[datetime]):
+        self.reference = reference
+        self.id = reference.id
+        self._data = data
+        self.exists = data is not None
+        self.create_time = update_time
+        self.update_time = update_time
+        self.read_time = datetime.now(tz=timezone.utc)
+
+    def to_dict(self) -> Optional[dict]:
+        return copy.deepcopy(self._data) if self._data is not None else None
+
+    def get(self, field_path: str) -> Any:
+        return copy.deepcopy(resolve_path(self._data or {}, field_path))
+
+
+class FakeWatch:
+    def __init__(self, client: 'FakeFirestore', path: str, callback):
+        self.client = client
+        self.path = path
+        self.callback = callback
+
+    def unsubscribe(self) -> None:
+        self.client.listeners[self.path].discard(self)
+
+
+class FakeDocumentReference:
+    def __init__(self, client: 'FakeFirestore', path: str):
+        self._client = client
+        self.path = path
+        self.id = path.rsplit('/', 1)[-1]
+
+    @property
+    def parent(self) -> 'FakeCollectionReference':
+        return FakeCollectionReference(self._client, self.path.rsplit('/', 1)[0])
+
+    def collection(self, name: str) -> 'FakeCollectionReference':
+        return FakeCollectionReference(self._client, f'{self.path}/{name}')
+
+    def get(self, field_paths=None, transaction=None) -> FakeDocumentSnapshot:
+        self._client.call('document.get')
+        return self._client.snapshot(self.path)
+
+    def set(self, document_data: dict, merge: bool = False) -> None:
+        self._client.call('document.set')
+        self._client.write(self.path, 'set', document_data, merge=merge)
+
+    def create(self, document_data: dict) -> None:
+        self._client.call('document.create')
+        self._client.write(self.path, 'create', document_data)
+
+    def update(self, field_updates: dict) -> None:
+        self._client.call('document.update')
+        self._client.write(self.path, 'update', field_updates)
+
+    def delete(self) -> None:
+        self._client.call('document.delete')
+        self._client.write(self.path, 'delete')
+
+    def on_snapshot(self, callback) -> FakeWatch:
+        watch = FakeWatch(self._client, self.path, callback)
+        self._client.listeners[self.path].add(watch)
+        callback([self._client.snapshot(self.path)], [], datetime.now(tz=timezone.utc))
+        return watch
+
+
+class FakeQuery:
+    def __init__(self, client: 'FakeFirestore', collection_path: str):
+        self._client = client
+        self._collection_path = collection_path
+        self._filters: list[tuple[str, str, Any]] = []
+        self._orders: list[tuple[str, str]] = []
+        self._limit: Optional[int] = None
+        self._offset = 0
+
+    def _copy(self) -> 'FakeQuery':
+        query = copy.copy(self)
+        query._filters = list(self._filters)
+        query._orders = list(self._orders)
+        return query
+
+    def where(self, field_path=None, op_string=None, value=None, *, filter=None) -> 'FakeQuery':
+        query = self._copy()
+        if filter is not None:
+            field_path, op_string, value = filter.field_path, filter.op_string, filter.value
+        query._filters.append((field_path, op_string, value))
+        return query
+
+    def order_by(self, field_path: str, direction: str = 'ASCENDING') -> 'FakeQuery':
+        query = self._copy()
+        query._orders.append((field_path, direction))
+        return query
+
+    def limit(self, count: int) -> 'FakeQuery':
+        query = self._copy()
+        query._limit = count
+        return query
+
+    def offset(self, count: int) -> 'FakeQuery':
+        query = self._copy()
+        query._offset = count
+        return query
+
+    def select(self, field_paths) -> 'FakeQuery':
+        return self._copy()
+
+    def stream(self, transaction=None) -> Iterator[FakeDocumentSnapshot]:
+        self._client.call('query.stream')
+        yield from self._run()
+
+    def get(self, transaction=None) -> list[FakeDocumentSnapshot]:
+        self._client.call('query.get')
+        return self._run()
+
+    def _run(self) -> list[FakeDocumentSnapshot]:
+        snapshots = [
+            snapshot
+            for snapshot in self._client.list_collection(self._collection_path)
+            if all(matches(resolve_path(snapshot._data, f), op, v) for f, op, v in self._filters)
+        ]
+        for field_path, direction in reversed(self._orders):
+
+            def sort_key(snapshot: FakeDocumentSnapshot, field_path: str = field_path):
+                value = resolve_path(snapshot._data, field_path)
+                return value is None, value
+
+            snapshots.sort(key=sort_key, reverse=direction == firestore.Query.DESCENDING)
+        snapshots = snapshots[self._offset:]
+        return snapshots[: self._limit] if self._limit is not None else snapshots
+
+
+class FakeCollectionReference(FakeQuery):
+    def __init__(self, client: 'FakeFirestore', path: str):
+        super().__init__(client, path)
+        self.path = path
+        self.id = path.rsplit('/', 1)[-1]
+
+    def document(self, document_id: Optional[str] = None) -> FakeDocumentReference:
+        return FakeDocumentReference(self._client, f'{self.path}/{document_id or uuid.uuid4().hex[:20]}')
+
+    def add(self, document_data: dict, document_id: Optional[str] = None):
+        reference = self.document(document_id)
+        reference.set(document_data)
+        return datetime.now(tz=timezone.utc), reference
+
+    def list_documents(self) -> list[FakeDocumentReference]:
+        self._client.call('collection.list_documents')
+        return [snapshot.reference for snapshot in self._client.list_collection(self.path)]
+
+
+class FakeWriteBatch:
+    def __init__(self, client: 'FakeFirestore'):
+        self._client = client
+        self._writes: list[tuple] = []
+
+    def set(self, reference: FakeDocumentReference, document_data: dict, merge: bool = False) -> None:
+        self._writes.append((reference.path, 'set', document_data, merge))
+
+    def create(self, reference: FakeDocumentReference, document_data: dict) -> None:
+        self._writes.append((reference.path, 'create', document_data, False))
+
+    def update(self, reference: FakeDocumentReference, field_updates: dict) -> None:
+        self._writes.append((reference.path, 'update', field_updates, False))
+
+    def delete(self, reference: FakeDocumentReference) -> None:
+        self._writes.append((reference.path, 'delete', None, False))
+
+    def commit(self) -> list:
+        self._client.call('batch.commit')
+        with self._client.lock:
+            for path, kind, data, merge in self._writes:
+                self._client.write(path, kind, data, merge=merge)
+        writes, self._writes = self._writes, []
+        return writes
+
+    def __len__(self) -> int:
+        return len(self._writes)
+
+
+class FakeTransaction(FakeWriteBatch):
+    """
+    firestore.transactional から呼ばれる内部メソッド（_begin・_commit・_rollback）を実装したトランザクション
+    クライアントごとのロックで直列に実行する
+    """
+
+    _max_attempts = 1
+    _read_only = False
+
+    def __init__(self, client: 'FakeFirestore'):
+        super().__init__(client)
+        self._id = None
+
+    @property
+    def in_progress(self) -> bool:
+        return self._id is not None
+
+    def _clean_up(self) -> None:
+        self._writes = []
+
+    def _begin(self, retry_id=None) -> None:
+        self._client.transaction_lock.acquire()
+        self._client.call('transaction.begin')
+        self._id = uuid.uuid4().bytes
+
+    def _commit(self) -> list:
+        try:
+            return self.commit()
+        finally:
+            self._finish()
+
+    def _rollback(self) -> None:
+        self._writes = []
+        self._finish()
+
+    def _finish(self) -> None:
+        if self._id is not None:
+            self._id = None
+            self._client.transaction_lock.release()
+
+    def get(self, reference):
+        if isinstance(reference, FakeQuery):
+            return iter(reference.get())
+        return iter([reference.get()])
+
+    def get_all(self, references):
+        return self._client.get_all(references)
+
+
+class FakeFirestore:
+    """google.cloud.firestore.Client のうち、このリポジトリで使っている機能のインメモリ実装"""
+
+    def __init__(self, counter: CallCounter, latency_ms: float = 0):
+        self.counter = counter
+        self.latency_ms = latency_ms
+        self.lock = threading.RLock()
+        self.transaction_lock = threading.Lock()
+        # コレクションのパスごとに {ドキュメントID: (データ, 更新時刻)} を持つ
+        self.collections: dict[str, dict[str, tuple[dict, datetime]]] = defaultdict(dict)
+        self.listeners: dict[str, set[FakeWatch]] = defaultdict(set)
+
+    def call(self, operation: str) -> None:
+        self.counter.record('firestore', operation)
+        sleep_ms(self.latency_ms)
+
+    def collection(self, name: str) -> FakeCollectionReference:
+        return FakeCollectionReference(self, name)
+
+    def document(self, path: str) -> FakeDocumentReference:
+        return FakeDocumentReference(self, path)
+
+    def batch(self) -> FakeWriteBatch:
+        return FakeWriteBatch(self)
+
+    def transaction(self, **kwargs) -> FakeTransaction:
+        return FakeTransaction(self)
+
+    def get_all(self, references, field_paths=None, transaction=None) -> Iterator[FakeDocumentSnapshot]:
+        self.call('get_all')
+        for reference in list(references):
+            yield self.snapshot(reference.path)
+
+    def snapshot(self, path: str) -> FakeDocumentSnapshot:
+        collection_path, document_id = path.rsplit('/', 1)
+        with self.lock:
+            stored = self.collections[collection_path].get(document_id)
+        data, update_time = stored if stored else (None, None)
+        return FakeDocumentSnapshot(FakeDocumentReference(self, path), copy.deepcopy(data), update_time)
+
+    def list_collection(self, collection_path: str) -> list[FakeDocumentSnapshot]:
+        with self.lock:
+            items = list(self.collections[collection_path].items())
+        return [
+            FakeDocumentSnapshot(FakeDocumentReference(self, f'{collection_path}/{document_id}'), data, update_time)
+            for document_id, (data, update_time) in items
+        ]
+
+    def write(self, path: str, kind: str, data: Optional[dict] = None, merge: bool = False) -> None:
+        collection_path, document_id = path.rsplit('/', 1)
+        with self.lock:
+            documents = self.collections[collection_path]
+            current = documents.get(document_id)
+            if kind == 'delete':
+                documents.pop(document_id, None)
+            elif kind == 'update':
+                if current is None:
+                    raise google_exceptions.NotFound(f'No document to update: {path}')
+                documents[document_id] = (update_data(current[0], data), datetime.now(tz=timezone.utc))
+            elif kind == 'create' and current is not None:
+                raise google_exceptions.Conflict(f'Document already exists: {path}')
+            else:
+                base = current[0] if current is not None and merge else {}
+                documents[document_id] = (merge_data(base, data), datetime.now(tz=timezone.utc))
+            listeners = list(self.listeners.get(path, ()))
+        for watch in listeners:
+            watch.callback([self.snapshot(path)], [], datetime.now(tz=timezone.utc))
+
+    def count_documents(self) -> int:
+        with self.lock:
+            return sum(len(documents) for documents in self.collections.values())
+
+
+# ===== Storage =====
+
+
+class FakeBlob:
+    def __init__(self, bucket: 'FakeBucket', name: str):
+        self.bucket = bucket
+        self.name = name
+        self.metadata: Optional[dict] = None
+        self.content_type: Optional[str] = None
+        self.generation: Optional[int] = None
+        self.size: Optional[int] = None
+        self.updated: Optional[datetime] = None
+        self.public_url = f'https://storage.offline/{name}'
+
+    def _load(self, stored: dict) -> 'FakeBlob':
+        self.metadata = dict(stored['metadata']) if stored['metadata'] else None
+        self.content_type = stored['content_type']
+        self.generation = stored['generation']
+        self.size = len(stored['data'])
+        self.updated = stored['updated']
+        return self
+
+    def upload_from_string(self, data, content_type: Optional[str] = None, **kwargs) -> None:
+        self.bucket.call('blob.upload')
+        self.bucket.put(self, data.encode('utf-8') if isinstance(data, str) else bytes(data), content_type)
+
+    def upload_from_file(self, file_obj, content_type: Optional[str] = None, rewind: bool = False, **kwargs) -> None:
+        self.bucket.call('blob.upload')
+        if rewind:
+            file_obj.seek(0)
+        self.bucket.put(self, file_obj.read(), content_type)
+
+    def download_as_bytes(self, **kwargs) -> bytes:
+        self.bucket.call('blob.download')
+        stored = self.bucket.objects.get(self.name)
+        if stored is None:
+            raise google_exceptions.NotFound(f'No such object: {self.name}')
+        return stored['data']
+
+    def download_as_text(self, **kwargs) -> str:
+        return self.download_as_bytes().decode('utf-8')
+
+    def exists(self, **kwargs) -> bool:
+        self.bucket.call('blob.exists')
+        return self.name in self.bucket.objects
+
+    def reload(self, **kwargs) -> None:
+        self.bucket.call('blob.reload')
+        stored = self.bucket.objects.get(self.name)
+        if stored is None:
+            raise google_exceptions.NotFound(f'No such object: {self.name}')
+        self._load(stored)
+
+    def patch(self, **kwargs) -> None:
+        self.bucket.call('blob.patch')
+        if self.name in self.bucket.objects:
+            self.bucket.objects[self.name]['metadata'] = dict(self.metadata or {})
+
+    def delete(self, **kwargs) -> None:
+        self.bucket.call('blob.delete')
+        self.bucket.objects.pop(self.name, None)
+
+    def make_public(self, **kwargs) -> None:
+        self.bucket.call('blob.make_public')
+
+    def generate_signed_url(self, expiration=None, method: str = 'GET', version: str = 'v4', **kwargs) -> str:
+        # 署名はローカルで計算され Storage への通信は発生しないため、別のサービスとして数え、待機もしない
+        self.bucket.counter.record('signing', 'blob.generate_signed_url')
+        return f'https://storage.offline/{self.name}?X-Goog-Signature=offline'
+
+
+class FakeBlobIterator:
+    """list_blobs の戻り値（ページ単位の取得と next_page_token）"""
+
+    def __init__(self, blobs: list[FakeBlob], max_results: Optional[int], next_page_token: Optional[str]):
+        self._blobs = blobs
+        self.max_results = max_results
+        self.next_page_token = next_page_token
+
+    @property
+    def pages(self) -> Iterator[list[FakeBlob]]:
+        yield self._blobs
+
+    def __iter__(self) -> Iterator[FakeBlob]:
+        return iter(self._blobs)
+
+
+class FakeBucket:
+    """google.cloud.storage.Bucket のインメモリ実装"""
+
+    def __init__(self, counter: CallCounter, latency_ms: float = 0):
+        self.counter = counter
+        self.latency_ms = latency_ms
+        self.name = 'offline.appspot.com'
+        self.objects: dict[str, dict] = {}
+        self.generations = itertools.count(1)
+
+    def call(self, operation: str) -> None:
+        self.counter.record('storage', operation)
+        sleep_ms(self.latency_ms)
+
+    def put(self, blob: FakeBlob, data: bytes, content_type: Optional[str]) -> None:
+        self.objects[blob.name] = {
+            'data': data,
+            'content_type': content_type,
+            'metadata': dict(blob.metadata or {}),
+            'generation': next(self.generations),
+            'updated': datetime.now(tz=timezone.utc),
+        }
+        blob._load(self.objects[blob.name])
+
+    def blob(self, name: str) -> FakeBlob:
+        return FakeBlob(self, name)
+
+    def get_blob(self, name: str) -> Optional[FakeBlob]:
+        self.call('bucket.get_blob')
+        stored = self.objects.get(name)
+        return FakeBlob(self, name)._load(stored) if stored else None
+
+    def list_blobs(
+        self,
+        prefix: str = '',
+        max_results: Optional[int] = None,
+        page_token: Optional[str] = None,
+        **kwargs,
+    ) -> FakeBlobIterator:
+        self.call('bucket.list_blobs')
+        names = sorted(name for name in list(self.objects) if name.startswith(prefix))
+        start = int(page_token) if page_token else 0
+        end = len(names) if max_results is None else start + max_results
+        blobs = [FakeBlob(self, name)._load(self.objects[name]) for name in names[start:end] if name in self.objects]
+        return FakeBlobIterator(blobs, max_results, str(end) if end < len(names) else None)
+
+
+# ===== Cloud Tasks =====
+
+
+class FakeCloudTasksClient:
+    """
+    tasks_v2.CloudTasksClient のインメモリ実装
+    登録されたタスクは asyncio のキューに入り、TaskDeliverer がアプリケーションに POST する
+    """
+
+    def __init__(self, counter: CallCounter, loop: Optional[asyncio.AbstractEventLoop] = None):
+        self.counter = counter
+        self.loop = loop
+        self.queue: asyncio.Queue = asyncio.Queue()
+        self.names: set[str] = set()
+        self.lock = threading.Lock()
+
+    @staticmethod
+    def queue_path(project: str, location: str, queue: str) -> str:
+        return f'projects/{project}/locations/{location}/queues/{queue}'
+
+    def create_task(self, parent: str, task: dict, **kwargs) -> dict:
+        self.counter.record('cloud_tasks', 'create_task')
+        name = task.get('name')
+        with self.lock:
+            if name and name in self.names:
+                raise google_exceptions.AlreadyExists(f'Task already exists: {name}')
+            if name:
+                self.names.add(name)
+        http_request = task['http_request']
+        item = (urlsplit(http_request['url']).path, json.loads(http_request['body']))
+        self.loop.call_soon_threadsafe(self.queue.put_nowait, item)
+        return task
+
+    def list_tasks(self, parent: str, **kwargs) -> list:
+        self.counter.record('cloud_tasks', 'list_tasks')
+        return [None] * self.queue.qsize()
+
+
+@dataclass
+class TaskRecord:
+    path: str
+    file_uuid: Optional[str]
+    status_code: int
+    seconds: float
+    attempt: int
+    finished_at: float
+
+
+class TaskDeliverer:
+    """Cloud Tasks の代わりに、キューのタスクをアプリケーションへ POST する（2xx 以外は再試行する）"""
+
+    def __init__(
+        self,
+        app,
+        tasks_client: FakeCloudTasksClient,
+        workers: int,
+        max_attempts: int = 3,
+        retry_delay: float = 0.5,
+    ):
+        self.app = app
+        self.tasks_client = tasks_client
+        self.workers = workers
+        self.max_attempts = max_attempts
+        self.retry_delay = retry_delay
+        self.records: list[TaskRecord] = []
+        self.workers_tasks: list[asyncio.Task] = []
+        self.client = None
+
+    async def __aenter__(self) -> 'TaskDeliverer':
+        import httpx
+
+        self.client = httpx.AsyncClient(transport=httpx.ASGITransport(app=self.app), base_url='http://offline-tasks')
+        self.workers_tasks = [asyncio.create_task(self.work()) for _ in range(self.workers)]
+        return self
+
+    async def __aexit__(self, *exc_info) -> None:
+        for task in self.workers_tasks:
+            task.cancel()
+        await asyncio.gather(*self.workers_tasks, return_exceptions=True)
+        await self.client.aclose()
+
+    async def work(self) -> None:
+        queue = self.tasks_client.queue
+        while True:
+            item = await queue.get()
+            path, payload = item[:2]
+            attempt = item[2] if len(item) > 2 else 1
+            start = time.perf_counter()
+            try:
+                response = await self.client.post(path, json=payload, timeout=None)
+                status_code = response.status_code
+            except Exception:
+                status_code = 599
+            finished_at = time.perf_counter()
+            self.records.append(
+                TaskRecord(path, payload.get('file_uuid'), status_code, finished_at - start, attempt, finished_at)
+            )
+            if status_code >= 300 and attempt < self.max_attempts:
+                # 再登録してから task_done を呼ぶため、再試行の待機中に join() は終わらない
+                await asyncio.sleep(self.retry_delay * attempt)
+                queue.put_nowait((path, payload, attempt + 1))
+            queue.task_done()
+
+    async def join(self) -> None:
+        await self.tasks_client.queue.join()
+
+
+# ===== OpenAI =====
+
+
+def sample_value(annotation: Any, rng: random.Random, name: str = '', list_items: int = 1) -> Any:
+    """型ヒントから、それらしい値を作る（Structured Outputs の parsed の代わり）"""
+    origin = typing.get_origin(annotation)
+    args = typing.get_args(annotation)
+    if origin is typing.Union or type(annotation).__name__ == 'UnionType':
+        return sample_value(next(arg for arg in args if arg is not type(None)), rng, name, list_items)
+    if origin is typing.Literal:
+        return rng.choice(args)
+    if origin in (list, typing.List):
+        return [sample_value(args[0] if args else str, rng, name, list_items) for _ in range(list_items)]
+    if origin in (dict, typing.Dict):
+        return {}
+    if isinstance(annotation, type):
+        if issubclass(annotation, BaseModel):
+            return sample_model(annotation, rng, list_items)
+        if issubclass(annotation, Enum):
+            return rng.choice(list(annotation))
+        if issubclass(annotation, bool):
+            return rng.random() < 0.5
+        if issubclass(annotation, int):
+            ranges = {'year': (2020, 2024), 'month': (1, 12), 'quarter': (1, 4)}
+            return rng.randint(*ranges.get(name, (1, 1000)))
+        if issubclass(annotation, Decimal):
+            return Decimal(rng.randrange(1_000_000, 900_000_000))
+        if issubclass(annotation, float):
+            return round(rng.uniform(0, 100), 2)
+        if issubclass(annotation, date):
+            return date(rng.randint(1990, 2020), rng.randint(1, 12), rng.randint(1, 28))
+    return f'{name or "text"} の解析結果（オフライン）'
+
+
+def sample_model(model: type[BaseModel], rng: random.Random, list_items: int = 1) -> BaseModel:
+    data = {
+        name: sample_value(info.annotation, rng, name, list_items) for name, info in model.model_fields.items()
+    }
+    return model.model_validate(data)
+
+
+def sample_json_schema(schema: dict, rng: random.Random, name: str = '') -> Any:
+    if 'enum' in schema:
+        return rng.choice(schema['enum'])
+    schema_type = schema.get('type')
+    if isinstance(schema_type, list):
+        schema_type = next(item for item in schema_type if item != 'null')
+    if schema_type == 'object':
+        return {key: sample_json_schema(value, rng, key) for key, value in schema.get('properties', {}).items()}
+    if schema_type == 'array':
+        return [sample_json_schema(schema.get('items', {'type': 'string'}), rng, name)]
+    if schema_type == 'integer':
+        return rng.randint(1, 1000)
+    if schema_type == 'number':
+        return round(rng.uniform(0, 100), 2)
+    if schema_type == 'boolean':
+        return rng.random() < 0.5
+    return f'{name or "text"} の解析結果（オフライン）'
+
+
+class FakeUsage(BaseModel):
+    prompt_tokens: int
+    completion_tokens: int
+    total_tokens: int
+
+
+class FakeMessage(BaseModel):
+    role: str = 'assistant'
+    content: Optional[str] = None
+    parsed: Any = None
+
+
+class FakeDelta(BaseModel):
+    content: Optional[str] = None
+
+
+class FakeChoice(BaseModel):
+    index: int = 0
+    message: Optional[FakeMessage] = None
+    delta: Optional[FakeDelta] = None
+    finish_reason: Optional[str] = 'stop'
+
+
+class FakeCompletion(BaseModel):
+    id: str
+    model: str
+    choices: list[FakeChoice]
+    usage: Optional[FakeUsage] = None
+
+
+@dataclass
+class FakeOpenAIConfig:
+    latency_ms: float = 800
+    # 応答時間のばらつき（標準偏差 / 平均）
+    jitter: float = 0.3
+    prompt_tokens: int = 1200
+    # 画像1枚あたりの入力トークン数
+    image_tokens: int = 765
+    completion_tokens: int = 400
+    error_rate: float = 0.0
+    list_items: int = 1
+    seed: int = 0
+
+
+class FakeCompletions:
+    def __init__(self, owner: 'FakeOpenAI'):
+        self.owner = owner
+
+    def create(self, model: str, messages: list, response_format=None, stream: bool = False, **kwargs):
+        content = self.owner.content_for(response_format)
+        completion = self.owner.complete(model, messages, content)
+        if not stream:
+            return completion
+        return iter(
+            FakeCompletion(
+                id=completion.id,
+                model=model,
+                choices=[FakeChoice(delta=FakeDelta(content=chunk), message=None)],
+            )
+            for chunk in [content[i : i + 32] for i in range(0, len(content), 32)] or ['']
+        )
+
+    def parse(self, model: str, messages: list, response_format: type[BaseModel], **kwargs):
+        with self.owner.lock:
+            parsed = sample_model(response_format, self.owner.rng, self.owner.config.list_items)
+        completion = self.owner.complete(model, messages, parsed.model_dump_json())
+        completion.choices[0].message.parsed = parsed
+        return completion
+
+
+class FakeChat:
+    def __init__(self, owner: 'FakeOpenAI'):
+        self.completions = FakeCompletions(owner)
+
+
+class FakeBeta:
+    def __init__(self, owner: 'FakeOpenAI'):
+        self.chat = FakeChat(owner)
+
+
+class FakeOpenAI:
+    """openai.OpenAI のうち chat.completions.create / beta.chat.completions.parse のインメモリ実装"""
+
+    def __init__(self, counter: CallCounter, config: Optional[FakeOpenAIConfig] = None):
+        self.counter = counter
+        self.config = config or FakeOpenAIConfig()
+        self.rng = random.Random(self.config.seed)
+        self.lock = threading.Lock()
+        self.chat = FakeChat(self)
+        self.beta = FakeBeta(self)
+        self.tokens: Counter = Counter()
+
+    def content_for(self, response_format) -> str:
+        if isinstance(response_format, dict) and response_format.get('type') == 'json_schema':
+            with self.lock:
+                return json.dumps(sample_json_schema(response_format['json_schema']['schema'], self.rng))
+        if isinstance(response_format, dict) and response_format.get('type') == 'json_object':
+            return '{}'
+        return 'オフラインの応答です。' * 20
+
+    def complete(self, model: str, messages: list, content: str) -> FakeCompletion:
+        self.counter.record('openai', model)
+        images = sum(
+            1
+            for message in messages
+            if isinstance(message.get('content'), list)
+            for part in message['content']
+            if part.get('type') == 'image_url'
+        )
+        with self.lock:
+            latency_ms = max(0.0, self.rng.gauss(self.config.latency_ms, self.config.latency_ms * self.config.jitter))
+            failed = self.rng.random() < self.config.error_rate
+        sleep_ms(latency_ms)
+        if failed:
+            raise RuntimeError('offline OpenAI error (injected)')
+
+        prompt_tokens = self.config.prompt_tokens + images * self.config.image_tokens
+        completion_tokens = self.config.completion_tokens
+        with self.lock:
+            self.tokens[(model, 'prompt')] += prompt_tokens
+            self.tokens[(model, 'completion')] += completion_tokens
+        return FakeCompletion(
+            id=f'chatcmpl-{uuid.uuid4().hex[:12]}',
+            model=model,
+            choices=[FakeChoice(message=FakeMessage(content=content))],
+            usage=FakeUsage(
+                prompt_tokens=prompt_tokens,
+                completion_tokens=completion_tokens,
+                total_tokens=prompt_tokens + completion_tokens,
+            ),
+        )
+
+
+# ===== Weaviate =====
+
+
+class FakeWeaviateObject:
+    def __init__(self, properties: dict):
+        self.properties = properties
+        self.uuid = uuid.uuid4()
+
+
+class FakeQueryResult:
+    def __init__(self, objects: list[FakeWeaviateObject], generated: Optional[str] = None):
+        self.objects = objects
+        self.generated = generated
+
+
+class FakeWeaviateClient:
+    def __init__(self, counter: CallCounter):
+        self.counter = counter
+
+    def is_ready(self) -> bool:
+        return True
+
+    def close(self) -> None:
+        self.counter.record('weaviate', 'close')
+
+
+class FakeDocumentRepository(DocumentRepository):
+    """WeaviateDocumentRepository のインメモリ実装。検索は transcription の部分一致で行う"""
+
+    def __init__(self, counter: CallCounter, latency_ms: float = 0):
+        self.counter = counter
+        self.latency_ms = latency_ms
+        self.client = FakeWeaviateClient(counter)
+        self.items: list[dict] = []
+        self.lock = threading.Lock()
+
+    def call(self, operation: str) -> None:
+        self.counter.record('weaviate', operation)
+        sleep_ms(self.latency_ms)
+
+    def add_documents(self, docs: Documents) -> None:
+        self.call('add_documents')
+        with self.lock:
+            self.items.extend(item.model_dump() for item in docs.items)
+
+    def _search(self, query: str, user_id: str, project_id: str, file_uuid_list, limit: int) -> list:
+        with self.lock:
+            candidates = [
+                item
+                for item in self.items
+                if item['user_id'] == user_id
+                and item['project_id'] == project_id
+                and (not file_uuid_list or item['file_uuid'] in file_uuid_list)
+            ]
+        candidates.sort(key=lambda item: query not in item['transcription'])
+        return [FakeWeaviateObject(item) for item in candidates[:limit]]
+
+    def search_documents(self, query, user_id, project_id, file_uuid_list=None, limit=8):
+        self.call('search')
+        return FakeQueryResult(self._search(query, user_id, project_id, file_uuid_list, limit))
+
+    def search_documents_and_generate_response(
+        self, query, user_id, project_id, grouped_task, file_uuid_list=None, limit=5
+    ):
+        self.call('generate')
+        return FakeQueryResult(
+            self._search(query, user_id, project_id, file_uuid_list, limit), generated='オフラインの応答です。'
+        )
+
+
+# ===== アプリケーションへの組み込み =====
+
+
+class FakeFirebaseClient:
+    """FirebaseClient の代わり（get_firebase_client の依存関数を差し替える）"""
+
+    def __init__(self, firestore_client: FakeFirestore, bucket: FakeBucket, user_ids: Optional[dict] = None):
+        self.firestore_client = firestore_client
+        self.bucket = bucket
+        # トークン → user_id（負荷試験では `Bearer <user_id>` をそのまま使う）
+        self.user_ids = user_ids or {}
+
+    def get_firestore(self) -> FakeFirestore:
+        return self.firestore_client
+
+    def get_storage(self) -> FakeBucket:
+        return self.bucket
+
+    def verify_token(self, token: str) -> str:
+        return self.user_ids.get(token, token)
+
+
+@dataclass
+class FakeBackends:
+    counter: CallCounter
+    firestore: FakeFirestore
+    bucket: FakeBucket
+    openai: FakeOpenAI
+    documents: FakeDocumentRepository
+    tasks: FakeCloudTasksClient
+    firebase: FakeFirebaseClient = field(init=False)
+
+    def __post_init__(self):
+        self.firebase = FakeFirebaseClient(self.firestore, self.bucket)
+
+    @classmethod
+    def create(
+        cls,
+        firestore_latency_ms: float = 0,
+        storage_latency_ms: float = 0,
+        weaviate_latency_ms: float = 0,
+        openai: Optional[FakeOpenAIConfig] = None,
+    ) -> 'FakeBackends':
+        counter = CallCounter()
+        return cls(
+            counter=counter,
+            firestore=FakeFirestore(counter, firestore_latency_ms),
+            bucket=FakeBucket(counter, storage_latency_ms),
+            openai=FakeOpenAI(counter, openai),
+            documents=FakeDocumentRepository(counter, weaviate_latency_ms),
+            tasks=FakeCloudTasksClient(counter),
+        )
+
+
+def install(app, backends: FakeBackends, task_concurrency: int = 16):
+    """
+    アプリケーションの依存関数をフェイクに差し替える
+    タスクは実際の CloudTasksDispatcher からフェイクの Cloud Tasks に登録される
+    """
+    from src.core.services import firebase_client
+    from src.core.services.worker import dispatcher
+    from src.dependencies import cloud_tasks, document_repository, external, weaviate_client
+
+    backends.tasks.loop = asyncio.get_running_loop()
+    queue_path = backends.tasks.queue_path('offline', 'offline', 'offline')
+    task_dispatcher = dispatcher.CloudTasksDispatcher(backends.tasks, queue_path, concurrency=task_concurrency)
+
+    app.dependency_overrides.update(
+        {
+            firebase_client.get_firebase_client: lambda: backends.firebase,
+            external.get_openai_client: lambda: backends.openai,
+            document_repository.get_document_repository: lambda: backends.documents,
+            weaviate_client.get_weaviate_client: lambda: backends.documents.client,
+            cloud_tasks.get_task_dispatcher: lambda: task_dispatcher,
+            cloud_tasks.get_cloud_tasks_client: lambda: backends.tasks,
+        }
+    )
+    # 依存関数を経由しない呼び出し（FirebaseClient のクラスメソッド）も差し替える
+    firebase_client.FirebaseClient._firestore = backends.firestore
+    firebase_client.FirebaseClient._storage = backends.bucket
+    return task_dispatcher
+
+
+def install_offline_auth(app) -> None:
+    """
+    Firebase Auth の代わりに `Authorization: Bearer <user_id>` をそのまま user_id として扱う
+    （負荷試験でユーザーを切り替えるため）
+    """
+    from fastapi import HTTPException, Request
+
+    from src.dependencies import auth
+
+    def get_user_id(request: Request) -> str:
+        authorization = request.headers.get('Authorization')
+        if not authorization or not authorization.startswith('Bearer '):
+            raise HTTPException(status_code=401, detail='Authorization header missing or invalid format')
+        return authorization.split('Bearer ')[1]
+
+    app.dependency_overrides[auth.get_user_id] = get_user_id
@@ -0,0 +1,340 @@
+"""
+ダッシュボードで頻繁に呼ばれる読み込み系エンドポイントの負荷試験（外部サービスはすべてフェイク）。
+実際の規模に近いデータを投入したプロジェクトに対し、仮想ユーザーが重み付きのシナリオでリクエストを送り続け、
+エンドポイントごとの RPS・p50 / p95 / p99 と、1リクエストあたりの Firestore・Storage の呼び出し回数を表示する。
+
+N+1 の検知のため、次の場合は終了コード 1 で終了する。
+- 1リクエストあたりの呼び出し回数が CALL_BUDGETS を超えた
+- 小さいプロジェクトと大きいプロジェクトで、1リクエストあたりの呼び出し回数が変わった（データ量に比例して増えている）
+
+```sh
+poetry run python -m util.load_dashboard
+poetry run python -m util.load_dashboard --users 20 --documents 50 --pages 30 --concurrency 32 --duration 60
+poetry run python -m util.load_dashboard --firestore-latency-ms 8 --storage-latency-ms 25 --json result.json
+```
+"""
+
+import argparse
+import asyncio
+import json
+import logging
+import random
+import sys
+import time
+import uuid
+from collections import defaultdict
+from dataclasses import dataclass, field
+from typing import Callable
+
+from util import fake_backends
+from util.trace_report import percentile
+
+# 呼び出し回数の比較・上限の対象とするサービス（署名付きURLの生成は通信を伴わないため除く）
+NETWORK_SERVICES = ('firestore', 'storage', 'weaviate')
+
+
+@dataclass
+class SeededUser:
+    user_id: str
+    project_id: str
+    file_uuids: list[str]
+    years: list[int]
+
+
+@dataclass
+class Scenario:
+    name: str
+    weight: int
+    path: str
+    params: Callable[[SeededUser, random.Random], dict]
+    # 1リクエストあたりの呼び出し回数の上限（データ量によらず一定であるべき）
+    budget: dict[str, int]
+
+
+SCENARIOS = [
+    Scenario(
+        'projection_metrics',
+        3,
+        '/projection/profit_and_loss/metrics',
+        lambda user, rng: {'year': rng.choice(user.years)},
+        {'firestore': 2, 'storage': 0},
+    ),
+    Scenario('parameter_sales', 3, '/parameter/sales', lambda user, rng: {}, {'firestore': 2, 'storage': 0}),
+    Scenario(
+        'image_list',
+        2,
+        '/image/list',
+        lambda user, rng: {'file_uuid': rng.choice(user.file_uuids)},
+        {'firestore': 1, 'storage': 1},
+    ),
+    Scenario('chat_sessions', 2, '/retriever/chat/sessions', lambda user, rng: {}, {'firestore': 2, 'storage': 0}),
+    Scenario('data_document', 2, '/data/document', lambda user, rng: {}, {'firestore': 2, 'storage': 1}),
+]
+
+
+@dataclass
+class Sample:
+    seconds: float
+    status_code: int
+    calls: dict[str, int]
+
+
+@dataclass
+class ScenarioResult:
+    samples: list[Sample] = field(default_factory=list)
+
+
+def seed_user(
+    backends: fake_backends.FakeBackends,
+    user_id: str,
+    documents: int,
+    pages: int,
+    sessions: int,
+    messages: int,
+    rng: random.Random,
+) -> SeededUser:
+    """アップロード・解析の保存処理と同じ関数でデータを投入する"""
+    import src.core.services.firebase_driver as firebase_driver
+    from src.core.models.plan import SummaryProfitAndLoss
+    from src.core.services.endpoints import projection
+    from src.core.services.upload import pdf_processor
+
+    firestore_client = backends.firestore
+    project_id = f'{user_id}-project'
+    user_ref = firestore_client.collection('users').document(user_id)
+    user_ref.set({'email': f'{user_id}@example.com'})
+    projects_ref = user_ref.collection('projects')
+    projects_ref.document(project_id).set({'name': project_id, 'is_selected': True, 'is_archived': False})
+    for index in range(2):
+        projects_ref.document(f'{project_id}-archived-{index}').set(
+            {'name': f'archived {index}', 'is_selected': False, 'is_archived': True}
+        )
+
+    file_uuids = []
+    years = set()
+    for document_index in range(documents):
+        file_uuid = str(uuid.uuid4())
+        file_name = f'report-{document_index}.pdf'
+        file_uuids.append(file_uuid)
+        backends.bucket.blob(f'{user_id}/projects/{project_id}/documents/{file_uuid}_{file_name}').upload_from_string(
+            b'%PDF-1.4 offline', content_type='application/pdf'
+        )
+        firebase_driver.save_analysis_result(
+            firestore_client,
+            user_id,
+            file_name,
+            file_uuid,
+            fake_backends.sample_model(firebase_driver.AnalysisResult, rng),
+            target_collection='documents',
+        )
+        for page_number in range(pages):
+            backends.bucket.blob(
+                pdf_processor.get_page_image_path(user_id, project_id, file_uuid, page_number)
+            ).upload_from_string(b'\x89PNG offline', content_type='image/png')
+            firebase_driver.save_page_image_analysis(
+                firestore_client,
+                user_id,
+                file_uuid,
+                file_name,
+                str(uuid.uuid4()),
+                page_number,
+                fake_backends.sample_model(firebase_driver.BusinessSummary, rng),
+                explanation='explanation',
+                output='output',
+                opinion='opinion',
+            )
+            summary = fake_backends.sample_model(SummaryProfitAndLoss, rng)
+            projection.save_parameters(firestore_client, user_id, file_uuid, page_number, summary)
+            years.add(summary.period.year)
+
+    sessions_ref = projects_ref.document(project_id).collection('chat_sessions')
+    for session_index in range(sessions):
+        session_ref = sessions_ref.document()
+        session_ref.set(
+            {
+                'sessionName': f'session {session_index}',
+                'selectedFileUuids': rng.sample(file_uuids, min(3, len(file_uuids))),
+            }
+        )
+        for message_index in range(messages):
+            role = 'user' if message_index % 2 == 0 else 'assistant'
+            session_ref.collection('messages').add({'role': role, 'content': 'message', 'timestamp': time.time()})
+
+    return SeededUser(user_id=user_id, project_id=project_id, file_uuids=file_uuids, years=sorted(years))
+
+
+def build_app():
+    from fastapi import FastAPI
+
+    from src.core.routers import data, image, parameter, projection, retriever
+
+    app = FastAPI()
+    for router in (data.router, image.router, parameter.router, projection.router, retriever.router):
+        app.include_router(router)
+    return app
+
+
+def network_calls(calls) -> dict[str, int]:
+    result = defaultdict(int)
+    for (service, _), count in calls.items():
+        if service in NETWORK_SERVICES:
+            result[service] += count
+    return dict(result)
+
+
+async def send(client, backends, scenario: Scenario, user: SeededUser, rng: random.Random) -> Sample:
+    with backends.counter.scope() as calls:
+        start = time.perf_counter()
+        response = await client.get(
+            scenario.path, params=scenario.params(user, rng), headers={'Authorization': f'Bearer {user.user_id}'}
+        )
+        seconds = time.perf_counter() - start
+    return Sample(seconds=seconds, status_code=response.status_code, calls=network_calls(calls))
+
+
+async def check_call_growth(client, backends, small: SeededUser, large: SeededUser) -> list[str]:
+    """データ量の異なる2つのプロジェクトで呼び出し回数を比較し、上限を超えたもの・増えたものを返す"""
+    failures = []
+    for scenario in SCENARIOS:
+        # 集計ドキュメントの作成など、初回のみの処理を除くため1度呼んでから数える
+        await send(client, backends, scenario, small, random.Random(0))
+        await send(client, backends, scenario, large, random.Random(0))
+        small_sample = await send(client, backends, scenario, small, random.Random(0))
+        large_sample = await send(client, backends, scenario, large, random.Random(0))
+
+        for service in NETWORK_SERVICES:
+            small_calls = small_sample.calls.get(service, 0)
+            large_calls = large_sample.calls.get(service, 0)
+            if large_calls > small_calls:
+                failures.append(
+                    f'{scenario.name}: {service} calls grow with the data size ({small_calls} -> {large_calls})'
+                )
+            budget = scenario.budget.get(service)
+            if budget is not None and large_calls > budget:
+                failures.append(f'{scenario.name}: {large_calls} {service} calls per request > budget {budget}')
+    return failures
+
+
+async def virtual_user(client, backends, users, deadline: float, rng: random.Random, results) -> None:
+    weights = [scenario.weight for scenario in SCENARIOS]
+    while time.perf_counter() < deadline:
+        scenario = rng.choices(SCENARIOS, weights=weights)[0]
+        sample = await send(client, backends, scenario, rng.choice(users), rng)
+        results[scenario.name].samples.append(sample)
+
+
+async def run(args) -> dict:
+    import httpx
+
+    rng = random.Random(args.seed)
+    backends = fake_backends.FakeBackends.create()
+    app = build_app()
+    fake_backends.install(app, backends)
+    fake_backends.install_offline_auth(app)
+
+    seed_start = time.perf_counter()
+    users = [
+        seed_user(backends, f'load-user-{index}', args.documents, args.pages, args.sessions, args.messages, rng)
+        for index in range(args.users)
+    ]
+    small = seed_user(backends, 'load-user-small', 2, 2, 2, args.messages, rng)
+    print(
+        f'seeded {args.users} projects ({args.documents} documents x {args.pages} pages) and 1 small project'
+        f' in {time.perf_counter() - seed_start:.1f} s, {backends.firestore.count_documents()} Firestore documents'
+    )
+
+    # 投入後にネットワークの往復時間を設定する
+    backends.firestore.latency_ms = args.firestore_latency_ms
+    backends.bucket.latency_ms = args.storage_latency_ms
+    backends.counter.reset()
+
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url='http://offline-dashboard') as client:
+        failures = await check_call_growth(client, backends, small, users[0])
+
+        results = defaultdict(ScenarioResult)
+        start = time.perf_counter()
+        deadline = start + args.duration
+        await asyncio.gather(
+            *(
+                virtual_user(client, backends, users, deadline, random.Random(args.seed + index), results)
+                for index in range(args.concurrency)
+            )
+        )
+        elapsed = time.perf_counter() - start
+
+    report = {}
+    for scenario in SCENARIOS:
+        samples = results[scenario.name].samples
+        if not samples:
+            continue
+        milliseconds = [sample.seconds * 1000 for sample in samples]
+        errors = sum(1 for sample in samples if sample.status_code >= 400)
+        report[scenario.name] = {
+            'requests': len(samples),
+            'rps': len(samples) / elapsed,
+            'errors': errors,
+            'p50_ms': percentile(milliseconds, 0.5),
+            'p95_ms': percentile(milliseconds, 0.95),
+            'p99_ms': percentile(milliseconds, 0.99),
+            'calls_per_request': {
+                service: sum(sample.calls.get(service, 0) for sample in samples) / len(samples)
+                for service in NETWORK_SERVICES
+            },
+            'max_calls_per_request': {
+                service: max(sample.calls.get(service, 0) for sample in samples) for service in NETWORK_SERVICES
+            },
+        }
+        if errors:
+            failures.append(f'{scenario.name}: {errors} of {len(samples)} requests failed')
+        for service, budget in scenario.budget.items():
+            if report[scenario.name]['max_calls_per_request'][service] > budget:
+                failures.append(
+                    f"{scenario.name}: up to {report[scenario.name]['max_calls_per_request'][service]}"
+                    f' {service} calls per request > budget {budget}'
+                )
+
+    return {'elapsed_s': elapsed, 'scenarios': report, 'failures': failures}
+
+
+def print_report(result: dict) -> None:
+    print(
+        f"\n{'endpoint':<20} {'requests':>9} {'rps':>8} {'errors':>7} {'p50 ms':>9} {'p95 ms':>9} {'p99 ms':>9}"
+        f" {'firestore/req':>14} {'storage/req':>12}"
+    )
+    for name, row in result['scenarios'].items():
+        print(
+            f"{name:<20} {row['requests']:>9} {row['rps']:>8.1f} {row['errors']:>7} {row['p50_ms']:>9.1f}"
+            f" {row['p95_ms']:>9.1f} {row['p99_ms']:>9.1f} {row['calls_per_request']['firestore']:>14.2f}"
+            f" {row['calls_per_request']['storage']:>12.2f}"
+        )
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--users', type=int, default=5, help='投入するユーザー（プロジェクト）の数')
+    parser.add_argument('--documents', type=int, default=30, help='プロジェクトごとの資料の数')
+    parser.add_argument('--pages', type=int, default=20, help='資料ごとのページ数')
+    parser.add_argument('--sessions', type=int, default=20, help='プロジェクトごとのチャットセッションの数')
+    parser.add_argument('--messages', type=int, default=10, help='セッションごとのメッセージの数')
+    parser.add_argument('--concurrency', type=int, default=16, help='仮想ユーザーの数')
+    parser.add_argument('--duration', type=float, default=20, help='負荷をかける秒数')
+    parser.add_argument('--firestore-latency-ms', type=float, default=5)
+    parser.add_argument('--storage-latency-ms', type=float, default=20)
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--json', default=None, help='結果をJSONで保存するパス')
+    parser.add_argument('--log-level', default='WARNING')
+    args = parser.parse_args()
+
+    logging.basicConfig(level=args.log_level)
+    logging.getLogger().setLevel(args.log_level)
+
+    result = asyncio.run(run(args))
+    print_report(result)
+    if args.json:
+        with open(args.json, 'w', encoding='utf-8') as f:
+            json.dump(result, f, ensure_ascii=False, indent=2)
+
+    for failure in result['failures']:
+        print(f'FAILED: {failure}')
+    sys.exit(1 if result['failures'] else 0)
@@ -0,0 +1,99 @@
+"""
+文字列（str(Decimal) や "None"）で保存された指標を数値・null の形式に移行する。
+
+- `projection/period/year/{y}/month/{m}/option/*`: P&L と SaaS で共通の形式に変換する
+- `sales/*`: 予測・実績の値を数値に変換する
+- `projection/aggregate/year/*`: 旧形式の値から作られているため削除する（次回の読み込み時に作り直される）
+
+```sh
+poetry run python -m util.migrate_metric_storage --dry-run
+poetry run python -m util.migrate_metric_storage
+```
+"""
+
+import argparse
+
+from src.core.services import metric_codec
+from src.core.services.firebase_client import FirebaseClient
+from src.core.services.query import parameter_metrics
+
+BATCH_SIZE = 400
+
+
+class BatchWriter:
+    """バッチの上限を超えないように分割してコミットする"""
+
+    def __init__(self, firestore_client, dry_run: bool):
+        self.firestore_client = firestore_client
+        self.dry_run = dry_run
+        self.batch = firestore_client.batch()
+        self.pending = 0
+        self.total = 0
+
+    def set(self, doc_ref, data: dict) -> None:
+        self._add(lambda batch: batch.set(doc_ref, data))
+
+    def delete(self, doc_ref) -> None:
+        self._add(lambda batch: batch.delete(doc_ref))
+
+    def _add(self, operation) -> None:
+        self.total += 1
+        if self.dry_run:
+            return
+        operation(self.batch)
+        self.pending += 1
+        if self.pending >= BATCH_SIZE:
+            self.commit()
+
+    def commit(self) -> None:
+        if self.pending:
+            self.batch.commit()
+            self.batch = self.firestore_client.batch()
+            self.pending = 0
+
+
+def migrate_options(firestore_client, writer: BatchWriter) -> None:
+    for doc in firestore_client.collection_group('option').stream():
+        data = doc.to_dict() or {}
+        if data.get('schema_version') == metric_codec.SCHEMA_VERSION:
+            continue
+        writer.set(doc.reference, metric_codec.decode_option(data))
+
+
+def migrate_sales(firestore_client, writer: BatchWriter) -> None:
+    for doc in firestore_client.collection_group('sales').stream():
+        data = doc.to_dict() or {}
+        if data.get('schema_version') == metric_codec.SCHEMA_VERSION:
+            continue
+        converted = {column: metric_codec.to_number(data.get(column)) for column in parameter_metrics.VALUE_COLUMNS}
+        writer.set(doc.reference, {**data, **converted, 'schema_version': metric_codec.SCHEMA_VERSION})
+
+
+def delete_projection_aggregates(firestore_client, writer: BatchWriter) -> None:
+    for doc in firestore_client.collection_group('year').stream():
+        # projection/aggregate/year/{year} のみが対象
+        if doc.reference.parent.parent is None or doc.reference.parent.parent.id != 'aggregate':
+            continue
+        writer.delete(doc.reference)
+
+
+def main(dry_run: bool) -> None:
+    FirebaseClient.initialize_firebase()
+    firestore_client = FirebaseClient.get_firestore()
+
+    for name, migrate in [
+        ('option', migrate_options),
+        ('sales', migrate_sales),
+        ('projection aggregate', delete_projection_aggregates),
+    ]:
+        writer = BatchWriter(firestore_client, dry_run)
+        migrate(firestore_client, writer)
+        writer.commit()
+        print(f'{name}: {writer.total} documents {"to migrate" if dry_run else "migrated"}')
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--dry-run', action='store_true', help='移行対象の件数のみ表示する')
+    args = parser.parse_args()
+    main(args.dry_run)
@@ -0,0 +1,43 @@
+"""
+explorer のページ要約を旧形式の `pages` 配列から `page_summaries` サブコレクションへ移行する。
+
+```sh
+poetry run python -m util.migrate_page_summaries --dry-run
+poetry run python -m util.migrate_page_summaries
+```
+"""
+
+import argparse
+
+import src.core.services.firebase_driver as firebase_driver
+from src.core.services.firebase_client import FirebaseClient
+
+
+def main(dry_run: bool) -> None:
+    FirebaseClient.initialize_firebase()
+    firestore_client = FirebaseClient.get_firestore()
+
+    total_docs = 0
+    total_pages = 0
+    for doc in firestore_client.collection_group('documents').stream():
+        data = doc.to_dict() or {}
+        if not data.get('pages'):
+            continue
+
+        total_docs += 1
+        if dry_run:
+            print(f'{doc.reference.path}: {len(data["pages"])} array entries')
+            continue
+
+        migrated = firebase_driver.migrate_pages_array_to_subcollection(firestore_client, doc.reference)
+        total_pages += migrated
+        print(f'{doc.reference.path}: migrated {migrated} pages')
+
+    print(f'documents: {total_docs}, pages migrated: {total_pages}')
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--dry-run', action='store_true', help='移行対象の一覧のみ表示する')
+    args = parser.parse_args()
+    main(args.dry_run)
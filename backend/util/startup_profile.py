@@ -0,0 +1,154 @@
+"""
+`python -X importtime` で src.server の import にかかる時間を計測し、時間のかかっているモジュールを表示する。
+新しいプロセスで src.server を import するまでの時間（コールドスタート）を複数回計測し、中央値が予算を超えた場合や、
+起動時に読み込まないはずの重いモジュール（fitz・pandas など）が読み込まれた場合は終了コード 1 で終了する。
+
+```sh
+poetry run python -m util.startup_profile
+poetry run python -m util.startup_profile --runs 10 --budget-ms 1500 --top 30
+poetry run python -m util.startup_profile --forbid fitz pandas openpyxl --json result.json
+```
+"""
+
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import time
+from collections import defaultdict
+from dataclasses import dataclass
+
+from util.fake_backends import OFFLINE_ENV
+
+# 各エンドポイントの処理の中で import する重いモジュール。起動時に読み込まれていたら失敗にする
+LAZY_MODULES = ['fitz', 'pandas', 'openpyxl', 'PyPDF2', 'PIL', 'weaviate', 'google.cloud.tasks_v2']
+
+
+@dataclass
+class ImportTime:
+    name: str
+    self_us: int
+    cumulative_us: int
+    depth: int
+
+
+def build_env() -> dict:
+    env = {**OFFLINE_ENV, **os.environ}
+    env.pop('PYTHONPROFILEIMPORTTIME', None)
+    return env
+
+
+def parse_importtime(stderr: str) -> list[ImportTime]:
+    """`-X importtime` の出力（import time: self | cumulative | name）を読み込む"""
+    imports = []
+    for line in stderr.splitlines():
+        if not line.startswith('import time:') or 'self [us]' in line:
+            continue
+        self_us, cumulative_us, name = line.removeprefix('import time:').split('|', 2)
+        # ネストした import は2文字ずつ字下げされる
+        depth = (len(name) - len(name.lstrip(' ')) - 1) // 2
+        imports.append(ImportTime(name.strip(), int(self_us), int(cumulative_us), depth))
+    return imports
+
+
+def profile_imports(module: str) -> list[ImportTime]:
+    result = subprocess.run(
+        [sys.executable, '-X', 'importtime', '-c', f'import {module}'],
+        env=build_env(),
+        capture_output=True,
+        text=True,
+    )
+    if result.returncode != 0:
+        raise SystemExit(f'failed to import {module}:\n{result.stderr[-2000:]}')
+    return parse_importtime(result.stderr)
+
+
+def measure_startup(module: str, runs: int) -> list[float]:
+    """プロセスの起動から module の import が終わるまでの時間（ミリ秒）を計測する"""
+    samples = []
+    for _ in range(runs):
+        start = time.perf_counter()
+        subprocess.run([sys.executable, '-c', f'import {module}'], env=build_env(), check=True)
+        samples.append((time.perf_counter() - start) * 1000)
+    return samples
+
+
+def summarize_packages(imports: list[ImportTime]) -> dict[str, float]:
+    """トップレベルのパッケージごとの self の合計（ミリ秒）"""
+    packages = defaultdict(float)
+    for item in imports:
+        packages[item.name.split('.', 1)[0]] += item.self_us / 1000
+    return dict(sorted(packages.items(), key=lambda item: item[1], reverse=True))
+
+
+def find_loaded(imports: list[ImportTime], modules: list[str]) -> list[str]:
+    names = {item.name for item in imports}
+    return [module for module in modules if any(name == module or name.startswith(f'{module}.') for name in names)]
+
+
+def run(args) -> dict:
+    imports = profile_imports(args.module)
+    samples = measure_startup(args.module, args.runs)
+    src_imports = sorted(
+        (item for item in imports if item.name.startswith('src.')), key=lambda item: item.cumulative_us, reverse=True
+    )
+    return {
+        'module': args.module,
+        'import_ms': sum(item.cumulative_us for item in imports if item.depth == 0) / 1000,
+        'startup_ms': samples,
+        'startup_median_ms': statistics.median(samples),
+        'startup_max_ms': max(samples),
+        'packages_ms': summarize_packages(imports),
+        'src_modules_ms': {item.name: item.cumulative_us / 1000 for item in src_imports},
+        'modules': len(imports),
+        'loaded_lazy_modules': find_loaded(imports, args.forbid),
+    }
+
+
+def print_report(result: dict, top: int) -> None:
+    print(f"{result['module']}: {result['modules']} modules, import {result['import_ms']:.0f} ms")
+    print(
+        f"cold start: median {result['startup_median_ms']:.0f} ms, max {result['startup_max_ms']:.0f} ms"
+        f" ({len(result['startup_ms'])} runs)"
+    )
+
+    print(f"\n{'package':<40} {'self ms':>9}")
+    for name, value in list(result['packages_ms'].items())[:top]:
+        print(f'{name:<40} {value:>9.1f}')
+
+    print(f"\n{'src module':<60} {'cumulative ms':>14}")
+    for name, value in list(result['src_modules_ms'].items())[:top]:
+        print(f'{name:<60} {value:>14.1f}')
+
+
+def check_thresholds(result: dict, args) -> list[str]:
+    failures = []
+    if args.budget_ms is not None and result['startup_median_ms'] > args.budget_ms:
+        failures.append(f"cold start median {result['startup_median_ms']:.0f} > budget {args.budget_ms:.0f} ms")
+    for module in result['loaded_lazy_modules']:
+        failures.append(f'{module} is imported at startup')
+    return failures
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--module', default='src.server', help='計測する起動時のモジュール')
+    parser.add_argument('--runs', type=int, default=5, help='コールドスタートの計測回数')
+    parser.add_argument('--budget-ms', type=float, default=2000, help='コールドスタートの中央値の上限')
+    parser.add_argument('--forbid', nargs='*', default=LAZY_MODULES, help='起動時に読み込まれてはいけないモジュール')
+    parser.add_argument('--top', type=int, default=20)
+    parser.add_argument('--json', default=None, help='結果をJSONで保存するパス')
+    args = parser.parse_args()
+
+    result = run(args)
+    print_report(result, args.top)
+    if args.json:
+        with open(args.json, 'w', encoding='utf-8') as f:
+            json.dump(result, f, ensure_ascii=False, indent=2)
+
+    failures = check_thresholds(result, args)
+    for failure in failures:
+        print(f'FAILED: {failure}')
+    sys.exit(1 if failures else 0)
@@ -0,0 +1,94 @@
+"""
+TRACE_EXPORTER=jsonl で出力したスパンを集計し、処理ごとの p50 / p95 とトークン数・推定コストを表示する。
+
+```sh
+TRACE_EXPORTER=jsonl TRACE_JSONL_PATH=traces.jsonl poetry run gunicorn ...
+poetry run python -m util.trace_report traces.jsonl
+poetry run python -m util.trace_report traces.jsonl --file-uuid <file_uuid>
+```
+"""
+
+import argparse
+import json
+from collections import defaultdict
+
+
+def percentile(values: list[float], q: float) -> float:
+    """線形補間によるパーセンタイル"""
+    values = sorted(values)
+    if len(values) == 1:
+        return values[0]
+    position = (len(values) - 1) * q
+    lower = int(position)
+    upper = min(lower + 1, len(values) - 1)
+    return values[lower] + (values[upper] - values[lower]) * (position - lower)
+
+
+def load_spans(path: str, file_uuid: str | None = None) -> list[dict]:
+    spans = []
+    with open(path, encoding='utf-8') as f:
+        for line in f:
+            if not line.strip():
+                continue
+            span = json.loads(line)
+            if file_uuid and span['attributes'].get('file_uuid') != file_uuid:
+                continue
+            spans.append(span)
+    return spans
+
+
+def summarize(spans: list[dict]) -> list[dict]:
+    groups = defaultdict(list)
+    for span in spans:
+        groups[span['name']].append(span)
+
+    rows = []
+    for name, items in groups.items():
+        durations = [span['duration_ms'] for span in items]
+        rows.append(
+            {
+                'name': name,
+                'count': len(items),
+                'errors': sum(1 for span in items if span['status'] == 'error'),
+                'p50_ms': percentile(durations, 0.5),
+                'p95_ms': percentile(durations, 0.95),
+                'max_ms': max(durations),
+                'total_s': sum(durations) / 1000,
+                'tokens': sum(span['attributes'].get('total_tokens', 0) for span in items),
+                'cost_usd': sum(span['attributes'].get('cost_usd') or 0 for span in items),
+            }
+        )
+    return sorted(rows, key=lambda row: row['total_s'], reverse=True)
+
+
+def main(path: str, file_uuid: str | None) -> None:
+    spans = load_spans(path, file_uuid)
+    if not spans:
+        print('no spans found')
+        return
+
+    rows = summarize(spans)
+    print(
+        f"{'stage':<32} {'count':>6} {'errors':>6} {'p50 ms':>10} {'p95 ms':>10} {'max ms':>10}"
+        f" {'total s':>9} {'tokens':>10} {'cost $':>9}"
+    )
+    for row in rows:
+        print(
+            f"{row['name']:<32} {row['count']:>6} {row['errors']:>6} {row['p50_ms']:>10.1f} {row['p95_ms']:>10.1f}"
+            f" {row['max_ms']:>10.1f} {row['total_s']:>9.2f} {row['tokens']:>10} {row['cost_usd']:>9.4f}"
+        )
+
+    files = {span['attributes'].get('file_uuid') for span in spans if span['attributes'].get('file_uuid')}
+    total_cost = sum(row['cost_usd'] for row in rows)
+    total_tokens = sum(row['tokens'] for row in rows)
+    print(f'\nfiles: {len(files)}, tokens: {total_tokens}, cost: ${total_cost:.4f}')
+    if files:
+        print(f'cost per file: ${total_cost / len(files):.4f}')
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    parser.add_argument('path', help='TRACE_JSONL_PATH で出力したファイル')
+    parser.add_argument('--file-uuid', default=None, help='指定したファイルのスパンのみ集計する')
+    args = parser.parse_args()
+    main(args.path, args.file_uuid)
@@ -2,6 +2,7 @@ import React, { useEffect, useState, useCallback } from "react";
 import { Alert, Space, Typography } from "antd";
 import { SyncOutlined } from "@ant-design/icons";
 import axios from "axios";
+import { getAuth } from "firebase/auth";
 import { apiUrlGetWorkerCount } from "@/utils/api"; // 実際には適切にimport
 
 const { Text } = Typography;
@@ -49,7 +50,15 @@ const TaskCount = () => {
   // タスク数を取得する関数
   const fetchTaskCount = useCallback(async () => {
     try {
-      const response = await axios.get<TaskCountResponse>(apiUrlGetWorkerCount);
+      // ユーザーの進捗から残りの処理件数を取得する（トークンが必須）
+      const user = getAuth().currentUser;
+      if (!user) {
+        return;
+      }
+      const accessToken = await user.getIdToken();
+      const response = await axios.get<TaskCountResponse>(apiUrlGetWorkerCount, {
+        headers: { Authorization: `Bearer ${accessToken}` },
+      });
       setTaskCount(response.data.task_count);
       setError(null);
 
@@ -1,5 +1,5 @@
 import { useState, useEffect } from 'react';
-import axios from 'axios';
+import axios, { AxiosResponse } from 'axios';
 import { auth } from '@/services/firebase';
 import { apiUrlCheckDocumentData } from '@/utils/api';
 import { message } from 'antd';
@@ -12,6 +12,11 @@ interface FileData {
   feature: string;
 }
 
+interface DocumentPage {
+  files: FileData[];
+  next_page_token: string | null;
+}
+
 const useFetchDocument = () => {
   const [filesDocument, setFiles] = useState<FileData[]>([]);
   const [loadingDocument, setLoading] = useState<boolean>(true);
@@ -25,12 +30,21 @@ const useFetchDocument = () => {
       try {
         //const apiUrl = `${api.baseUrl}/check/document_data`;
         const accessToken = await user.getIdToken(/* forceRefresh */ true);
-        const response = await axios.get(apiUrlCheckDocumentData, {
-          headers: {
-            'Authorization': `Bearer ${accessToken}`,
-          },
-        });
-        setFiles(response.data.files);
+        // 一覧はページ単位（最大500件）で返るため、next_page_token がなくなるまで取得する
+        const files: FileData[] = [];
+        let pageToken: string | null = null;
+        do {
+          const response: AxiosResponse<DocumentPage> = await axios.get(apiUrlCheckDocumentData, {
+            headers: {
+              'Authorization': `Bearer ${accessToken}`,
+            },
+            params: pageToken ? { page_token: pageToken } : undefined,
+          });
+          // 204（ファイルなし）の場合は本文がない
+          files.push(...(response.data?.files ?? []));
+          pageToken = response.data?.next_page_token ?? null;
+        } while (pageToken);
+        setFiles(files);
       } catch (err) {
         //message.error('データがまだありません');
         setError('データがまだありません');